@@ -0,0 +1,143 @@
+# simulates GPUs as first order thermal plants and drives the real amd sclk
+# controller against them, comparing throttle only (firmware fan curve) with
+# fan first control on throughput retained and time spent above the target
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sustainer.fan import DEFAULT_FAN_CURVE, FanCurve  # noqa: E402
+from sustainer.rocm import ROCMSMIGPUStatSustainer  # noqa: E402
+
+DEVICE_COUNT = 4
+SIMULATED_SECONDS = 2 * 3600
+TARGET_TEMP = 75
+AMBIENT_TEMP = 30.0
+# joules per kelvin, gpu, heatsink and the air around them lumped together
+HEAT_CAPACITY = 400.0
+MAX_SCLK_LEVEL = 7
+# watts at sclk level 0 and per level above it, throughput scales with the level
+IDLE_POWER = 60.0
+POWER_PER_LEVEL = 35.0
+# watts per kelvin, the heatsink alone plus what the fans add at full speed
+PASSIVE_CONDUCTANCE = 2.0
+FAN_CONDUCTANCE = 4.0
+# what firmware fan control typically settles for, trading heat for noise
+FIRMWARE_FAN_CAP = 60
+
+
+class ThermalPlant:
+    def __init__(self, ambient_offset: float):
+        self.ambient_temp = AMBIENT_TEMP + ambient_offset
+        self.temperature = self.ambient_temp
+        self.sclk_level = MAX_SCLK_LEVEL
+        # None while the firmware controls the fans
+        self.fan_percent = None
+
+    def get_firmware_fan_percent(self):
+        ret = 30 + (self.temperature - 50) * 2
+        ret = min(FIRMWARE_FAN_CAP, max(30, ret))
+        return ret
+
+    def step(self, seconds: float):
+        fan_percent = self.fan_percent
+        if fan_percent is None:
+            fan_percent = self.get_firmware_fan_percent()
+        power = IDLE_POWER + POWER_PER_LEVEL * self.sclk_level
+        conductance = PASSIVE_CONDUCTANCE + FAN_CONDUCTANCE * fan_percent / 100
+        cooling = conductance * (self.temperature - self.ambient_temp)
+        self.temperature += (power - cooling) / HEAT_CAPACITY * seconds
+
+
+class SimulatedROCMSMIGPUStatSustainer(ROCMSMIGPUStatSustainer):
+    required_binaries = []
+
+    def __init__(self, plants):
+        super().__init__(target_temp=TARGET_TEMP, skip_root_check=True)
+        self.plants = plants
+
+    def get_device_indices(self):
+        return list(range(len(self.plants)))
+
+    def capture_device_settings(self, device_id: int):
+        ret = {"perf_level": "auto", "sclk_level": MAX_SCLK_LEVEL}
+        if self.fan_curve is not None:
+            ret["fan_mode"] = "auto"
+        return ret
+
+    def set_gpu_as_manual_perf_level(self, device_id: int):
+        pass
+
+    def get_gpu_temperature(self, device_id: int):
+        return round(self.plants[device_id].temperature)
+
+    def get_gpu_current_sclk_level(self, device_id: int):
+        return self.plants[device_id].sclk_level
+
+    def get_gpu_sclk_min_max_levels(self, device_id: int):
+        return 0, MAX_SCLK_LEVEL
+
+    def set_gpu_sclk_level(self, device_id: int, sclk_level: int):
+        self.plants[device_id].sclk_level = sclk_level
+
+    def set_gpu_fan_percent(self, device_id: int, fan_percent: int):
+        self.plants[device_id].fan_percent = fan_percent
+
+
+def simulate(fan_curve):
+    plants = [ThermalPlant(ambient_offset=index * 2) for index in range(DEVICE_COUNT)]
+    sustainer = SimulatedROCMSMIGPUStatSustainer(plants)
+    sustainer.fan_curve = fan_curve
+    clock = [0.0]
+    # dwell times pass in simulated seconds
+    sustainer.limit_policy.clock = lambda: clock[0]
+    tick = int(sustainer.tick_interval)
+    sclk_sum = 0.0
+    seconds_above = 0
+    peak_temp = 0.0
+    for second in range(SIMULATED_SECONDS):
+        clock[0] = second
+        if second % tick == 0:
+            sustainer.mainloop()
+        for it in plants:
+            it.step(1)
+            sclk_sum += it.sclk_level
+            seconds_above += it.temperature > TARGET_TEMP + 2
+            peak_temp = max(peak_temp, it.temperature)
+    samples = SIMULATED_SECONDS * DEVICE_COUNT
+    ret = {
+        "throughput": sclk_sum / samples / MAX_SCLK_LEVEL,
+        "above_target": seconds_above / samples,
+        "peak_temp": peak_temp,
+        # over the last simulated hour, per gpu
+        "changes": sum(
+            sustainer.limit_policy.get_hourly_changes(it) for it in range(DEVICE_COUNT)
+        )
+        / DEVICE_COUNT,
+    }
+    return ret
+
+
+def main():
+    cases = {
+        "throttle only": None,
+        "fan first": FanCurve.parse(DEFAULT_FAN_CURVE),
+    }
+    results = {}
+    for name, fan_curve in cases.items():
+        results[name] = result = simulate(fan_curve)
+        print(
+            f"{name:<15} throughput retained {result['throughput']:6.1%}"
+            f"  time above target+2C {result['above_target']:6.1%}"
+            f"  peak {result['peak_temp']:5.1f}C"
+            f"  sclk changes/h {result['changes']:5.1f}"
+        )
+    baseline, fan_first = results.values()
+    print(
+        f"throughput gain: {fan_first['throughput'] / baseline['throughput']:.2f}x"
+        f" over {DEVICE_COUNT} gpus and {SIMULATED_SECONDS // 3600} simulated hours"
+    )
+
+
+if __name__ == "__main__":
+    main()
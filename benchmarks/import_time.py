@@ -0,0 +1,51 @@
+# compares the startup import cost of the lightweight cli against loading every
+# backend eagerly, the way sustainer/lib.py used to do at import time
+import os
+import statistics
+import subprocess
+import sys
+
+REPEAT = 10
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CASES = {
+    "cli (lazy backends)": "import sustainer.cli",
+    "cli + all backends (eager)": "import sustainer.cli, sustainer.cpu, sustainer.nvml, sustainer.nvsmi, sustainer.rocm",
+}
+
+
+def measure_import_us(code: str):
+    output = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=ROOT,
+        stderr=subprocess.PIPE,
+        stdout=subprocess.DEVNULL,
+        encoding="utf-8",
+        check=True,
+    ).stderr
+    ret = 0
+    started = False
+    for line in output.splitlines():
+        fields = line.split("|")
+        if len(fields) != 3 or not fields[1].strip().isdigit():
+            continue
+        # only top level imports, ignoring interpreter startup which ends with site
+        if not fields[2].startswith("  "):
+            if started:
+                ret += int(fields[1])
+            started = started or fields[2].strip() == "site"
+    return ret
+
+
+def main():
+    results = {}
+    for name, code in CASES.items():
+        samples = [measure_import_us(code) for _ in range(REPEAT)]
+        results[name] = statistics.median(samples)
+        print(f"{name:<30} median {results[name] / 1000:8.2f} ms over {REPEAT} runs")
+    lazy, eager = results.values()
+    print(f"speedup: {eager / lazy:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
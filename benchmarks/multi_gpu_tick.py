@@ -0,0 +1,126 @@
+# measures one tick of the legacy nvidia-smi power limit controller against a
+# fake nvidia-smi with growing device counts, comparing the old per device
+# queries with a single snapshot stepped for every device at once
+import os
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sustainer.nvsmi import NVIDIALegacyGPUStatSustainer  # noqa: E402
+
+DEVICE_COUNTS = [1, 2, 4, 8, 16, 32]
+TICKS = 20
+TARGET_TEMP = 70
+# typical wall time of one `nvidia-smi -x -q` or `-pl` call on a loaded node
+TOOL_CALL_SECONDS = 0.05
+
+GPU_XML = """<gpu id="{index}">
+<persistence_mode>Enabled</persistence_mode>
+<temperature><gpu_temp>{temperature} C</gpu_temp></temperature>
+<gpu_power_readings>
+<current_power_limit>{power_limit:.2f} W</current_power_limit>
+<default_power_limit>250.00 W</default_power_limit>
+<min_power_limit>100.00 W</min_power_limit>
+</gpu_power_readings>
+</gpu>"""
+
+
+class FakeNVIDIASMIExecutor:
+    def __init__(self, device_count: int):
+        # half of the GPUs run hot, so limits keep moving in both directions
+        self.temperatures = [80 if it % 2 else 60 for it in range(device_count)]
+        self.power_limits = [250] * device_count
+        self.calls = 0
+
+    def check_output(self, cmdlist, timeout=None):
+        self.calls += 1
+        gpus = "".join(
+            GPU_XML.format(index=index, temperature=temperature, power_limit=limit)
+            for index, (temperature, limit) in enumerate(
+                zip(self.temperatures, self.power_limits)
+            )
+        )
+        ret = (
+            f"<nvidia_smi_log><attached_gpus>{len(self.temperatures)}</attached_gpus>"
+            f"{gpus}</nvidia_smi_log>"
+        )
+        return ret
+
+    def run(self, cmdlist, timeout=None, check=True):
+        self.calls += 1
+        if "-i" in cmdlist:
+            device_ids = [int(it) for it in cmdlist[cmdlist.index("-i") + 1].split(",")]
+        else:
+            device_ids = list(range(len(self.temperatures)))
+        for device_id in device_ids:
+            self.power_limits[device_id] = int(cmdlist[cmdlist.index("-pl") + 1])
+            # settled hot GPUs heat up again, so the next tick moves them once more
+            self.temperatures[device_id] = (
+                80 if self.power_limits[device_id] > 100 else 60
+            )
+        ret = subprocess.CompletedProcess(cmdlist, 0, "", "")
+        return ret
+
+
+class BenchmarkNVIDIALegacyGPUStatSustainer(NVIDIALegacyGPUStatSustainer):
+    required_binaries = []
+
+    # the controller as it was: each reading queried nvidia-smi on its own
+    def per_device_mainloop(self):
+        for device_id in self.get_device_indices():
+            gpu_temp = self.get_gpu_temperature(device_id)
+            self.update_device_state(device_id, temperature=gpu_temp)
+            current_power_limit = self.get_current_power_limit(device_id)
+            min_power = self.get_min_power_limit(device_id)
+            max_power = self.get_default_power_limit(device_id)
+            step = int(self.get_default_power_limit(device_id) * 0.2)
+            if gpu_temp < self.get_target_temp(device_id):
+                new_power_limit = min(max_power, current_power_limit + step)
+            else:
+                new_power_limit = max(min_power, current_power_limit - step)
+            self.set_power_limit(device_id, new_power_limit)
+            self.update_device_state(device_id, power_limit=new_power_limit)
+
+
+def measure(device_count: int, batched: bool):
+    executor = FakeNVIDIASMIExecutor(device_count)
+    sustainer = BenchmarkNVIDIALegacyGPUStatSustainer(
+        target_temp=TARGET_TEMP, skip_root_check=True
+    )
+    sustainer.executor = executor
+    sustainer.fan_curve = None
+    mainloop = sustainer.mainloop if batched else sustainer.per_device_mainloop
+    started = time.perf_counter()
+    for _ in range(TICKS):
+        mainloop()
+    seconds = (time.perf_counter() - started) / TICKS
+    calls = executor.calls / TICKS
+    return seconds, calls
+
+
+def main():
+    print(
+        f"{'gpus':>4}  {'per device ms':>13} {'calls':>6}  {'batched ms':>10} {'calls':>6}"
+        f"  {'est. tick with tools':>20}"
+    )
+    for device_count in DEVICE_COUNTS:
+        old_seconds, old_calls = measure(device_count, batched=False)
+        new_seconds, new_calls = measure(device_count, batched=True)
+        old_total = old_seconds + old_calls * TOOL_CALL_SECONDS
+        new_total = new_seconds + new_calls * TOOL_CALL_SECONDS
+        print(
+            f"{device_count:>4}  {old_seconds * 1000:>13.2f} {old_calls:>6.1f}"
+            f"  {new_seconds * 1000:>10.2f} {new_calls:>6.1f}"
+            f"  {old_total:>8.2f}s -> {new_total:5.2f}s"
+        )
+    print(
+        f"python time per gpu at {DEVICE_COUNTS[-1]} gpus:"
+        f" {new_seconds / device_count * 1e6:.0f} us batched,"
+        f" {old_seconds / device_count * 1e6:.0f} us per device"
+    )
+
+
+if __name__ == "__main__":
+    main()
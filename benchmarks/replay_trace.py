@@ -0,0 +1,72 @@
+# replays a trace recorded with SUSTAINER_RECORD through one backend at full
+# speed, so controller changes can be compared against real tool output.
+# without a trace, a synthetic nvidia-smi recording of a warming GPU is used.
+#   python benchmarks/replay_trace.py [trace.jsonl.gz] [backend] [ticks]
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sustainer import base  # noqa: E402
+from sustainer.backends import ALL_BACKENDS, load_backend  # noqa: E402
+from sustainer.trace import ReplayExecutor, TraceWriter  # noqa: E402
+
+DEFAULT_BACKEND = "NVIDIALegacyGPUStatSustainer"
+DEFAULT_TICKS = 1000
+
+NVIDIA_SMI_XML = """<nvidia_smi_log><attached_gpus>1</attached_gpus>
+<gpu id="00000000:01:00.0">
+<persistence_mode>Enabled</persistence_mode>
+<temperature><gpu_temp>{temperature} C</gpu_temp></temperature>
+<gpu_power_readings>
+<power_draw>{power_draw:.2f} W</power_draw>
+<current_power_limit>250.00 W</current_power_limit>
+<default_power_limit>250.00 W</default_power_limit>
+<min_power_limit>100.00 W</min_power_limit>
+</gpu_power_readings>
+</gpu></nvidia_smi_log>"""
+
+
+def write_synthetic_trace(path: str):
+    writer = TraceWriter(path)
+    for it in range(60):
+        temperature = 60 + it % 30
+        output = NVIDIA_SMI_XML.format(
+            temperature=temperature, power_draw=150 + temperature
+        )
+        writer.record_call(
+            ["nvidia-smi", "-x", "-q"],
+            it,
+            0.08,
+            subprocess.CompletedProcess([], 0, output, ""),
+        )
+    writer.close()
+
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else None
+    class_name = sys.argv[2] if len(sys.argv) > 2 else DEFAULT_BACKEND
+    ticks = int(sys.argv[3]) if len(sys.argv) > 3 else DEFAULT_TICKS
+    if path is None:
+        path = os.path.join(tempfile.mkdtemp(), "synthetic.jsonl.gz")
+        write_synthetic_trace(path)
+    spec = next(it for it in ALL_BACKENDS if it.class_name == class_name)
+    replay = ReplayExecutor.load(path)
+    base._default_executor = replay
+    sustainer = load_backend(spec)(skip_root_check=True)
+    tick = getattr(sustainer, "mainloop", sustainer.read_status)
+    started = time.perf_counter()
+    for _ in range(ticks):
+        tick()
+    seconds = time.perf_counter() - started
+    print(f"{class_name}: {ticks} ticks, {seconds / ticks * 1e6:.0f} us per tick")
+    print(f"replayed calls: {replay.replayed}")
+    for cmdlist, count in replay.unmatched.most_common(10):
+        print(f"unmatched {count:>6}x {' '.join(cmdlist)}")
+
+
+if __name__ == "__main__":
+    main()
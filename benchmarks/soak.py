@@ -0,0 +1,288 @@
+# runs HardwareStatSustainer against fake nvidia-smi and rocm-smi binaries for
+# a number of simulated hours, with every interval shortened by the speedup,
+# and fails if memory, threads or the cpu time per tick grow past thresholds.
+# dwell times, hourly change counts, throttle timers and profile learning run
+# on a clock sped up the same way. energy accounting stays on wall-clock time.
+# the tools are shell scripts, so child cpu time stays close to a fork per call.
+#   python benchmarks/soak.py --hours 4 --speedup 120 --gpus 8
+import argparse
+import json
+import os
+import stat
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sustainer.base import get_energy_interval_config  # noqa: E402
+from sustainer.lib import HardwareStatSustainer  # noqa: E402
+from sustainer.profiles import PROFILE_POLL_INTERVAL  # noqa: E402
+
+# the first hour fills caches and the event log buffer, growth is measured after it
+WARMUP_HOURS = 1
+# gpu temperatures alternate between hot and cool, so limits keep moving
+NVIDIA_QUERIES_PER_PHASE = 30
+AMD_QUERIES_PER_PHASE = 100
+
+GPU_XML = """<gpu id="{index}">
+<uuid>GPU-{index:08x}-0000-0000-0000-000000000000</uuid>
+<persistence_mode>Enabled</persistence_mode>
+<temperature><gpu_temp>{temperature} C</gpu_temp></temperature>
+<max_clocks><graphics_clock>2000 MHz</graphics_clock></max_clocks>
+<clocks_throttle_reasons>
+<clocks_throttle_reason_sw_power_cap>Active</clocks_throttle_reason_sw_power_cap>
+<clocks_throttle_reason_hw_slowdown>Not Active</clocks_throttle_reason_hw_slowdown>
+</clocks_throttle_reasons>
+<gpu_power_readings>
+<power_draw>{power_draw:.2f} W</power_draw>
+<current_power_limit>250.00 W</current_power_limit>
+<default_power_limit>250.00 W</default_power_limit>
+<min_power_limit>100.00 W</min_power_limit>
+</gpu_power_readings>
+</gpu>"""
+
+NVIDIA_SMI_SCRIPT = """#!/bin/sh
+case "$*" in
+*"-x -q"*)
+    n=$(cat "{state}/nvidia-count")
+    echo $((n + 1)) > "{state}/nvidia-count"
+    cat "{state}/nvidia-$((n / {queries} % 2)).xml"
+    ;;
+esac
+"""
+
+ROCM_SMI_SCRIPT = """#!/bin/sh
+card=card0
+if [ "$1" = "-d" ]; then
+    card="card$2"
+    shift 2
+fi
+case "$1" in
+--showtopo) cat "{state}/amd-topo.json" ;;
+--showpower) cat "{state}/amd-power.json" ;;
+-t)
+    n=$(cat "{state}/amd-count")
+    echo $((n + 1)) > "{state}/amd-count"
+    printf '{{"%s": {{"Temperature (Sensor edge) (C)": "%s.0"}}}}' "$card" $((n / {queries} % 2 * 20 + 60))
+    ;;
+-c) printf '{{"%s": {{"sclk clock level:": "3"}}}}' "$card" ;;
+-s) printf '{{"%s": {{"0": "500Mhz", "3": "1200Mhz", "7": "2100Mhz"}}}}' "$card" ;;
+--showperflevel) printf '{{"%s": {{"Performance Level": "auto"}}}}' "$card" ;;
+esac
+"""
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Soak HardwareStatSustainer against fake GPU tools."
+    )
+    parser.add_argument("--hours", type=int, default=4, help="Simulated hours.")
+    parser.add_argument(
+        "--speedup",
+        type=float,
+        default=120,
+        help="Simulated seconds per second, every interval is shortened by it.",
+    )
+    parser.add_argument("--gpus", type=int, default=8, help="GPUs of each vendor.")
+    parser.add_argument(
+        "--max-rss-growth",
+        type=float,
+        default=2.0,
+        help="Resident memory growth allowed per simulated hour, in MB.",
+    )
+    parser.add_argument(
+        "--max-traced-growth",
+        type=float,
+        default=256,
+        help="Traced allocation growth allowed per simulated hour, in KB.",
+    )
+    parser.add_argument(
+        "--max-tick-ms",
+        type=float,
+        default=20,
+        help="Python cpu time allowed per tick, in ms, over the warm-up hour.",
+    )
+    parser.add_argument(
+        "--max-tick-growth",
+        type=float,
+        default=0.5,
+        help="Growth of the python cpu time per tick allowed over the run.",
+    )
+    args = parser.parse_args()
+    assert args.hours >= WARMUP_HOURS + 2, "Soak for at least 3 simulated hours"
+    return args
+
+
+def write_file(path: str, content: str, executable: bool = False):
+    with open(path, "w") as f:
+        f.write(content)
+    if executable:
+        os.chmod(path, os.stat(path).st_mode | stat.S_IXUSR | stat.S_IXGRP)
+
+
+def create_fake_tools(directory: str, gpus: int):
+    state = os.path.join(directory, "state")
+    bin_path = os.path.join(directory, "bin")
+    os.makedirs(state)
+    os.makedirs(bin_path)
+    for phase, temperature in enumerate([80, 60]):
+        xml = "".join(
+            GPU_XML.format(index=it, temperature=temperature, power_draw=200.0)
+            for it in range(gpus)
+        )
+        write_file(
+            os.path.join(state, f"nvidia-{phase}.xml"),
+            f"<nvidia_smi_log><attached_gpus>{gpus}</attached_gpus>{xml}</nvidia_smi_log>",
+        )
+    write_file(
+        os.path.join(state, "amd-topo.json"),
+        json.dumps({f"card{it}": {} for it in range(gpus)}),
+    )
+    write_file(
+        os.path.join(state, "amd-power.json"),
+        json.dumps(
+            {
+                f"card{it}": {"Average Graphics Package Power (W)": "150.0"}
+                for it in range(gpus)
+            }
+        ),
+    )
+    for it in ["nvidia-count", "amd-count"]:
+        write_file(os.path.join(state, it), "0\n")
+    write_file(
+        os.path.join(bin_path, "nvidia-smi"),
+        NVIDIA_SMI_SCRIPT.format(state=state, queries=NVIDIA_QUERIES_PER_PHASE),
+        executable=True,
+    )
+    write_file(
+        os.path.join(bin_path, "rocm-smi"),
+        ROCM_SMI_SCRIPT.format(state=state, queries=AMD_QUERIES_PER_PHASE),
+        executable=True,
+    )
+    return bin_path
+
+
+# footprints are cumulative, each row covers one simulated hour
+def get_hour_row(
+    hour: int, footprint: Dict[str, Any], previous: Dict[str, Any]
+) -> Dict[str, Any]:
+    ticks = footprint["ticks"] - previous.get("ticks", 0)
+    python_cpu = footprint["python_cpu_seconds"] - previous.get("python_cpu_seconds", 0)
+    children_cpu = footprint["children_cpu_seconds"] - previous.get(
+        "children_cpu_seconds", 0
+    )
+    ret = {
+        "hour": hour,
+        "ticks": ticks,
+        "rss_mb": footprint["rss_mb"],
+        "traced_mb": footprint.get("traced_mb", None),
+        "threads": footprint["threads"],
+        # one simulated hour runs the ticks of a real one
+        "python_cpu_s_hour": round(python_cpu, 2),
+        "children_cpu_s_hour": round(children_cpu, 2),
+        "python_ms_tick": round(python_cpu * 1000 / max(ticks, 1), 3),
+        "children_ms_tick": round(children_cpu * 1000 / max(ticks, 1), 3),
+    }
+    return ret
+
+
+def check_regressions(rows: List[Dict[str, Any]], args) -> List[str]:
+    ret = []
+    warm, traced, last = rows[WARMUP_HOURS - 1], rows[WARMUP_HOURS], rows[-1]
+    rss_growth = (last["rss_mb"] - warm["rss_mb"]) / (last["hour"] - warm["hour"])
+    if rss_growth > args.max_rss_growth:
+        ret.append(f"resident memory grows {rss_growth:.2f} MB per hour")
+    traced_growth = (
+        (last["traced_mb"] - traced["traced_mb"])
+        * 1024
+        / (last["hour"] - traced["hour"])
+    )
+    if traced_growth > args.max_traced_growth:
+        ret.append(f"traced allocations grow {traced_growth:.0f} KB per hour")
+    if last["threads"] > warm["threads"]:
+        ret.append(f"threads grew from {warm['threads']} to {last['threads']}")
+    # tracing allocations costs more than a tick, so it is timed before
+    if warm["python_ms_tick"] > args.max_tick_ms:
+        ret.append(f"a tick takes {warm['python_ms_tick']} ms of python cpu")
+    if last["python_ms_tick"] > traced["python_ms_tick"] * (1 + args.max_tick_growth):
+        ret.append(
+            f"python cpu per tick grew from {traced['python_ms_tick']}"
+            f" to {last['python_ms_tick']} ms"
+        )
+    return ret
+
+
+def get_scaled_clock(speedup: float) -> Callable[[], float]:
+    started = time.monotonic()
+
+    def clock():
+        return started + (time.monotonic() - started) * speedup
+
+    return clock
+
+
+def main():
+    args = parse_args()
+    directory = tempfile.mkdtemp()
+    bin_path = create_fake_tools(directory, args.gpus)
+    os.environ["PATH"] = bin_path + os.pathsep + os.environ.get("PATH", "")
+    # the stepped controller does the most work per tick
+    os.environ.setdefault("NVIDIA_CONTROL_MODE", "clocks")
+    for name, file_name in [
+        ("SUSTAINER_PROFILES", "profiles.json"),
+        ("SUSTAINER_PROFILE_FILE", "profile"),
+        ("SUSTAINER_LEARNED_LIMITS", "learned_limits.json"),
+    ]:
+        os.environ[name] = os.path.join(directory, file_name)
+
+    hardware_sustainer = HardwareStatSustainer(
+        cpu=False,
+        journal_path=os.path.join(directory, "journal.json"),
+        event_log_path=os.path.join(directory, "events.jsonl"),
+    )
+    clock = get_scaled_clock(args.speedup)
+    for it in hardware_sustainer.sustainers:
+        it.tick_interval /= args.speedup
+        it.limit_policy.clock = clock
+        it.throttle_timer.clock = clock
+    hardware_sustainer.profiles.clock = clock
+    hardware_sustainer.start_sustainer_threads()
+    hardware_sustainer.start_energy_accounting(
+        get_energy_interval_config() / args.speedup
+    )
+    hardware_sustainer.start_profile_watch(PROFILE_POLL_INTERVAL / args.speedup)
+
+    print(f"[*] Soaking for {args.hours} simulated hours at {args.speedup}x")
+    rows: List[Dict[str, Any]] = []
+    previous: Dict[str, Any] = {}
+    try:
+        for hour in range(1, args.hours + 1):
+            time.sleep(3600 / args.speedup)
+            footprint = hardware_sustainer.get_footprint()
+            rows.append(get_hour_row(hour, footprint, previous))
+            previous = footprint
+            print(rows[-1])
+            if hour == WARMUP_HOURS:
+                hardware_sustainer.footprint.start_tracing()
+        top_allocations = hardware_sustainer.footprint.get_top_allocations()
+    finally:
+        hardware_sustainer.stop_sustainer_threads()
+        hardware_sustainer.restore_journaled_settings()
+        hardware_sustainer.event_log.close()
+
+    failures = check_regressions(rows, args)
+    if not failures:
+        print("[+] No regression found")
+        return
+    for it in failures:
+        print("[-] Regression:", it)
+    print("[*] Allocations grown the most since the warm-up:")
+    for it in top_allocations:
+        print(f"    {it['size_diff_kb']:+.1f} KB {it['location']}")
+    sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
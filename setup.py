@@ -13,5 +13,6 @@ setup(
     entry_points="""
         [console_scripts]
         sustainer=sustainer.cli:main
+        sustainer-aggregator=sustainer.fleet:main
     """,
 )
@@ -0,0 +1,167 @@
+import importlib
+import importlib.util
+import os
+import shutil
+from typing import Any, Dict, List, NamedTuple, Tuple
+
+from .base import (
+    DEFAULT_CPUFREQ_SYSFS_ROOT,
+    DEFAULT_POWERCAP_SYSFS_ROOT,
+    NVIDIA_SMI,
+    ROCM_SMI,
+    get_cpu_control_mode_config,
+    get_cpufreq_sysfs_root_config,
+    get_nvidia_control_mode_config,
+    get_powercap_sysfs_root_config,
+)
+
+
+# backend requirements are listed here so they can be probed without importing
+# the backend modules and their dependencies
+class BackendSpec(NamedTuple):
+    class_name: str
+    module_name: str
+    device_kind: str
+    required_binaries: Tuple[str, ...] = ()
+    required_modules: Tuple[str, ...] = ()
+    required_paths: Tuple[str, ...] = ()
+
+
+CPU_BACKENDS = [
+    BackendSpec(
+        "CPUSysfsStatSustainer",
+        ".cpu",
+        "cpu",
+        required_paths=(os.path.join(DEFAULT_CPUFREQ_SYSFS_ROOT, "policy0"),),
+    ),
+    BackendSpec(
+        "CPUFreqUtilStatSustainer",
+        ".cpu",
+        "cpu",
+        ("sensors", "cpufreq-info", "cpufreq-set"),
+    ),
+    BackendSpec("CPUPowerStatSustainer", ".cpu", "cpu", ("sensors", "cpupower")),
+]
+
+# package power caps instead of frequency limits, opted in with CPU_CONTROL_MODE=rapl
+CPU_RAPL_BACKENDS = [
+    BackendSpec(
+        "CPURAPLStatSustainer",
+        ".cpu",
+        "cpu",
+        required_paths=(
+            os.path.join(
+                DEFAULT_POWERCAP_SYSFS_ROOT,
+                "intel-rapl:0",
+                "constraint_0_power_limit_uw",
+            ),
+        ),
+    ),
+]
+
+NVIDIA_BACKENDS = [
+    BackendSpec(
+        "NVSMIGPUStatSustainer", ".nvsmi", "nvidia", (NVIDIA_SMI,), ("xmltodict",)
+    ),
+    BackendSpec("NVMLGPUStatSustainer", ".nvml", "nvidia", (), ("pynvml",)),
+    BackendSpec(
+        "NVIDIALegacyGPUStatSustainer",
+        ".nvsmi",
+        "nvidia",
+        (NVIDIA_SMI,),
+        ("xmltodict",),
+    ),
+]
+
+# locked clocks instead of power limits, opted in with NVIDIA_CONTROL_MODE=clocks
+NVIDIA_CLOCK_BACKENDS = [
+    BackendSpec(
+        "NVIDIAClockLockGPUStatSustainer",
+        ".nvsmi",
+        "nvidia",
+        (NVIDIA_SMI,),
+        ("xmltodict",),
+    ),
+]
+
+AMD_BACKENDS = [BackendSpec("ROCMSMIGPUStatSustainer", ".rocm", "amd", (ROCM_SMI,))]
+
+ALL_BACKENDS = (
+    CPU_BACKENDS
+    + CPU_RAPL_BACKENDS
+    + NVIDIA_BACKENDS
+    + NVIDIA_CLOCK_BACKENDS
+    + AMD_BACKENDS
+)
+
+
+# in rapl mode, hosts without powercap zones still get frequency limits
+def get_cpu_backend_list() -> List[BackendSpec]:
+    ret = CPU_BACKENDS
+    if get_cpu_control_mode_config() == "rapl":
+        ret = CPU_RAPL_BACKENDS + CPU_BACKENDS
+    return ret
+
+
+# in clock mode, GPUs which cannot lock clocks still get power limits
+def get_nvidia_backend_list() -> List[BackendSpec]:
+    ret = NVIDIA_BACKENDS
+    if get_nvidia_control_mode_config() == "clocks":
+        ret = NVIDIA_CLOCK_BACKENDS + NVIDIA_BACKENDS
+    return ret
+
+
+def get_backend_spec(class_name: str) -> BackendSpec:
+    for it in ALL_BACKENDS:
+        if it.class_name == class_name:
+            return it
+    raise KeyError(f"Unknown backend '{class_name}'")
+
+
+def load_backend(spec: BackendSpec):
+    module = importlib.import_module(spec.module_name, __package__)
+    ret = getattr(module, spec.class_name)
+    return ret
+
+
+# sysfs roots may be moved by configuration, so required paths are listed
+# below the default roots and resolved against the configured ones
+SYSFS_ROOT_GETTERS = [
+    (DEFAULT_CPUFREQ_SYSFS_ROOT, get_cpufreq_sysfs_root_config),
+    (DEFAULT_POWERCAP_SYSFS_ROOT, get_powercap_sysfs_root_config),
+]
+
+
+def resolve_required_path(path: str) -> str:
+    for default_root, get_root in SYSFS_ROOT_GETTERS:
+        if path == default_root or path.startswith(default_root + os.sep):
+            ret = get_root() + path[len(default_root) :]
+            return ret
+    return path
+
+
+def get_missing_requirements(spec: BackendSpec) -> List[str]:
+    ret = [it for it in spec.required_binaries if shutil.which(it) is None]
+    for it in spec.required_modules:
+        if importlib.util.find_spec(it) is None:
+            ret.append(f"python:{it}")
+    for it in spec.required_paths:
+        path = resolve_required_path(it)
+        if not os.path.exists(path):
+            ret.append(path)
+    return ret
+
+
+def probe_backends(backend_list: List[BackendSpec] = ALL_BACKENDS):
+    ret: List[Dict[str, Any]] = []
+    for spec in backend_list:
+        missing = get_missing_requirements(spec)
+        ret.append(
+            {
+                "backend": spec.class_name,
+                "device_kind": spec.device_kind,
+                "available": not missing,
+                "missing": missing,
+            }
+        )
+    return ret
@@ -0,0 +1,756 @@
+from abc import ABC, abstractmethod
+import os
+import traceback
+from typing import TYPE_CHECKING, Optional, Callable, List, Dict, Any, Set
+import shutil
+import time
+import threading
+
+from .executor import DEFAULT_TOOL_CONCURRENCY, FailureBackoff, ToolExecutor
+from .fan import DEFAULT_FAN_CURVE, FanCurve
+from .throttle import ThrottleTimer, is_driver_throttling
+from .scope import (
+    VISIBLE_DEVICES_ENVIRON,
+    DeviceScope,
+    drop_unordered_indices,
+    get_allowed_cpus,
+    parse_uuid_allowlist,
+    parse_visible_devices,
+)
+from .policy import (
+    DEFAULT_FALL_THRESHOLD,
+    DEFAULT_LIMIT_DEADBAND,
+    DEFAULT_MIN_DWELL_TIME,
+    DEFAULT_RISE_THRESHOLD,
+    LimitPolicy,
+)
+
+if TYPE_CHECKING:
+    from .events import EventLog
+    from .journal import StateJournal
+
+
+def is_root():
+    ret = os.geteuid() == 0
+    return ret
+
+
+def repeat_task(
+    func: Optional[Callable] = None,
+    sleep_time: float = 10,
+    stop_event: Optional[threading.Event] = None,
+):
+    if stop_event is None:
+        stop_event = threading.Event()
+    backoff = FailureBackoff()
+    while not stop_event.is_set():
+        try:
+            if func is not None:
+                func()
+            backoff.record_success(func)
+            stop_event.wait(sleep_time)
+        except KeyboardInterrupt:
+            print("[*] Exiting because of keyboard interruption")
+            break
+        except:
+            traceback.print_exc()
+            print("[-] Exception while running task")
+            stop_event.wait(backoff.record_failure(func))
+
+
+def start_as_daemon_thread(func: Callable):
+    thread = threading.Thread(target=func, daemon=True)
+    thread.start()
+    return thread
+
+
+def get_value_from_environ_with_fallback(name: str, fallback_value):
+    ret = os.environ.get(name, fallback_value)
+    ret = type(fallback_value)(ret)
+    return ret
+
+
+# for linux only.
+# TODO: control CPU temperature under 65 celsius
+
+DEFAULT_TARGET_TEMP = 65
+DEFAULT_MAX_POWER_LIMIT_RATIO = 0.8
+DEFAULT_MAX_FREQ_RATIO = 0.8
+DEFAULT_MIN_CLOCK_RATIO = 0.5
+DEFAULT_NVIDIA_CONTROL_MODE = "power"
+NVIDIA_CONTROL_MODES = ["power", "clocks"]
+DEFAULT_CPU_CONTROL_MODE = "freq"
+CPU_CONTROL_MODES = ["freq", "rapl"]
+DEFAULT_TELEMETRY_INTERVAL = 10.0
+DEFAULT_ENERGY_INTERVAL = 5.0
+DEFAULT_EVENT_LEVEL = "INFO"
+
+EVENT_LEVELS = {"DEBUG": 10, "INFO": 20, "WARNING": 30, "ERROR": 40}
+# changes of these device state keys are logged as events
+LIMIT_STATE_KEYS = [
+    "power_limit",
+    "gpu_target_temperature",
+    "max_freq",
+    "governor",
+    "sclk_level",
+    "perf_level",
+    "fan_percent",
+    "locked_clock",
+]
+DEFAULT_CPUFREQ_SYSFS_ROOT = "/sys/devices/system/cpu/cpufreq"
+DEFAULT_POWERCAP_SYSFS_ROOT = "/sys/class/powercap"
+
+
+# read at call time, so importing the package never depends on the environment
+def get_target_temp_config() -> int:
+    ret = get_value_from_environ_with_fallback("TARGET_TEMP", DEFAULT_TARGET_TEMP)
+    return ret
+
+
+def get_max_power_limit_ratio_config() -> float:
+    ret = get_value_from_environ_with_fallback(
+        "MAX_POWER_LIMIT_RATIO", DEFAULT_MAX_POWER_LIMIT_RATIO
+    )
+    return ret
+
+
+def get_max_freq_ratio_config() -> float:
+    ret = get_value_from_environ_with_fallback("MAX_FREQ_RATIO", DEFAULT_MAX_FREQ_RATIO)
+    return ret
+
+
+def get_min_clock_ratio_config() -> float:
+    ret = get_value_from_environ_with_fallback(
+        "MIN_CLOCK_RATIO", DEFAULT_MIN_CLOCK_RATIO
+    )
+    return ret
+
+
+# whether NVIDIA GPUs are held by power limits or locked graphics clocks
+def get_nvidia_control_mode_config() -> str:
+    ret = get_value_from_environ_with_fallback(
+        "NVIDIA_CONTROL_MODE", DEFAULT_NVIDIA_CONTROL_MODE
+    )
+    ret = ret.lower()
+    assert ret in NVIDIA_CONTROL_MODES, f"Unknown NVIDIA control mode: {ret}"
+    return ret
+
+
+# whether CPUs are held by frequency limits or RAPL package power caps
+def get_cpu_control_mode_config() -> str:
+    ret = get_value_from_environ_with_fallback(
+        "CPU_CONTROL_MODE", DEFAULT_CPU_CONTROL_MODE
+    )
+    ret = ret.lower()
+    assert ret in CPU_CONTROL_MODES, f"Unknown CPU control mode: {ret}"
+    return ret
+
+
+def get_cpufreq_sysfs_root_config() -> str:
+    ret = get_value_from_environ_with_fallback(
+        "CPUFREQ_SYSFS_ROOT", DEFAULT_CPUFREQ_SYSFS_ROOT
+    )
+    return ret
+
+
+def get_powercap_sysfs_root_config() -> str:
+    ret = get_value_from_environ_with_fallback(
+        "POWERCAP_SYSFS_ROOT", DEFAULT_POWERCAP_SYSFS_ROOT
+    )
+    return ret
+
+
+def get_telemetry_interval_config() -> float:
+    ret = get_value_from_environ_with_fallback(
+        "TELEMETRY_INTERVAL", DEFAULT_TELEMETRY_INTERVAL
+    )
+    return ret
+
+
+def get_energy_interval_config() -> float:
+    ret = get_value_from_environ_with_fallback(
+        "ENERGY_INTERVAL", DEFAULT_ENERGY_INTERVAL
+    )
+    return ret
+
+
+def get_tool_concurrency_config() -> int:
+    ret = get_value_from_environ_with_fallback(
+        "TOOL_CONCURRENCY", DEFAULT_TOOL_CONCURRENCY
+    )
+    return ret
+
+
+# fan first control is opt in, it takes the fans out of automatic mode
+def get_fan_curve_config() -> Optional[FanCurve]:
+    if not get_value_from_environ_with_fallback("FAN_CONTROL", 0):
+        return None
+    ret = FanCurve.parse(
+        get_value_from_environ_with_fallback("FAN_CURVE", DEFAULT_FAN_CURVE)
+    )
+    return ret
+
+
+def get_limit_policy_config() -> LimitPolicy:
+    ret = LimitPolicy(
+        rise_threshold=get_value_from_environ_with_fallback(
+            "TEMP_RISE_THRESHOLD", DEFAULT_RISE_THRESHOLD
+        ),
+        fall_threshold=get_value_from_environ_with_fallback(
+            "TEMP_FALL_THRESHOLD", DEFAULT_FALL_THRESHOLD
+        ),
+        deadband=get_value_from_environ_with_fallback(
+            "LIMIT_DEADBAND", DEFAULT_LIMIT_DEADBAND
+        ),
+        min_dwell_time=get_value_from_environ_with_fallback(
+            "MIN_DWELL_TIME", DEFAULT_MIN_DWELL_TIME
+        ),
+    )
+    return ret
+
+
+# unlike the settings above, unset and empty mean different things here
+def get_device_scope_config(device_kind: str) -> DeviceScope:
+    if device_kind == "cpu":
+        return DeviceScope(cpus=get_allowed_cpus())
+    visible_devices = None
+    environ_name = VISIBLE_DEVICES_ENVIRON.get(device_kind, None)
+    if environ_name is not None:
+        visible_devices = parse_visible_devices(os.environ.get(environ_name, None))
+    if device_kind == "nvidia":
+        visible_devices = drop_unordered_indices(
+            visible_devices, os.environ.get("CUDA_DEVICE_ORDER", None)
+        )
+    ret = DeviceScope(
+        visible_devices=visible_devices,
+        uuid_allowlist=parse_uuid_allowlist(os.environ.get("GPU_UUID_ALLOWLIST", None)),
+    )
+    return ret
+
+
+# per sustainer, e.g. NVIDIA_EVENT_LEVEL=DEBUG, falling back to EVENT_LEVEL
+def get_event_level_config(device_kind: str) -> str:
+    ret = get_value_from_environ_with_fallback("EVENT_LEVEL", DEFAULT_EVENT_LEVEL)
+    ret = get_value_from_environ_with_fallback(
+        f"{device_kind.upper()}_EVENT_LEVEL", ret
+    )
+    ret = ret.upper()
+    assert ret in EVENT_LEVELS, f"Unknown event level: {ret}"
+    return ret
+
+
+NVIDIA_SMI = "nvidia-smi"
+ENCODING = "utf-8"
+EXEC_TIMEOUT = 5
+TEST_TIMEOUT = 5
+
+ROCM_SMI = "rocm-smi"
+
+CPU_TEMP_SENSOR_PREFIXS = ["coretemp-", "cpu_thermal", "k10temp"]
+
+
+_default_executor: Optional[ToolExecutor] = None
+_default_executor_lock = threading.Lock()
+
+
+# one executor for all sustainers, so the concurrency bound holds per tool.
+# SUSTAINER_RECORD keeps every tool call in a trace, SUSTAINER_REPLAY answers
+# tool calls from one instead of running them.
+def get_default_executor() -> ToolExecutor:
+    global _default_executor
+    with _default_executor_lock:
+        if _default_executor is None:
+            _default_executor = create_executor()
+    return _default_executor
+
+
+def create_executor() -> ToolExecutor:
+    replay_path = get_value_from_environ_with_fallback("SUSTAINER_REPLAY", "")
+    record_path = get_value_from_environ_with_fallback("SUSTAINER_RECORD", "")
+    if replay_path:
+        from .trace import ReplayExecutor
+
+        return ReplayExecutor.load(replay_path)
+    if record_path:
+        from .trace import RecordingExecutor
+
+        return RecordingExecutor(
+            record_path, EXEC_TIMEOUT, get_tool_concurrency_config(), ENCODING
+        )
+    ret = ToolExecutor(EXEC_TIMEOUT, get_tool_concurrency_config(), ENCODING)
+    return ret
+
+
+def check_binary_in_path(binary_name: str):
+    ret = shutil.which(binary_name) != None
+    if ret:
+        print(f"[+] Binary '{binary_name}' detected")
+    return ret
+
+
+class AbstractBaseStatSustainer(ABC):
+    hardware_name = "Hardware"
+    device_kind = "hardware"
+    required_binaries: List[str] = []
+    run_forever: bool
+    test_timeout = TEST_TIMEOUT
+    # seconds between ticks of loops running forever
+    tick_interval = 1.0
+    # device state key of the limit stepped by temperature, if any
+    limit_name: Optional[str] = None
+
+    def __init__(
+        self, target_temp: Optional[int] = None, skip_root_check: bool = False
+    ):
+        # for status queries, and for tests and benchmarks driving fake devices.
+        # nothing stops such an instance from writing, its callers must not.
+        self.skip_root_check = skip_root_check
+        if not skip_root_check:
+            assert is_root(), "You must be root to execute this script"
+        if target_temp is None:
+            target_temp = get_target_temp_config()
+        self.target_temp = target_temp
+        self.device_states: Dict[int, Dict[str, Any]] = {}
+        self.device_target_temps: Dict[int, int] = {}
+        self.paused_devices: Set[int] = set()
+        # limits to start devices at, taken up by the control loop at its next tick
+        self.initial_limits: Dict[int, float] = {}
+        # device settings from before our first write, restored on release
+        self.original_settings: Dict[int, Dict[str, Any]] = {}
+        self.journal: Optional["StateJournal"] = None
+        self.event_log: Optional["EventLog"] = None
+        self.event_level = get_event_level_config(self.device_kind)
+        self.last_error: Optional[str] = None
+        self.executor = get_default_executor()
+        # keyed by device id, None stands for the backend as a whole
+        self.backoff = FailureBackoff()
+        self.limit_policy = get_limit_policy_config()
+        # the devices this sustainer may touch, e.g. those of its container
+        self.scope = get_device_scope_config(self.device_kind)
+        self.throttle_timer = ThrottleTimer()
+        self.fan_curve = get_fan_curve_config()
+        if self.fan_curve is not None and not self.supports_fan_control():
+            self.fan_curve = None
+        # set to end the control loop, which checks it at least once per tick
+        self.stop_event = threading.Event()
+        self.tick_event = threading.Event()
+        self.last_tick_time = time.monotonic()
+        self.tick_count = 0
+        self.verify_binary_requirements()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def is_stopped(self):
+        ret = self.stop_event.is_set()
+        return ret
+
+    # sleeps between ticks, returning early when stopped
+    def sleep(self, seconds: float):
+        ret = self.stop_event.wait(seconds)
+        return ret
+
+    # called by the control loop after each completed tick
+    def mark_tick(self):
+        self.last_tick_time = time.monotonic()
+        self.tick_count += 1
+        self.tick_event.set()
+
+    def get_target_temp(self, device_id: int = 0):
+        ret = self.device_target_temps.get(device_id, self.target_temp)
+        return ret
+
+    def set_device_target_temp(self, device_id: int, target_temp: Optional[int]):
+        if target_temp is None:
+            self.device_target_temps.pop(device_id, None)
+        else:
+            self.device_target_temps[device_id] = int(target_temp)
+
+    # starts a device at the given limit instead of stepping there from the
+    # current one, e.g. where it settled under a job profile the last time
+    def set_initial_limit(self, device_id: int, limit: float):
+        if self.limit_name is None:
+            raise NotImplementedError(
+                f"Initial limits are not supported by {self.__class__.__name__}"
+            )
+        self.initial_limits[device_id] = limit
+
+    # called by the control loop, which writes the limit itself
+    def pop_initial_limit(self, device_id: int) -> Optional[float]:
+        ret = self.initial_limits.pop(device_id, None)
+        return ret
+
+    # the limits of devices under control, paused ones and those about to be
+    # set to an initial limit are left out
+    def get_current_limits(self) -> Dict[int, float]:
+        if self.limit_name is None:
+            return {}
+        ret = {}
+        for device_id, device_state in list(self.device_states.items()):
+            limit = device_state.get(self.limit_name, None)
+            if limit is None or self.is_device_paused(device_id):
+                continue
+            if device_id not in self.initial_limits:
+                ret[device_id] = limit
+        return ret
+
+    def pause_device(self, device_id: int):
+        self.paused_devices.add(device_id)
+
+    def resume_device(self, device_id: int):
+        self.paused_devices.discard(device_id)
+
+    def is_device_paused(self, device_id: int):
+        ret = device_id in self.paused_devices
+        return ret
+
+    def update_device_state(self, device_id: int, **state):
+        device_state = self.device_states.setdefault(device_id, {})
+        temperature = state.get("temperature", None)
+        if temperature is not None:
+            state["above_target"] = temperature > self.get_target_temp(device_id)
+        if self.event_log is not None:
+            self.emit_state_change_events(device_id, device_state, state)
+        device_state.update(state)
+        device_state["updated_at"] = time.time()
+
+    def emit_event(
+        self, event: str, level: str = "INFO", device_id: Optional[int] = None, **fields
+    ):
+        if self.event_log is None:
+            return
+        if EVENT_LEVELS[level] < EVENT_LEVELS[self.event_level]:
+            return
+        if device_id is not None:
+            fields["device"] = self.get_device_name(device_id)
+        self.event_log.emit(event, level, backend=self.__class__.__name__, **fields)
+
+    # only changes are logged, a steady device produces no events
+    def emit_state_change_events(
+        self, device_id: int, device_state: Dict[str, Any], state: Dict[str, Any]
+    ):
+        changed = {
+            k: v
+            for k, v in state.items()
+            if k in LIMIT_STATE_KEYS and device_state.get(k, None) != v
+        }
+        if changed:
+            self.emit_event(
+                "limit_changed",
+                device_id=device_id,
+                previous={k: device_state.get(k, None) for k in changed},
+                **changed,
+            )
+        above_target = state.get("above_target", None)
+        if above_target is not None and above_target != device_state.get(
+            "above_target", False
+        ):
+            self.emit_event(
+                "threshold_crossed",
+                "WARNING" if above_target else "INFO",
+                device_id=device_id,
+                above_target=above_target,
+                temperature=state["temperature"],
+                target_temp=self.get_target_temp(device_id),
+            )
+
+    # repeated failures of the same kind are reported once
+    def report_backend_error(self, error: BaseException):
+        message = f"{type(error).__name__}: {error}"
+        if message == self.last_error:
+            return
+        self.last_error = message
+        if self.event_log is None:
+            traceback.print_exc()
+            print("[-] Failed to run current loop")
+            return
+        self.emit_event(
+            "backend_error", "ERROR", error=message, traceback=traceback.format_exc()
+        )
+
+    def report_backend_recovered(self):
+        if self.last_error is None:
+            return
+        self.last_error = None
+        self.emit_event("backend_recovered")
+
+    # runs one device's share of a tick, backing off the device after failures
+    def run_device_tick(self, device_id: int, func: Callable[[int], Any]) -> bool:
+        if not self.backoff.is_allowed(device_id):
+            return False
+        try:
+            func(device_id)
+        except Exception as e:
+            delay = self.backoff.record_failure(device_id)
+            self.report_device_error(device_id, e, delay)
+            return False
+        if self.backoff.record_success(device_id):
+            self.emit_event("device_recovered", device_id=device_id)
+        return True
+
+    # reported on the first failure and when the circuit opens, not on every retry
+    def report_device_error(self, device_id: int, error: BaseException, delay: float):
+        failures = self.backoff.get_failures(device_id)
+        if failures == 1:
+            event = "device_error"
+        elif failures == self.backoff.circuit_threshold:
+            event = "circuit_opened"
+        else:
+            return
+        message = f"{type(error).__name__}: {error}"
+        if self.event_log is None:
+            traceback.print_exc()
+            print(
+                f"[-] {event} on {self.get_device_name(device_id)}, retrying in {delay:.1f}s"
+            )
+            return
+        self.emit_event(
+            event,
+            "ERROR",
+            device_id=device_id,
+            error=message,
+            failures=failures,
+            retry_in=delay,
+        )
+
+    # clock throttle reasons reported by the driver, as of this tick
+    def update_throttle_reasons(self, device_id: int, reasons: Set[str]):
+        self.throttle_timer.add_sample(device_id, reasons)
+        self.update_device_state(device_id, throttle_reasons=sorted(reasons))
+
+    # whether the driver already slows the device down for heat or power delivery
+    def is_driver_throttling(self, device_id: int):
+        reasons = self.device_states.get(device_id, {}).get("throttle_reasons", [])
+        ret = is_driver_throttling(reasons)
+        return ret
+
+    def supports_fan_control(self) -> bool:
+        return False
+
+    def set_fan_percent(self, device_id: int, fan_percent: int):
+        raise NotImplementedError(
+            f"Fan control is not supported by {self.__class__.__name__}"
+        )
+
+    # back to automatic fan control
+    def reset_fans(self, device_id: int):
+        raise NotImplementedError(
+            f"Fan control is not supported by {self.__class__.__name__}"
+        )
+
+    # sets the fans along the curve and tells whether they are saturated, that is
+    # whether clocks or power have to be throttled. always true without fan control.
+    def apply_fan_curve(self, device_id: int, temperature: float) -> bool:
+        if self.fan_curve is None:
+            return True
+        fan_percent = self.fan_curve.get_fan_percent(
+            temperature, self.get_target_temp(device_id)
+        )
+        if self.device_states.get(device_id, {}).get("fan_percent") != fan_percent:
+            self.capture_original_settings(device_id)
+            self.set_fan_percent(device_id, fan_percent)
+            self.update_device_state(device_id, fan_percent=fan_percent)
+        ret = self.fan_curve.is_saturated(fan_percent)
+        return ret
+
+    def get_device_name(self, device_id: int):
+        ret = f"{self.device_kind}:{device_id}"
+        return ret
+
+    def read_status(self) -> Dict[str, Dict[str, Any]]:
+        raise NotImplementedError(
+            f"Reading status is not supported by {self.__class__.__name__}"
+        )
+
+    # watts drawn by each device right now, for energy accounting
+    def read_power_draw(self) -> Dict[int, float]:
+        raise NotImplementedError(
+            f"Reading power draw is not supported by {self.__class__.__name__}"
+        )
+
+    def get_status_snapshot(self) -> Dict[str, Dict[str, Any]]:
+        ret = {}
+        device_ids = set(self.device_states.keys()) | self.paused_devices
+        device_ids |= set(self.device_target_temps.keys())
+        for device_id in sorted(device_ids):
+            device_state = dict(self.device_states.get(device_id, {}))
+            device_state["target_temp"] = self.get_target_temp(device_id)
+            device_state["paused"] = self.is_device_paused(device_id)
+            device_state["limit_changes_hour"] = self.limit_policy.get_hourly_changes(
+                device_id
+            )
+            throttle_seconds = self.throttle_timer.get_seconds(device_id)
+            if throttle_seconds:
+                device_state["throttle_seconds"] = throttle_seconds
+            ret[self.get_device_name(device_id)] = device_state
+        return ret
+
+    # what a control loop started over needs to carry on where the last one
+    # stopped, above all the original settings, which must not be captured again
+    def get_controller_state(self) -> Dict[str, Any]:
+        ret = {
+            "device_states": {k: dict(v) for k, v in list(self.device_states.items())},
+            "device_target_temps": dict(self.device_target_temps),
+            "paused_devices": sorted(self.paused_devices),
+            "original_settings": dict(self.original_settings),
+        }
+        return ret
+
+    def set_controller_state(self, state: Dict[str, Any]):
+        self.device_states.update(state["device_states"])
+        self.device_target_temps.update(state["device_target_temps"])
+        self.paused_devices.update(state["paused_devices"])
+        self.original_settings.update(state["original_settings"])
+
+    def capture_device_settings(self, device_id: int) -> Dict[str, Any]:
+        raise NotImplementedError(
+            f"Capturing settings is not supported by {self.__class__.__name__}"
+        )
+
+    def apply_device_settings(self, device_id: int, settings: Dict[str, Any]):
+        raise NotImplementedError(
+            f"Applying settings is not supported by {self.__class__.__name__}"
+        )
+
+    # call before writing to a device, so release can put it back as we found it
+    def capture_original_settings(self, device_id: int):
+        if device_id in self.original_settings:
+            return
+        settings = self.capture_device_settings(device_id)
+        self.original_settings[device_id] = settings
+        if self.journal is not None:
+            self.journal.record(
+                self.get_device_name(device_id), self.__class__.__name__, settings
+            )
+
+    def restore_original_settings(self, device_id: int, settings: Dict[str, Any]):
+        print(f"[*] Restoring original settings of {self.get_device_name(device_id)}")
+        self.apply_device_settings(device_id, settings)
+        self.original_settings.pop(device_id, None)
+        if self.journal is not None:
+            self.journal.discard(self.get_device_name(device_id))
+
+    def release_device(self, device_id: int):
+        settings = self.original_settings.get(device_id, None)
+        if settings is None:
+            print(f"[*] Nothing to release on {self.get_device_name(device_id)}")
+            return
+        self.restore_original_settings(device_id, settings)
+
+    def verify_binary_requirements(self):
+        for it in self.required_binaries:
+            assert self.executor.has_binary(it), f"Binary '{it}' not found in path"
+
+    # the control loop, backing off the whole backend when a tick fails
+    def run_ticks(self, tick: Callable[[], Any]):
+        while not self.is_stopped():
+            try:
+                tick()
+                self.backoff.record_success(None)
+                self.report_backend_recovered()
+                self.mark_tick()
+                if not self.run_forever:
+                    break
+                self.sleep(self.tick_interval)
+            except Exception as e:
+                self.report_backend_error(e)
+                self.sleep(self.backoff.record_failure(None))
+
+    @abstractmethod
+    def main(self):
+        ...
+
+    # runs the control loop until its first tick completes, then stops it,
+    # so the loop cleans up after itself before the test returns
+    def test(self):
+        print(f"[*] Running test for {self.__class__.__name__}")
+        errors: List[BaseException] = []
+
+        def run_main():
+            try:
+                self.main()
+            except BaseException as e:
+                traceback.print_exc()
+                errors.append(e)
+
+        self.stop_event.clear()
+        self.tick_event.clear()
+        thread = start_as_daemon_thread(run_main)
+        deadline = time.monotonic() + self.test_timeout
+        while thread.is_alive() and time.monotonic() < deadline:
+            if self.tick_event.wait(0.05):
+                break
+        ret = self.tick_event.is_set()
+        self.stop()
+        thread.join(self.test_timeout)
+        if thread.is_alive():
+            print("[-] Control loop did not stop in time")
+            ret = False
+        ret = ret and not errors
+        self.stop_event.clear()
+        self.tick_event.clear()
+        if not ret:
+            self.release_tested_devices()
+        print("[+] Test passed" if ret else "[-] Test failed")
+        return ret
+
+    # the test tick writes limits, an unused backend must not leave them behind
+    def release_tested_devices(self):
+        for device_id in list(self.original_settings.keys()):
+            try:
+                self.release_device(device_id)
+            except:
+                traceback.print_exc()
+                print(f"[-] Failed to release {self.get_device_name(device_id)}")
+
+
+class AbstractTestStatSustainer(AbstractBaseStatSustainer):
+    @abstractmethod
+    def mainloop(self):
+        ...
+
+    def main(self):
+        self.run_ticks(self.mainloop)
+
+    def test(self):
+        ret = False
+        try:
+            self.mainloop()
+            # device failures are caught by the tick, but still fail the test
+            ret = not self.backoff.failures
+        except:
+            traceback.print_exc()
+        if not ret:
+            print(f"[-] Test failed for running '{self.__class__.__name__}'")
+            self.release_tested_devices()
+        self.backoff.reset()
+        return ret
+
+
+class AbstractStatSustainer(AbstractTestStatSustainer):
+    def mainloop(self):
+        for index in self.get_device_indices():
+            if self.is_device_paused(index):
+                continue
+            self.run_device_tick(index, self.sustain_device)
+
+    def sustain_device(self, device_id: int):
+        all_set = self.verify_stats(device_id)
+        if not all_set:
+            self.set_stats(device_id)
+            assert self.verify_stats(
+                device_id
+            ), f"[-] {self.hardware_name} stat limits verification failed"
+        self.update_device_state(device_id, limits_set=True)
+
+    @abstractmethod
+    def get_device_indices(self) -> List[int]:
+        ...
+
+    @abstractmethod
+    def verify_stats(self, device_id: int) -> bool:
+        ...
+
+    @abstractmethod
+    def set_stats(self, device_id: int):
+        ...
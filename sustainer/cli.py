@@ -1,15 +1,42 @@
 import argparse
-from .lib import HardwareStatSustainer
+import json
+import os
 import sys
+import time
 import traceback
+from typing import Any, Dict, List, Optional
 
+# keep imports light here: backends are only imported by the commands needing them
+from .protocol import (
+    DEFAULT_SOCKET_PATH,
+    get_socket_path_config,
+    is_unix_socket_in_use,
+    send_unix_request,
+)
 
-def parse_args():
+
+# shared by the main parser and the commands talking to a daemon. commands leave
+# it unset unless given, so "-s" before the command name is not overridden.
+def create_socket_parser(default: Any):
+    ret = argparse.ArgumentParser(add_help=False)
+    ret.add_argument(
+        "-s",
+        "--socket",
+        type=str,
+        default=default,
+        help=f"""Path of the control socket (default: {DEFAULT_SOCKET_PATH}).""",
+    )
+    return ret
+
+
+def parse_args(argv: Optional[List[str]] = None):
     # Create the parser
     parser = argparse.ArgumentParser(
         description="Keep GPU and CPU temperatures within given limit.",
         formatter_class=argparse.RawTextHelpFormatter,
+        parents=[create_socket_parser(None)],
     )
+    command_socket_parser = create_socket_parser(argparse.SUPPRESS)
 
     # Add arguments
     parser.add_argument(
@@ -20,6 +47,89 @@ def parse_args():
         choices=["all", "cpu", "gpu"],
         help="""Specify the hardware target to sustain stats.""",
     )
+    parser.add_argument(
+        "-d",
+        "--daemon",
+        action="store_true",
+        help="""Serve the control API on a local Unix socket.""",
+    )
+    parser.add_argument(
+        "-a",
+        "--aggregator",
+        type=str,
+        default=None,
+        help="""Push telemetry to a fleet aggregator at 'host:port'.""",
+    )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        action="store_true",
+        help="""Run each backend in a supervised worker process.""",
+    )
+
+    subparsers = parser.add_subparsers(dest="command", metavar="command")
+    status_parser = subparsers.add_parser(
+        "status",
+        parents=[command_socket_parser],
+        help="Print device status, cached by a running daemon or read once from every backend.",
+    )
+    status_parser.add_argument(
+        "-j", "--json", action="store_true", help="Print JSON instead of a table."
+    )
+    status_parser.add_argument(
+        "-l",
+        "--live",
+        action="store_true",
+        help="Read from hardware even if a daemon is running.",
+    )
+    status_parser.add_argument(
+        "--timeout",
+        type=float,
+        default=5,
+        help="Total time limit in seconds for reading hardware (default: 5).",
+    )
+    energy_parser = subparsers.add_parser(
+        "energy",
+        parents=[command_socket_parser],
+        help="Print energy used per device and hour, as accounted by a running daemon.",
+    )
+    energy_parser.add_argument(
+        "-j", "--json", action="store_true", help="Print JSON instead of a table."
+    )
+    footprint_parser = subparsers.add_parser(
+        "footprint",
+        parents=[command_socket_parser],
+        help="Print memory, threads and cpu time used by a running daemon itself.",
+    )
+    footprint_parser.add_argument(
+        "-j", "--json", action="store_true", help="Print JSON instead of a table."
+    )
+    footprint_parser.add_argument(
+        "--top",
+        type=int,
+        default=10,
+        help="Source lines grown the most, with SUSTAINER_TRACEMALLOC=1 (default: 10).",
+    )
+    profile_parser = subparsers.add_parser(
+        "profile",
+        parents=[command_socket_parser],
+        help="Switch a running daemon to a named profile, or print the active one.",
+    )
+    profile_parser.add_argument(
+        "name", type=str, nargs="?", default=None, help="Profile to switch to."
+    )
+    profile_parser.add_argument(
+        "-c",
+        "--clear",
+        action="store_true",
+        help="Go back to the default targets, without a profile.",
+    )
+    probe_parser = subparsers.add_parser(
+        "probe", help="Detect usable backends without touching hardware."
+    )
+    probe_parser.add_argument(
+        "-j", "--json", action="store_true", help="Print JSON instead of a table."
+    )
 
     # Provide additional help information
     parser.epilog = """
@@ -30,20 +140,245 @@ environment variables:
         max power consumption compared to hardware enforced limit
     MAX_FREQ_RATIO (default: 0.8)
         max frequency compared to hardware enforced limit
+    SUSTAINER_SOCKET (default: /run/sustainer.sock)
+        path of the control socket in daemon mode
+    TELEMETRY_INTERVAL (default: 10)
+        seconds between telemetry pushes to the fleet aggregator
+    SUSTAINER_FLEET_TOKEN (default: none)
+        shared token sent to the fleet aggregator, which must be given the same
+    SUSTAINER_JOURNAL (default: /var/lib/sustainer/journal.json)
+        where original device settings are kept until restored
+    ENERGY_INTERVAL (default: 5)
+        seconds between power draw samples for energy accounting
+    TOOL_CONCURRENCY (default: 2)
+        concurrent invocations allowed per external tool, e.g. nvidia-smi
+    TEMP_RISE_THRESHOLD (default: 0)
+        degrees above the target before limits come down
+    TEMP_FALL_THRESHOLD (default: 2)
+        degrees below the target before limits go back up
+    MIN_DWELL_TIME (default: 10)
+        seconds after a decrease before a limit may go back up
+    LIMIT_DEADBAND (default: 0.02)
+        smallest limit change written, relative to the current limit
+    CUDA_VISIBLE_DEVICES, ROCR_VISIBLE_DEVICES (default: all)
+        GPU indices or UUIDs to control, the others are left alone. CUDA
+        indices need CUDA_DEVICE_ORDER=PCI_BUS_ID, or only UUIDs apply
+    GPU_UUID_ALLOWLIST (default: all)
+        comma separated GPU UUIDs to control
+    CPU_CONTROL_MODE (default: freq)
+        set to rapl to cap CPU package power instead of limiting frequency
+    NVIDIA_CONTROL_MODE (default: power)
+        set to clocks to lock NVIDIA graphics clocks instead of capping power
+    MIN_CLOCK_RATIO (default: 0.5)
+        lowest locked clock compared to the max graphics clock
+    FAN_CONTROL (default: 0)
+        set to 1 to raise GPU fan speed before throttling
+    FAN_CURVE (default: -15:30,-8:60,-3:85,0:100)
+        fan percent by degrees relative to the target temperature
+    SUSTAINER_EVENT_LOG (default: /var/log/sustainer/events.jsonl)
+        where state change events are written, as JSON lines
+    EVENT_LEVEL (default: INFO)
+        lowest level of logged events: DEBUG, INFO, WARNING or ERROR.
+        set per sustainer with CPU_EVENT_LEVEL, NVIDIA_EVENT_LEVEL, AMD_EVENT_LEVEL
+    SUSTAINER_WORKERS (default: 0)
+        set to 1 to run each backend in a supervised worker process, like --workers
+    WORKER_STALL_TIMEOUT (default: 120)
+        seconds without a completed tick before a worker is restarted
+    SUSTAINER_PROFILES (default: /etc/sustainer/profiles.json)
+        named profiles of per device targets and initial limits, as JSON
+    SUSTAINER_PROFILE_FILE (default: /run/sustainer/profile)
+        holds the name of the profile to switch to, e.g. written by a Slurm prolog
+    SUSTAINER_LEARNED_LIMITS (default: /var/lib/sustainer/learned_limits.json)
+        where the steady state limits learned per profile are kept
+    PROFILE_LEARNING_INTERVAL (default: 30)
+        seconds between samples of the steady state limits
+    SUSTAINER_TRACEMALLOC (default: 0)
+        set to 1 to trace allocations of the daemon, reported by footprint
+    SUSTAINER_RECORD (default: off)
+        path of a gzipped trace of every external tool call and its output
+    SUSTAINER_REPLAY (default: off)
+        path of a recorded trace to answer tool calls from instead of running them
 """
 
     # Parse the arguments
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
     return args
 
 
-def call_sustainer(target: str):
-    kwargs = {}
+def call_sustainer(
+    target: str,
+    socket_path: Optional[str] = None,
+    aggregator_address: Optional[str] = None,
+    workers: bool = False,
+):
+    # checked before any device is touched, the journal belongs to the running one
+    if socket_path is not None and is_unix_socket_in_use(socket_path):
+        print(f"[-] A sustainer daemon is already listening at '{socket_path}'")
+        return 1
+    from .lib import HardwareStatSustainer
+
+    kwargs: Dict[str, Any] = {}
+    if workers:
+        kwargs["workers"] = True
     if target == "cpu":
         kwargs["gpu"] = False
     elif target == "gpu":
         kwargs["cpu"] = False
-    HardwareStatSustainer(**kwargs).main()
+    HardwareStatSustainer(**kwargs).main(
+        socket_path=socket_path, aggregator_address=aggregator_address
+    )
+
+
+def format_table(rows: List[Dict[str, Any]]):
+    columns: List[str] = []
+    for row in rows:
+        columns.extend(it for it in row.keys() if it not in columns)
+    cells = [columns] + [
+        ["" if row.get(it) is None else str(row.get(it)) for it in columns]
+        for row in rows
+    ]
+    widths = [max(len(line[index]) for line in cells) for index in range(len(columns))]
+    ret = "\n".join(
+        "  ".join(cell.ljust(width) for cell, width in zip(line, widths)).rstrip()
+        for line in cells
+    )
+    return ret
+
+
+def print_rows(rows: List[Dict[str, Any]], as_json: bool):
+    if as_json:
+        print(json.dumps(rows, indent=4))
+    elif rows:
+        print(format_table(rows))
+
+
+def request_daemon_devices(command: str, socket_path: str):
+    try:
+        response = send_unix_request({"command": command}, socket_path)
+    except OSError as e:
+        print(f"[-] No sustainer daemon reachable at '{socket_path}': {e}")
+        return None
+    if not response["ok"]:
+        print(f"[-] Daemon failed to report {command}:", response.get("error"))
+        return None
+    return response
+
+
+def call_daemon_status(socket_path: str, as_json: bool):
+    response = request_daemon_devices("status", socket_path)
+    if response is None:
+        return 1
+    rows = [{"device": k, **v} for k, v in response["devices"].items()]
+    print_rows(rows, as_json)
+    return 0
+
+
+def call_live_status(as_json: bool, timeout: float):
+    from .status import collect_status
+
+    rows = collect_status(timeout=timeout)
+    if not rows:
+        print("[-] No backend detected to read status from")
+        return 1
+    print_rows(rows, as_json)
+    ret = 1 if any("error" in it for it in rows) else 0
+    return ret
+
+
+def call_status(socket_path: Optional[str], as_json: bool, live: bool, timeout: float):
+    if socket_path is None:
+        socket_path = get_socket_path_config()
+    if not live and os.path.exists(socket_path):
+        return call_daemon_status(socket_path, as_json)
+    return call_live_status(as_json, timeout)
+
+
+def call_energy(socket_path: Optional[str], as_json: bool):
+    if socket_path is None:
+        socket_path = get_socket_path_config()
+    response = request_daemon_devices("energy", socket_path)
+    if response is None:
+        return 1
+    rows = []
+    for device_name, report in response["devices"].items():
+        for hour in report["hours"]:
+            rows.append(
+                {
+                    "device": device_name,
+                    "hour": time.strftime(
+                        "%Y-%m-%d %H:00", time.localtime(hour["hour"])
+                    ),
+                    "energy_kwh": round(hour["energy_kwh"], 6),
+                    "average_power": round(hour["average_power"], 1),
+                }
+            )
+    if as_json:
+        print(json.dumps(response["devices"], indent=4))
+    elif rows:
+        print(format_table(rows))
+    else:
+        print("[-] No power draw accounted yet")
+    return 0
+
+
+def call_footprint(socket_path: Optional[str], as_json: bool, top: int):
+    if socket_path is None:
+        socket_path = get_socket_path_config()
+    try:
+        response = send_unix_request({"command": "footprint", "top": top}, socket_path)
+    except OSError as e:
+        print(f"[-] No sustainer daemon reachable at '{socket_path}': {e}")
+        return 1
+    if not response["ok"]:
+        print("[-] Daemon failed to report footprint:", response.get("error"))
+        return 1
+    footprint = response["footprint"]
+    if as_json:
+        print(json.dumps(footprint, indent=4))
+        return 0
+    top_allocations = footprint.pop("top_allocations", [])
+    print_rows([{"metric": k, "value": v} for k, v in footprint.items()], False)
+    if top_allocations:
+        print()
+        print_rows(top_allocations, False)
+    return 0
+
+
+def call_profile(socket_path: Optional[str], name: Optional[str], clear: bool):
+    if socket_path is None:
+        socket_path = get_socket_path_config()
+    if name is None and not clear:
+        response = request_daemon_devices("profile", socket_path)
+        if response is None:
+            return 1
+        print("[*] Active profile:", response["profile"])
+        print("[*] Profiles:", *response["profiles"])
+        return 0
+    try:
+        response = send_unix_request(
+            {"command": "set_profile", "profile": name}, socket_path
+        )
+    except OSError as e:
+        print(f"[-] No sustainer daemon reachable at '{socket_path}': {e}")
+        return 1
+    if not response["ok"]:
+        print("[-] Failed to switch profile:", response.get("error"))
+        return 1
+    print("[+] Active profile:", response["profile"])
+    rows = [{"device": k, **v} for k, v in response["devices"].items()]
+    print_rows(rows, False)
+    return 0
+
+
+def call_probe(as_json: bool):
+    from .backends import probe_backends
+
+    rows = probe_backends()
+    for it in rows:
+        it["missing"] = ",".join(it["missing"])
+    print_rows(rows, as_json)
+    ret = 0 if any(it["available"] for it in rows) else 1
+    return ret
 
 
 def github_info_excepthook(exctype, value, tb):
@@ -72,8 +407,30 @@ def set_excepthook():
 def main():
     set_excepthook()
     cli_args = parse_args()
+    if cli_args.command == "status":
+        sys.exit(
+            call_status(cli_args.socket, cli_args.json, cli_args.live, cli_args.timeout)
+        )
+    elif cli_args.command == "energy":
+        sys.exit(call_energy(cli_args.socket, cli_args.json))
+    elif cli_args.command == "footprint":
+        sys.exit(call_footprint(cli_args.socket, cli_args.json, cli_args.top))
+    elif cli_args.command == "profile":
+        sys.exit(call_profile(cli_args.socket, cli_args.name, cli_args.clear))
+    elif cli_args.command == "probe":
+        sys.exit(call_probe(cli_args.json))
     target = cli_args.target
-    call_sustainer(target)
+    socket_path = None
+    if cli_args.daemon:
+        socket_path = cli_args.socket or get_socket_path_config()
+    sys.exit(
+        call_sustainer(
+            target,
+            socket_path=socket_path,
+            aggregator_address=cli_args.aggregator,
+            workers=cli_args.workers,
+        )
+    )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,814 @@
+import os
+import re
+import shlex
+from typing import Optional, Union, List, Dict, Any, Tuple
+
+import time
+import logging, signal
+import json
+
+from .base import (
+    AbstractBaseStatSustainer,
+    CPU_TEMP_SENSOR_PREFIXS,
+    get_cpufreq_sysfs_root_config,
+    get_max_freq_ratio_config,
+    get_powercap_sysfs_root_config,
+)
+from .policy import HOLD, LOWER, RAISE
+from .scope import DEFAULT_CPU_SYSFS_ROOT, PACKAGE_NAME_PATTERN
+
+
+class CPUBaseStatSustainer(AbstractBaseStatSustainer):
+    hardware_name = "CPU"
+    device_kind = "cpu"
+    run_forever = True
+
+
+class CPUFreqUtilStatSustainer(CPUBaseStatSustainer):
+    required_binaries = ["sensors", "cpufreq-info", "cpufreq-set"]
+    limit_name = "max_freq"
+
+    def __init__(
+        self,
+        relax_time: Optional[int] = None,
+        max_freq_ratio: Optional[float] = None,
+        skip_root_check: bool = False,
+    ):
+        super().__init__(skip_root_check=skip_root_check)
+        if max_freq_ratio is None:
+            max_freq_ratio = get_max_freq_ratio_config()
+        self.max_freq_ratio = max_freq_ratio
+        self.relax_time, self.crit_temp = self.getArguments(
+            relax_time, self.target_temp
+        )
+        self.hardware = self.hardwareCheck()
+        self.skip_set_to_normal = False
+
+    def get_temperature_readings(self):
+        if "sensors" not in self.required_binaries and not self.executor.has_binary(
+            "sensors"
+        ):
+            # falls back to the thermal zone readings of hardwareCheck
+            return {}
+        cmdlist = ["sensors", "-j"]
+        output = self.executor.check_output(cmdlist)
+        ret = json.loads(output)
+        return ret
+
+    @staticmethod
+    def check_prefix_in_strlist(strlist: List[str], prefix: str):
+        ret = False
+        for it in strlist:
+            if it.startswith(prefix):
+                ret = True
+                break
+        return ret
+
+    def detect_platform_from_readings(self, readings: dict):
+        reading_keys = list(readings.keys())
+        ret = -1
+        for index, elem in enumerate(CPU_TEMP_SENSOR_PREFIXS):
+            if self.check_prefix_in_strlist(reading_keys, elem):
+                ret = index
+                break
+        return ret
+
+    @staticmethod
+    def filter_by_prefix_and_calculate_max_value_from_readings(
+        readings: Dict[str, dict], prefix: str
+    ):
+        ret = 0
+        for adaptor_name, sensor in readings.items():
+            if adaptor_name.startswith(prefix):
+                for _, sensor_value in sensor.items():
+                    if type(sensor_value) is dict:
+                        for (
+                            sensor_value_key,
+                            sensor_value_reading,
+                        ) in sensor_value.items():
+                            if sensor_value_key.endswith("_input"):
+                                ret = max(ret, sensor_value_reading)
+        return ret
+
+    def get_cpu_temperature(self):
+        readings = self.get_temperature_readings()
+        ret = None
+        platform_id = self.detect_platform_from_readings(readings)
+        ret = 0
+        if platform_id != -1:
+            prefix = CPU_TEMP_SENSOR_PREFIXS[platform_id]
+            ret = (
+                self.filter_by_prefix_and_calculate_max_value_from_readings(
+                    readings, prefix
+                )
+                * 1000
+            )
+        if int(ret) == 0:
+            ret = self.getTemp(self.hardware)
+        return ret
+
+    @staticmethod
+    def getArguments(time: Optional[int], crit_temp: Optional[int]):
+        if time is None:
+            relaxtime = 1  # time in seconds
+        else:
+            relaxtime = int(time)
+        if crit_temp is None:
+            crit_temp = 64000  # temp in mili celcius degree
+        else:
+            crit_temp = int(crit_temp) * 1000
+        return relaxtime, crit_temp
+
+    # determine hardware and kernel types
+    @staticmethod
+    def hardwareCheck():
+        # does this work: $ echo "performance" | sudo tee /sys/devices/system/cpu/cpu*/cpufreq/scaling_governor
+        if (
+            os.path.exists(
+                "/sys/devices/LNXSYSTM:00/LNXTHERM:00/LNXTHERM:01/thermal_zone/temp"
+            )
+            == True
+        ):
+            return 4
+        elif (
+            os.path.exists("/sys/bus/acpi/devices/LNXTHERM:00/thermal_zone/temp")
+            == True
+        ):
+            return 5  # intel
+        elif os.path.exists("/sys/class/hwmon/hwmon0") == True:
+            return 6  # amd
+        elif os.path.exists("/sys/class/thermal/thermal_zone3/") == True:
+            return 7  # intel
+        elif os.path.exists("/proc/acpi/thermal_zone/THM0/temperature") == True:
+            return 1
+        elif os.path.exists("/proc/acpi/thermal_zone/THRM/temperature") == True:
+            return 2
+        elif os.path.exists("/proc/acpi/thermal_zone/THR1/temperature") == True:
+            return 3
+        else:
+            return 0
+
+    # depending on the kernel and hardware config, read the temperature
+    @staticmethod
+    def getTemp(hardware: int):
+        if hardware == 0:
+            raise Exception("[-] Sorry, this hardware is not supported")
+        temp = 0
+        if hardware == 6:
+            # logging.debug('reading temp..')
+            with open("/sys/class/hwmon/hwmon0/temp1_input", "r") as mem1:
+                temp = mem1.read().strip()
+        elif hardware == 1:
+            temp = (
+                open("/proc/acpi/thermal_zone/THM0/temperature")
+                .read()
+                .strip()
+                .lstrip("temperature :")
+                .rstrip(" C")
+            )
+        elif hardware == 2:
+            temp = (
+                open("/proc/acpi/thermal_zone/THRM/temperature")
+                .read()
+                .strip()
+                .lstrip("temperature :")
+                .rstrip(" C")
+            )
+        elif hardware == 3:
+            temp = (
+                open("/proc/acpi/thermal_zone/THR1/temperature")
+                .read()
+                .strip()
+                .lstrip("temperature :")
+                .rstrip(" C")
+            )
+        elif hardware == 4:
+            temp = (
+                open(
+                    "/sys/devices/LNXSYSTM:00/LNXTHERM:00/LNXTHERM:01/thermal_zone/temp"
+                )
+                .read()
+                .strip()
+                .rstrip("000")
+            )
+        elif hardware == 5:
+            with open("/sys/class/thermal/thermal_zone0/temp") as mem1:
+                temp = mem1.read().strip()
+        elif hardware == 7:
+            with open("/sys/class/thermal/thermal_zone3/temp") as mem1:
+                temp = mem1.read().strip()
+        else:
+            return 0
+        # logging.debug(f"Temp is {temp}")
+        # logging.debug(f"Temp is an integer: {isinstance(temp, int)}")
+        temp = float(temp)
+        if temp < 1000:
+            temp = temp * 1000
+        return int(temp)
+
+    def get_command_output(self, cmdlist: List[str], strip: bool = True):
+        proc = self.executor.run(cmdlist, check=False)
+        assert (
+            proc.returncode == 0
+        ), f"Failed to execute command with exit code {proc.returncode}: {cmdlist}"
+        ret = proc.stdout
+        if strip:
+            ret = ret.strip()
+        return ret
+
+    # split without a shell, none of the commands needs one
+    def get_shell_output(self, command: str, strip: bool = True):
+        ret = self.get_command_output(shlex.split(command), strip=strip)
+        return ret
+
+    def get_cpu_freq_policy_output(self):
+        ret = self.get_shell_output("cpufreq-info -p")
+        return ret
+
+    def get_cpu_freq_hwlimit_output(self):
+        ret = self.get_shell_output("cpufreq-info -l")
+        return ret
+
+    def getMinMaxFrequencies(self, hardware: int):
+        if hardware == 0:
+            # with open("/sys/devices/system/cpu/cpu0/cpufreq/cpuinfo_min_freq", 'r') as mem1:
+            #     min_freq = mem1.read().strip()
+            # with open("/sys/devices/system/cpu/cpu0/cpufreq/cpuinfo_max_freq", 'r') as mem1:
+            #     max_freq = mem1.read().strip()
+            # return (min_freq, max_freq, '')
+            raise Exception("Unable to get CPU frequency for unknown hardware")
+        else:
+            hwfreq_out = self.get_cpu_freq_hwlimit_output()
+            freq_out = self.get_cpu_freq_policy_output()
+            return tuple(
+                [
+                    *hwfreq_out.split(" "),
+                    freq_out.lower().split(" ")[-1],
+                ]
+            )
+
+    def get_policy_max_freq(self):
+        policy_out = self.get_cpu_freq_policy_output()
+        ret = int(policy_out.split(" ")[1])
+        return ret
+
+    def read_status(self) -> Dict[str, Dict[str, Any]]:
+        min_freq, max_freq, governor = self.getMinMaxFrequencies(self.hardware)
+        ret = {
+            self.get_device_name(0): {
+                "temperature": self.get_cpu_temperature() / 1000,
+                "governor": governor,
+                "max_freq": self.get_policy_max_freq(),
+                "hw_min_freq": int(min_freq),
+                "hw_max_freq": int(max_freq),
+            }
+        }
+        return ret
+
+    def setMaxFreqPerCore(self, frequency: int, core_index: int):
+        self.get_shell_output(f"cpufreq-set -c {core_index} --max {frequency}")
+
+    def setMaxFreq(self, frequency: int, hardware: int, cores: List[int]):
+        if hardware != 0:
+            for x in cores:
+                logging.debug(f"Setting core {x} to {frequency} KHz")
+                self.setMaxFreqPerCore(frequency, x)
+
+    def setGovernor(self, hardware: int, governor: Union[str, int]):
+        if self.scope.cpus is None:
+            self.get_shell_output(f"cpufreq-set -g {governor}")
+            return
+        # confined to some cores, e.g. by a container cpuset
+        for it in self.get_cores():
+            self.get_shell_output(f"cpufreq-set -c {it} -g {governor}")
+
+    def getCovernors(self, hardware: int):
+        govs = self.executor.run(["cpufreq-info", "-g"], check=False)
+        if govs.returncode != 0:
+            logging.warning("cpufreq-info gives error, cpufrequtils package installed?")
+            return ()
+        else:
+            logging.debug(f"cpufreq-info governors: {govs.stdout.strip()}")
+            if govs.stdout is None:
+                logging.warning("No covernors found!?")
+                logging.debug(f"Govs: {govs.stdout}")
+                return ()
+            else:
+                return tuple(govs.stdout.strip().lower().split(" "))
+
+    # if proces receives a kill signal or sigterm,
+    # raise an error and handle it in the finally statement for a proper exit
+    @staticmethod
+    def signal_term_handler(self, args):  # type:ignore
+        raise KeyboardInterrupt()
+
+    def set_signal_handler(self):
+        try:
+            signal.signal(signal.SIGINT, self.signal_term_handler)
+            signal.signal(signal.SIGTERM, self.signal_term_handler)
+        except ValueError:
+            print("[-] Failed to set signal handler for CPUStatSustainer")
+
+    # cores this process may run on, as allowed by its affinity or cpuset
+    def get_cores(self) -> List[int]:
+        cores = os.cpu_count()
+        if cores is None:
+            logging.warn("Unable to get CPU cores. Using 16 as fallback.")
+            cores = 16
+        ret = self.scope.filter_cpus(range(cores))
+        return ret
+
+    # as taken by cpupower -c
+    def get_cpu_list_argument(self):
+        if self.scope.cpus is None:
+            return "all"
+        ret = ",".join(str(it) for it in self.get_cores())
+        return ret
+
+    def main(self):
+        # global version
+        hardware = 0
+        cur_temp = 0
+        governor_high = "ondemand"
+        governor_low = "powersave"
+        cur_governor = "performance"
+        govs = ()
+        relax_time, crit_temp = self.relax_time, self.crit_temp
+        logging.debug(f"critic_temp: {crit_temp}, relaxtime: {relax_time}")
+        cores = self.get_cores()
+        hardware = self.hardware
+        logging.debug(f"Detected hardware/kernel type is {hardware}")
+        freq = self.getMinMaxFrequencies(hardware)
+        logging.debug(f"min max gov: {freq}")
+        min_freq = int(freq[0])
+        max_freq = int(freq[1])
+        max_freq_limit = int(max_freq * self.max_freq_ratio)
+        init_freq = int((max_freq + min_freq) / 2)
+        freq_step = 300 * 1000
+        if freq[2] is not None:
+            cur_governor = freq[2]
+        govs = self.getCovernors(hardware)
+        if governor_high not in govs:
+            governor_high = "performance"
+        if governor_low not in govs:
+            logging.warning("Wait, powersave mode not in governors list?")
+            governor_low = "userspace"
+        # logging.debug(f'govs received: {govs}')
+        self.set_signal_handler()
+
+        def tick():
+            nonlocal init_freq
+            # cur_temp = getTemp(hardware)
+            cur_temp = self.get_cpu_temperature()
+            assert cur_temp is not None, "Error: Current temp is None?!"
+            self.update_device_state(0, temperature=cur_temp / 1000)
+            if self.is_device_paused(0):
+                return
+            initial_limit = self.pop_initial_limit(0)
+            if initial_limit is not None:
+                init_freq = max(min_freq, min(max_freq_limit, int(initial_limit)))
+                self.capture_original_settings(0)
+                self.setMaxFreq(init_freq, hardware, cores)
+                self.update_device_state(0, max_freq=init_freq)
+                return
+            direction = self.limit_policy.get_direction(
+                0, cur_temp / 1000, self.get_target_temp(0)
+            )
+            if direction == LOWER:
+                new_freq = max(init_freq - freq_step, min_freq)
+                governor = governor_low
+            elif direction == RAISE:
+                new_freq = min(init_freq + freq_step, max_freq_limit)
+                governor = governor_high
+            else:
+                return
+            if not self.limit_policy.should_change(init_freq, new_freq):
+                return
+            init_freq = new_freq
+            self.capture_original_settings(0)
+            self.setGovernor(hardware, governor)
+            self.setMaxFreq(init_freq, hardware, cores)
+            self.limit_policy.record_change(0, direction)
+            self.update_device_state(0, governor=governor, max_freq=init_freq)
+            if direction == LOWER:
+                self.sleep(relax_time)
+
+        try:
+            self.run_ticks(tick)
+        except KeyboardInterrupt:
+            logging.warning("Terminating")
+        finally:
+            self.set_to_normal()
+
+    def capture_device_settings(self, device_id: int) -> Dict[str, Any]:
+        governor = self.getMinMaxFrequencies(self.hardware)[2]
+        ret = {"governor": governor, "max_freq": self.get_policy_max_freq()}
+        return ret
+
+    def apply_device_settings(self, device_id: int, settings: Dict[str, Any]):
+        self.setGovernor(self.hardware, settings["governor"])
+        self.setMaxFreq(settings["max_freq"], self.hardware, self.get_cores())
+        self.update_device_state(device_id, **settings)
+
+    def set_to_normal(self):
+        if self.skip_set_to_normal:
+            return
+        logging.warning("Setting max cpu and governor back to normal.")
+        self.release_device(0)
+
+
+class CPUPowerStatSustainer(CPUFreqUtilStatSustainer):
+    required_binaries = ["sensors", "cpupower"]
+
+    # ref: https://manpages.debian.org/stretch/linux-cpupower/cpupower.1.en.html
+    frequency_unit_to_khz = {"khz": 1, "mhz": 1000, "ghz": 1000 * 1000}
+
+    def get_cpu_freq_policy_output(self):
+        ret = self.get_command_output(["cpupower", "frequency-info", "-p"])
+        return ret
+
+    def get_cpu_freq_hwlimit_output(self):
+        ret = self.get_command_output(["cpupower", "frequency-info", "-l"])
+        return ret
+
+    def get_policy_max_freq(self):
+        policy_out = self.get_cpu_freq_policy_output()
+        # "current policy: frequency should be within 800 MHz and 3.00 GHz."
+        match = re.search(r"and ([\d.]+) ?([kKmMgG]Hz)", policy_out)
+        assert match is not None, f"[-] Failed to parse CPU policy: '{policy_out}'"
+        value, unit = match.groups()
+        ret = int(float(value) * self.frequency_unit_to_khz[unit.lower()])
+        return ret
+
+    def getMinMaxFrequencies(self, hardware):
+        governor = self.getGovernor()
+        minfreq, maxfreq = self.getMinMaxHwFreq()
+        return minfreq, maxfreq, governor
+
+    def getMinMaxHwFreq(self):
+        hwfreq_out = self.get_cpu_freq_hwlimit_output()
+        lastline = hwfreq_out.splitlines()[-1].strip()
+        ret = lastline.split()
+        return ret
+
+    def setMaxFreqPerCore(self, max_freq: int, core_index: int):
+        self.get_command_output(
+            ["cpupower", "-c", str(core_index), "frequency-set", "--max", str(max_freq)]
+        )
+
+    # a single call covers every core
+    def setMaxFreq(self, frequency: int, hardware: int, cores: List[int]):
+        self.get_command_output(
+            [
+                "cpupower",
+                "-c",
+                self.get_cpu_list_argument(),
+                "frequency-set",
+                "--max",
+                str(frequency),
+            ]
+        )
+
+    def setGovernor(self, hardware: int, governor: Union[str, int]):
+        self.get_command_output(
+            [
+                "cpupower",
+                "-c",
+                self.get_cpu_list_argument(),
+                "frequency-set",
+                "-g",
+                str(governor),
+            ]
+        )
+
+    def getCovernors(self, hardware: int):
+        # "  available cpufreq governors: conservative ondemand performance"
+        govs_out = self.get_command_output(["cpupower", "frequency-info", "-g"])
+        ret = tuple(govs_out.splitlines()[-1].split(":")[-1].strip().lower().split())
+        return ret
+
+    def getGovernor(self):
+        policy_out = self.get_cpu_freq_policy_output()
+        lines = policy_out.splitlines()
+        ret = None
+        for it in lines:
+            if "governor" in it:
+                ret = it.split('"')[1]
+                break
+        return ret
+
+
+# reads and writes cpufreq policies in sysfs directly, no external tools involved
+class CPUSysfsStatSustainer(CPUFreqUtilStatSustainer):
+    required_binaries = []
+
+    def __init__(
+        self,
+        relax_time: Optional[int] = None,
+        max_freq_ratio: Optional[float] = None,
+        skip_root_check: bool = False,
+        sysfs_root: Optional[str] = None,
+    ):
+        if sysfs_root is None:
+            sysfs_root = get_cpufreq_sysfs_root_config()
+        self.sysfs_root = sysfs_root
+        super().__init__(
+            relax_time=relax_time,
+            max_freq_ratio=max_freq_ratio,
+            skip_root_check=skip_root_check,
+        )
+
+    def get_policies(self) -> List[str]:
+        ret = sorted(
+            (it for it in os.listdir(self.sysfs_root) if it.startswith("policy")),
+            key=lambda it: int(it[len("policy") :]),
+        )
+        # only policies covering a core we may run on
+        if self.scope.cpus is not None:
+            ret = [
+                it
+                for it in ret
+                if self.scope.filter_cpus(
+                    int(cpu)
+                    for cpu in self.read_policy_attribute(it, "affected_cpus").split()
+                )
+            ]
+        assert ret, f"[-] No cpufreq policy found in '{self.sysfs_root}'"
+        return ret
+
+    def read_policy_attribute(self, policy: str, attribute: str):
+        with open(os.path.join(self.sysfs_root, policy, attribute), "r") as f:
+            ret = f.read().strip()
+        return ret
+
+    def write_policy_attribute(self, policy: str, attribute: str, value):
+        with open(os.path.join(self.sysfs_root, policy, attribute), "w") as f:
+            f.write(str(value))
+
+    def getMinMaxFrequencies(self, hardware: int):
+        policies = self.get_policies()
+        min_freq = min(
+            int(self.read_policy_attribute(it, "cpuinfo_min_freq")) for it in policies
+        )
+        max_freq = max(
+            int(self.read_policy_attribute(it, "cpuinfo_max_freq")) for it in policies
+        )
+        governor = self.read_policy_attribute(policies[0], "scaling_governor")
+        return min_freq, max_freq, governor
+
+    def get_policy_max_freq(self):
+        ret = max(
+            int(self.read_policy_attribute(it, "scaling_max_freq"))
+            for it in self.get_policies()
+        )
+        return ret
+
+    def getCovernors(self, hardware: int):
+        policy = self.get_policies()[0]
+        ret = tuple(
+            self.read_policy_attribute(policy, "scaling_available_governors").split()
+        )
+        return ret
+
+    def setGovernor(self, hardware: int, governor: Union[str, int]):
+        for it in self.get_policies():
+            self.write_policy_attribute(it, "scaling_governor", governor)
+
+    # one write per policy covers every core sharing it
+    def setMaxFreq(self, frequency: int, hardware: int, cores: int):
+        for it in self.get_policies():
+            policy_min_freq = int(self.read_policy_attribute(it, "cpuinfo_min_freq"))
+            policy_max_freq = int(self.read_policy_attribute(it, "cpuinfo_max_freq"))
+            policy_freq = max(policy_min_freq, min(policy_max_freq, int(frequency)))
+            self.write_policy_attribute(it, "scaling_max_freq", policy_freq)
+
+    def capture_device_settings(self, device_id: int) -> Dict[str, Any]:
+        ret = {
+            "governors": {
+                it: self.read_policy_attribute(it, "scaling_governor")
+                for it in self.get_policies()
+            },
+            "max_freqs": {
+                it: int(self.read_policy_attribute(it, "scaling_max_freq"))
+                for it in self.get_policies()
+            },
+        }
+        return ret
+
+    def apply_device_settings(self, device_id: int, settings: Dict[str, Any]):
+        for policy, governor in settings["governors"].items():
+            self.write_policy_attribute(policy, "scaling_governor", governor)
+        for policy, max_freq in settings["max_freqs"].items():
+            self.write_policy_attribute(policy, "scaling_max_freq", max_freq)
+        self.update_device_state(
+            device_id,
+            governor=settings["governors"][self.get_policies()[0]],
+            max_freq=max(settings["max_freqs"].values()),
+        )
+
+
+RAPL_PACKAGE_ZONE_PATTERN = re.compile(r"^intel-rapl:(\d+)$")
+
+
+# caps package power through the powercap sysfs interface. AMD packages are
+# exposed under the same intel-rapl zones by recent kernels.
+class CPURAPLStatSustainer(CPUFreqUtilStatSustainer):
+    required_binaries = []
+    cpu_sysfs_root = DEFAULT_CPU_SYSFS_ROOT
+    # watts moved per celsius of distance from the target temperature, each tick
+    power_limit_gain = 2.0
+    min_power_limit_ratio = 0.25
+    limit_name = "power_limit"
+
+    def __init__(
+        self,
+        relax_time: Optional[int] = None,
+        skip_root_check: bool = False,
+        powercap_root: Optional[str] = None,
+    ):
+        if powercap_root is None:
+            powercap_root = get_powercap_sysfs_root_config()
+        self.powercap_root = powercap_root
+        # last energy counter reading of each zone, in microjoules with its timestamp
+        self.energy_readings: Dict[int, Tuple[int, float]] = {}
+        # kept apart, so energy accounting does not shorten the ticks measured above
+        self.power_draw_readings: Dict[int, Tuple[int, float]] = {}
+        super().__init__(relax_time=relax_time, skip_root_check=skip_root_check)
+        self.tick_interval = self.relax_time
+
+    # package zones only, subzones like intel-rapl:0:0 (core, uncore) are left alone
+    def get_device_indices(self) -> List[int]:
+        ret = []
+        for it in os.listdir(self.powercap_root):
+            match = RAPL_PACKAGE_ZONE_PATTERN.match(it)
+            if match is not None:
+                ret.append(int(match.group(1)))
+        assert ret, f"[-] No RAPL package zone found in '{self.powercap_root}'"
+        ret.sort()
+        # only packages holding a core we may run on
+        packages = self.scope.get_cpu_packages(self.cpu_sysfs_root)
+        if packages is not None:
+            ret = [it for it in ret if self.get_zone_package(it) in packages]
+        return ret
+
+    # zones are named after their package, e.g. "package-1"
+    def get_zone_package(self, zone_id: int):
+        match = PACKAGE_NAME_PATTERN.match(self.read_zone_attribute(zone_id, "name"))
+        ret = zone_id if match is None else int(match.group(1))
+        return ret
+
+    def read_zone_attribute(self, zone_id: int, attribute: str):
+        path = os.path.join(self.powercap_root, f"intel-rapl:{zone_id}", attribute)
+        with open(path, "r") as f:
+            ret = f.read().strip()
+        return ret
+
+    def write_zone_attribute(self, zone_id: int, attribute: str, value):
+        path = os.path.join(self.powercap_root, f"intel-rapl:{zone_id}", attribute)
+        with open(path, "w") as f:
+            f.write(str(value))
+
+    def get_power_limit(self, zone_id: int):
+        ret = int(self.read_zone_attribute(zone_id, "constraint_0_power_limit_uw"))
+        return ret
+
+    def set_power_limit(self, zone_id: int, power_limit: int):
+        self.write_zone_attribute(zone_id, "constraint_0_power_limit_uw", power_limit)
+        if self.read_zone_attribute(zone_id, "enabled") != "1":
+            self.write_zone_attribute(zone_id, "enabled", 1)
+
+    # the limit found before our first write is the ceiling, we only ever cap below it
+    def get_max_power_limit(self, zone_id: int):
+        settings = self.original_settings.get(zone_id, None)
+        if settings is None:
+            ret = self.get_power_limit(zone_id)
+        else:
+            ret = settings["power_limit_uw"]
+        return ret
+
+    def clamp_power_limit(self, zone_id: int, power_limit: int):
+        max_power_limit = self.get_max_power_limit(zone_id)
+        min_power_limit = int(max_power_limit * self.min_power_limit_ratio)
+        ret = max(min_power_limit, min(max_power_limit, power_limit))
+        return ret
+
+    def get_new_power_limit(self, zone_id: int, temperature: float, power_limit: int):
+        error = self.get_target_temp(zone_id) - temperature
+        ret = power_limit + int(error * self.power_limit_gain * 1e6)
+        ret = self.clamp_power_limit(zone_id, ret)
+        return ret
+
+    def measure_energy(
+        self,
+        zone_id: int,
+        energy_readings: Optional[Dict[int, Tuple[int, float]]] = None,
+    ) -> Dict[str, float]:
+        if energy_readings is None:
+            energy_readings = self.energy_readings
+        energy = int(self.read_zone_attribute(zone_id, "energy_uj"))
+        now = time.monotonic()
+        previous_reading = energy_readings.get(zone_id, None)
+        energy_readings[zone_id] = (energy, now)
+        if previous_reading is None:
+            return {}
+        previous_energy, previous_time = previous_reading
+        energy_delta = energy - previous_energy
+        if energy_delta < 0:
+            # the counter wrapped around
+            energy_delta += int(
+                self.read_zone_attribute(zone_id, "max_energy_range_uj")
+            )
+        tick_energy = energy_delta / 1e6
+        ret = {
+            "tick_energy": tick_energy,
+            "power_draw": tick_energy / max(now - previous_time, 1e-6),
+        }
+        return ret
+
+    def mainloop(self):
+        # sensors report the hottest package, which drives every zone
+        temperature = self.get_cpu_temperature() / 1000
+        for zone_id in self.get_device_indices():
+            self.run_device_tick(zone_id, lambda it: self.sustain_zone(it, temperature))
+
+    def sustain_zone(self, zone_id: int, temperature: float):
+        self.update_device_state(
+            zone_id, temperature=temperature, **self.measure_energy(zone_id)
+        )
+        if self.is_device_paused(zone_id):
+            return
+        initial_limit = self.pop_initial_limit(zone_id)
+        if initial_limit is not None:
+            # device states and initial limits are in watts
+            power_limit = self.clamp_power_limit(zone_id, int(initial_limit * 1e6))
+            self.capture_original_settings(zone_id)
+            self.set_power_limit(zone_id, power_limit)
+            self.update_device_state(zone_id, power_limit=power_limit / 1e6)
+            return
+        power_limit = self.get_power_limit(zone_id)
+        direction = self.limit_policy.get_direction(
+            zone_id, temperature, self.get_target_temp(zone_id)
+        )
+        if direction != HOLD:
+            new_power_limit = self.get_new_power_limit(
+                zone_id, temperature, power_limit
+            )
+            # captured right before the first write, as held zones need no restore
+            if self.limit_policy.should_change(power_limit, new_power_limit):
+                self.capture_original_settings(zone_id)
+                self.set_power_limit(zone_id, new_power_limit)
+                self.limit_policy.record_change(zone_id, direction)
+                power_limit = new_power_limit
+        self.update_device_state(zone_id, power_limit=power_limit / 1e6)
+
+    def main(self):
+        try:
+            self.run_ticks(self.mainloop)
+        except KeyboardInterrupt:
+            logging.warning("Terminating")
+        finally:
+            self.set_to_normal()
+
+    def read_status(self) -> Dict[str, Dict[str, Any]]:
+        temperature = self.get_cpu_temperature() / 1000
+        ret = {}
+        for zone_id in self.get_device_indices():
+            ret[self.get_device_name(zone_id)] = {
+                "temperature": temperature,
+                "zone": self.read_zone_attribute(zone_id, "name"),
+                "power_limit": self.get_power_limit(zone_id) / 1e6,
+                "energy": int(self.read_zone_attribute(zone_id, "energy_uj")) / 1e6,
+            }
+        return ret
+
+    # average watts since the previous call, so no energy is missed between samples
+    def read_power_draw(self) -> Dict[int, float]:
+        ret = {}
+        for zone_id in self.get_device_indices():
+            energy = self.measure_energy(zone_id, self.power_draw_readings)
+            if energy:
+                ret[zone_id] = energy["power_draw"]
+        return ret
+
+    def capture_device_settings(self, device_id: int) -> Dict[str, Any]:
+        ret = {
+            "power_limit_uw": self.get_power_limit(device_id),
+            "enabled": self.read_zone_attribute(device_id, "enabled"),
+        }
+        return ret
+
+    def apply_device_settings(self, device_id: int, settings: Dict[str, Any]):
+        self.write_zone_attribute(
+            device_id, "constraint_0_power_limit_uw", settings["power_limit_uw"]
+        )
+        self.write_zone_attribute(device_id, "enabled", settings["enabled"])
+        self.update_device_state(
+            device_id, power_limit=settings["power_limit_uw"] / 1e6
+        )
+
+    def set_to_normal(self):
+        if self.skip_set_to_normal:
+            return
+        logging.warning("Setting package power limits back to normal.")
+        for zone_id in list(self.original_settings.keys()):
+            self.release_device(zone_id)
@@ -0,0 +1,163 @@
+import asyncio
+import os
+import traceback
+from typing import Any, Dict, Optional, Tuple
+
+from .lib import HardwareStatSustainer
+from .protocol import (
+    MAX_MESSAGE_SIZE,
+    REQUEST_TIMEOUT,
+    get_socket_path_config,
+    is_unix_socket_in_use,
+    send_unix_request,
+    serve_json_lines,
+)
+
+
+def parse_device_name(device_name: str) -> Tuple[str, int]:
+    device_kind, _, device_id = device_name.partition(":")
+    ret = device_kind, int(device_id or 0)
+    return ret
+
+
+class SustainerControlServer:
+    def __init__(
+        self,
+        hardware_sustainer: HardwareStatSustainer,
+        socket_path: Optional[str] = None,
+    ):
+        self.hardware_sustainer = hardware_sustainer
+        if socket_path is None:
+            socket_path = get_socket_path_config()
+        self.socket_path = socket_path
+
+    def get_device(self, request: Dict[str, Any]):
+        device_kind, device_id = parse_device_name(str(request["device"]))
+        sustainer = self.hardware_sustainer.get_sustainer_by_kind(device_kind)
+        return sustainer, device_id
+
+    def handle_status(self, request: Dict[str, Any]):
+        ret = {
+            "devices": self.hardware_sustainer.get_status_snapshot(),
+            "profile": self.hardware_sustainer.profiles.active,
+        }
+        return ret
+
+    def handle_energy(self, request: Dict[str, Any]):
+        ret = {"devices": self.hardware_sustainer.energy_accounting.get_report()}
+        return ret
+
+    def handle_set_target(self, request: Dict[str, Any]):
+        sustainer, device_id = self.get_device(request)
+        sustainer.set_device_target_temp(device_id, request.get("target_temp"))
+        ret = {"target_temp": sustainer.get_target_temp(device_id)}
+        return ret
+
+    def handle_footprint(self, request: Dict[str, Any]):
+        top = int(request.get("top", 0))
+        ret = {"footprint": self.hardware_sustainer.get_footprint(top)}
+        return ret
+
+    def handle_profile(self, request: Dict[str, Any]):
+        profiles = self.hardware_sustainer.profiles
+        ret = {"profile": profiles.active, "profiles": profiles.get_profile_names()}
+        return ret
+
+    # no profile, or an empty one, goes back to the default targets
+    def handle_set_profile(self, request: Dict[str, Any]):
+        profiles = self.hardware_sustainer.profiles
+        devices = profiles.switch(request.get("profile"))
+        ret = {"profile": profiles.active, "devices": devices}
+        return ret
+
+    def handle_pause(self, request: Dict[str, Any]):
+        sustainer, device_id = self.get_device(request)
+        sustainer.pause_device(device_id)
+        return {}
+
+    def handle_resume(self, request: Dict[str, Any]):
+        sustainer, device_id = self.get_device(request)
+        sustainer.resume_device(device_id)
+        return {}
+
+    async def handle_release(self, request: Dict[str, Any]):
+        sustainer, device_id = self.get_device(request)
+        # keep the control loop from throttling the device right after release
+        sustainer.pause_device(device_id)
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, sustainer.release_device, device_id)
+        return {}
+
+    async def dispatch(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        command = request.get("command")
+        handlers = {
+            "status": self.handle_status,
+            "energy": self.handle_energy,
+            "footprint": self.handle_footprint,
+            "set_target": self.handle_set_target,
+            "profile": self.handle_profile,
+            "set_profile": self.handle_set_profile,
+            "pause": self.handle_pause,
+            "resume": self.handle_resume,
+            "release": self.handle_release,
+        }
+        handler = handlers.get(str(command))
+        if handler is None:
+            return {"ok": False, "error": f"Unknown command: {command}"}
+        try:
+            ret = handler(request)
+            if asyncio.iscoroutine(ret):
+                ret = await ret
+        except Exception as e:
+            traceback.print_exc()
+            return {"ok": False, "error": f"{type(e).__name__}: {e}"}
+        return {"ok": True, **ret}
+
+    async def handle_client(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ):
+        await serve_json_lines(reader, writer, self.dispatch)
+
+    # never takes the socket over from a daemon which is still running
+    def remove_stale_socket(self):
+        if not os.path.exists(self.socket_path):
+            return
+        if is_unix_socket_in_use(self.socket_path):
+            raise RuntimeError(
+                f"[-] A sustainer daemon is already listening at: {self.socket_path}"
+            )
+        os.remove(self.socket_path)
+
+    def remove_socket(self):
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+
+    async def serve_forever(self):
+        self.remove_stale_socket()
+        server = await asyncio.start_unix_server(
+            self.handle_client, path=self.socket_path, limit=MAX_MESSAGE_SIZE
+        )
+        os.chmod(self.socket_path, 0o600)
+        print("[+] Control socket listening at:", self.socket_path)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.remove_socket()
+
+    def run(self):
+        try:
+            asyncio.run(self.serve_forever())
+        except KeyboardInterrupt:
+            print("[*] Exiting because of keyboard interruption")
+
+
+def send_control_request(
+    request: Dict[str, Any],
+    socket_path: Optional[str] = None,
+    timeout: float = REQUEST_TIMEOUT,
+) -> Dict[str, Any]:
+    if socket_path is None:
+        socket_path = get_socket_path_config()
+    ret = send_unix_request(request, socket_path, timeout=timeout)
+    return ret
@@ -0,0 +1,101 @@
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+JOULES_PER_KWH = 3.6e6
+SECONDS_PER_HOUR = 3600
+# completed hours kept per device, older ones are dropped
+HOURLY_HISTORY = 24
+# a longer gap between samples (e.g. a stalled backend) is not integrated
+MAX_SAMPLE_GAP = 60.0
+
+
+def get_hour_start(timestamp: float) -> int:
+    ret = int(timestamp // SECONDS_PER_HOUR * SECONDS_PER_HOUR)
+    return ret
+
+
+def summarize_energy(energy: float, duration: float) -> Dict[str, float]:
+    ret = {
+        "energy_kwh": energy / JOULES_PER_KWH,
+        "average_power": energy / duration if duration > 0 else 0.0,
+    }
+    return ret
+
+
+class DeviceEnergyAccount:
+    __slots__ = ["last_power", "last_time", "energy", "duration", "hours"]
+
+    def __init__(self):
+        self.last_power: Optional[float] = None
+        self.last_time = 0.0
+        self.energy = 0.0
+        self.duration = 0.0
+        # hour start -> [joules, seconds]
+        self.hours: Dict[int, List[float]] = {}
+
+    def add_power_sample(self, power: float, timestamp: float):
+        if self.last_power is not None:
+            duration = timestamp - self.last_time
+            if 0 < duration <= MAX_SAMPLE_GAP:
+                # trapezoidal rule, booked to the hour the interval started in
+                energy = (self.last_power + power) / 2 * duration
+                self.energy += energy
+                self.duration += duration
+                hour_start = get_hour_start(self.last_time)
+                hour = self.hours.setdefault(hour_start, [0.0, 0.0])
+                hour[0] += energy
+                hour[1] += duration
+                while len(self.hours) > HOURLY_HISTORY + 1:
+                    del self.hours[min(self.hours.keys())]
+        self.last_power = power
+        self.last_time = timestamp
+
+    def get_metrics(self) -> Dict[str, float]:
+        total = summarize_energy(self.energy, self.duration)
+        hour_energy, hour_duration = self.hours.get(
+            get_hour_start(self.last_time), (0.0, 0.0)
+        )
+        hour = summarize_energy(hour_energy, hour_duration)
+        ret = {
+            "energy_kwh": total["energy_kwh"],
+            "hour_energy_kwh": hour["energy_kwh"],
+            "hour_average_power": hour["average_power"],
+        }
+        return ret
+
+    def get_report(self) -> Dict[str, Any]:
+        ret: Dict[str, Any] = summarize_energy(self.energy, self.duration)
+        ret["hours"] = [
+            {"hour": hour_start, **summarize_energy(*self.hours[hour_start])}
+            for hour_start in sorted(self.hours.keys())
+        ]
+        return ret
+
+
+# integrates power draw per device with running sums, no samples are stored
+class EnergyAccounting:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.accounts: Dict[str, DeviceEnergyAccount] = {}
+
+    def add_power_sample(
+        self, device_name: str, power: float, timestamp: Optional[float] = None
+    ):
+        if timestamp is None:
+            timestamp = time.time()
+        with self.lock:
+            account = self.accounts.get(device_name, None)
+            if account is None:
+                account = self.accounts[device_name] = DeviceEnergyAccount()
+            account.add_power_sample(power, timestamp)
+
+    def get_device_metrics(self, device_name: str) -> Dict[str, float]:
+        with self.lock:
+            ret = self.accounts[device_name].get_metrics()
+        return ret
+
+    def get_report(self) -> Dict[str, Dict[str, Any]]:
+        with self.lock:
+            ret = {k: v.get_report() for k, v in self.accounts.items()}
+        return ret
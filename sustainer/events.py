@@ -0,0 +1,111 @@
+import collections
+import json
+import os
+import threading
+import time
+from typing import Any, Deque, Dict, List, Optional
+
+from .base import get_value_from_environ_with_fallback
+
+DEFAULT_EVENT_LOG_PATH = "/var/log/sustainer/events.jsonl"
+EVENT_LOG_MAX_BYTES = 10 * 1024 * 1024
+EVENT_LOG_BACKUP_COUNT = 3
+EVENT_FLUSH_INTERVAL = 1.0
+# oldest events are dropped beyond this, if the writer cannot keep up
+EVENT_BUFFER_SIZE = 10000
+
+
+def get_event_log_path_config() -> str:
+    ret = get_value_from_environ_with_fallback(
+        "SUSTAINER_EVENT_LOG", DEFAULT_EVENT_LOG_PATH
+    )
+    return ret
+
+
+# structured events as JSON lines. emitting only appends to a buffer,
+# a writer thread flushes it in batches and rotates the file by size.
+class EventLog:
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        max_bytes: int = EVENT_LOG_MAX_BYTES,
+        backup_count: int = EVENT_LOG_BACKUP_COUNT,
+        flush_interval: float = EVENT_FLUSH_INTERVAL,
+    ):
+        if path is None:
+            path = get_event_log_path_config()
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.flush_interval = flush_interval
+        self.buffer: Deque[Dict[str, Any]] = collections.deque(maxlen=EVENT_BUFFER_SIZE)
+        self.lock = threading.Lock()
+        self.writer_thread: Optional[threading.Thread] = None
+        self.write_failed = False
+
+    def emit(self, event: str, level: str = "INFO", **fields):
+        self.buffer.append(
+            {"time": time.time(), "level": level, "event": event, **fields}
+        )
+        if self.writer_thread is None:
+            self.start()
+
+    def start(self):
+        with self.lock:
+            if self.writer_thread is not None:
+                return
+            self.writer_thread = threading.Thread(target=self.run, daemon=True)
+            self.writer_thread.start()
+
+    def run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    def rotate(self):
+        if self.backup_count == 0:
+            os.remove(self.path)
+            return
+        for index in range(self.backup_count - 1, 0, -1):
+            backup_path = f"{self.path}.{index}"
+            if os.path.exists(backup_path):
+                os.replace(backup_path, f"{self.path}.{index + 1}")
+        os.replace(self.path, f"{self.path}.1")
+
+    def flush(self):
+        lines = []
+        while True:
+            try:
+                event = self.buffer.popleft()
+            except IndexError:
+                break
+            lines.append(json.dumps(event, default=str) + "\n")
+        if not lines:
+            return
+        with self.lock:
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                self.write_lines(lines)
+                self.write_failed = False
+            except OSError as e:
+                if not self.write_failed:
+                    print(f"[-] Failed to write event log '{self.path}': {e}")
+                self.write_failed = True
+
+    def write_lines(self, lines: List[str]):
+        f = open(self.path, "a")
+        try:
+            size = f.tell()
+            for line in lines:
+                if size > 0 and size + len(line) > self.max_bytes:
+                    f.close()
+                    self.rotate()
+                    f = open(self.path, "a")
+                    size = 0
+                f.write(line)
+                size += len(line)
+        finally:
+            f.close()
+
+    def close(self):
+        self.flush()
@@ -0,0 +1,136 @@
+import os
+import random
+import shutil
+import signal
+import subprocess
+import threading
+import time
+from typing import Callable, Dict, Hashable, List, Optional
+
+DEFAULT_TOOL_CONCURRENCY = 2
+BACKOFF_BASE_DELAY = 1.0
+BACKOFF_MAX_DELAY = 60.0
+# consecutive failures before a device or backend is left alone for a while
+CIRCUIT_FAILURE_THRESHOLD = 5
+CIRCUIT_RESET_TIME = 300.0
+
+
+# runs external tools with a mandatory timeout and a bounded number of
+# concurrent invocations per tool, shared by every sustainer
+class ToolExecutor:
+    def __init__(
+        self,
+        timeout: float,
+        concurrency: int = DEFAULT_TOOL_CONCURRENCY,
+        encoding: str = "utf-8",
+    ):
+        self.timeout = timeout
+        self.concurrency = concurrency
+        self.encoding = encoding
+        self.lock = threading.Lock()
+        self.semaphores: Dict[str, threading.BoundedSemaphore] = {}
+
+    def get_semaphore(self, tool: str):
+        with self.lock:
+            ret = self.semaphores.get(tool, None)
+            if ret is None:
+                ret = self.semaphores[tool] = threading.BoundedSemaphore(
+                    self.concurrency
+                )
+        return ret
+
+    def has_binary(self, binary_name: str):
+        ret = shutil.which(binary_name) is not None
+        return ret
+
+    def run(
+        self, cmdlist: List[str], timeout: Optional[float] = None, check: bool = True
+    ) -> subprocess.CompletedProcess:
+        if timeout is None:
+            timeout = self.timeout
+        with self.get_semaphore(os.path.basename(cmdlist[0])):
+            # a session of its own, so a timeout kills wrapper scripts with their children
+            proc = subprocess.Popen(
+                cmdlist,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                encoding=self.encoding,
+                start_new_session=True,
+            )
+            try:
+                stdout, stderr = proc.communicate(timeout=timeout)
+            except subprocess.TimeoutExpired:
+                os.killpg(proc.pid, signal.SIGKILL)
+                proc.communicate()
+                raise
+        if check and proc.returncode != 0:
+            raise subprocess.CalledProcessError(
+                proc.returncode, cmdlist, stdout, stderr
+            )
+        ret = subprocess.CompletedProcess(cmdlist, proc.returncode, stdout, stderr)
+        return ret
+
+    def check_output(self, cmdlist: List[str], timeout: Optional[float] = None):
+        ret = self.run(cmdlist, timeout=timeout).stdout
+        return ret
+
+    def close(self):
+        pass
+
+
+# exponential backoff with jitter after failures, per device or backend.
+# after too many consecutive failures the circuit opens, and the key is only
+# retried once per reset time until it succeeds again.
+class FailureBackoff:
+    def __init__(
+        self,
+        base_delay: float = BACKOFF_BASE_DELAY,
+        max_delay: float = BACKOFF_MAX_DELAY,
+        circuit_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+        circuit_reset_time: float = CIRCUIT_RESET_TIME,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.circuit_threshold = circuit_threshold
+        self.circuit_reset_time = circuit_reset_time
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.failures: Dict[Hashable, int] = {}
+        self.retry_at: Dict[Hashable, float] = {}
+
+    def is_allowed(self, key: Hashable):
+        ret = self.clock() >= self.retry_at.get(key, 0)
+        return ret
+
+    def get_failures(self, key: Hashable):
+        ret = self.failures.get(key, 0)
+        return ret
+
+    def is_circuit_open(self, key: Hashable):
+        ret = self.get_failures(key) >= self.circuit_threshold
+        return ret
+
+    # returns seconds until the next attempt
+    def record_failure(self, key: Hashable) -> float:
+        with self.lock:
+            failures = self.failures[key] = self.failures.get(key, 0) + 1
+            if failures >= self.circuit_threshold:
+                ret = self.circuit_reset_time
+            else:
+                ret = min(self.max_delay, self.base_delay * 2 ** (failures - 1))
+                ret *= random.uniform(0.5, 1)
+            self.retry_at[key] = self.clock() + ret
+        return ret
+
+    # returns the number of failures before this success
+    def record_success(self, key: Hashable) -> int:
+        with self.lock:
+            self.retry_at.pop(key, None)
+            ret = self.failures.pop(key, 0)
+        return ret
+
+    def reset(self):
+        with self.lock:
+            self.failures.clear()
+            self.retry_at.clear()
@@ -0,0 +1,41 @@
+from typing import List, Tuple
+
+# degrees relative to the target temperature : fan percent
+DEFAULT_FAN_CURVE = "-15:30,-8:60,-3:85,0:100"
+
+
+# fan speed by temperature, interpolated linearly between points and relative
+# to the target, so per device targets move the curve along
+class FanCurve:
+    def __init__(self, points: List[Tuple[float, int]]):
+        assert points, "Fan curve needs at least one point"
+        self.points = sorted(points)
+        self.max_percent = max(it[1] for it in self.points)
+
+    @classmethod
+    def parse(cls, curve: str):
+        points = []
+        for it in curve.split(","):
+            offset, _, percent = it.partition(":")
+            points.append((float(offset), int(percent)))
+        ret = cls(points)
+        return ret
+
+    def get_fan_percent(self, temperature: float, target_temp: float) -> int:
+        offset = temperature - target_temp
+        first_offset, first_percent = self.points[0]
+        if offset <= first_offset:
+            return first_percent
+        for (low_offset, low_percent), (high_offset, high_percent) in zip(
+            self.points, self.points[1:]
+        ):
+            if offset <= high_offset:
+                ratio = (offset - low_offset) / (high_offset - low_offset)
+                ret = round(low_percent + ratio * (high_percent - low_percent))
+                return ret
+        return self.points[-1][1]
+
+    # throttling only starts once the fans have nothing more to give
+    def is_saturated(self, fan_percent: int):
+        ret = fan_percent >= self.max_percent
+        return ret
@@ -0,0 +1,279 @@
+import argparse
+import asyncio
+import copy
+import hmac
+import ipaddress
+import json
+import os
+import socket
+import time
+import traceback
+from typing import Any, Dict, List, Optional, Tuple
+
+from .protocol import REQUEST_TIMEOUT, exchange_message, serve_json_lines
+
+# the aggregator has no other authentication than a shared token, so it only
+# listens on loopback unless a token is set
+DEFAULT_AGGREGATOR_ADDRESS = "127.0.0.1:9400"
+# fields which change on every tick and carry no information for the fleet view
+DELTA_IGNORED_KEYS = ["updated_at"]
+
+
+def parse_address(address: str) -> Tuple[str, int]:
+    host, _, port = address.rpartition(":")
+    assert host, f"[-] Address must be in 'host:port' format: '{address}'"
+    ret = host, int(port)
+    return ret
+
+
+def get_fleet_token_config() -> Optional[str]:
+    ret = os.environ.get("SUSTAINER_FLEET_TOKEN", None) or None
+    return ret
+
+
+def is_loopback_host(host: str) -> bool:
+    try:
+        ret = ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        ret = host == "localhost"
+    return ret
+
+
+def filter_device_state(device_state: Dict[str, Any]):
+    ret = {k: v for k, v in device_state.items() if k not in DELTA_IGNORED_KEYS}
+    return ret
+
+
+def compute_state_delta(
+    previous: Dict[str, Dict[str, Any]], current: Dict[str, Dict[str, Any]]
+):
+    changed: Dict[str, Dict[str, Any]] = {}
+    for device_name, device_state in current.items():
+        previous_state = previous.get(device_name, {})
+        device_delta = {
+            k: v for k, v in device_state.items() if previous_state.get(k, None) != v
+        }
+        if device_delta:
+            changed[device_name] = device_delta
+    removed = [it for it in previous.keys() if it not in current]
+    return changed, removed
+
+
+class FleetAggregator:
+    def __init__(
+        self, address: str = DEFAULT_AGGREGATOR_ADDRESS, token: Optional[str] = None
+    ):
+        self.host, self.port = parse_address(address)
+        if token is None:
+            token = get_fleet_token_config()
+        # anyone reaching the port could push and read telemetry otherwise
+        assert token is not None or is_loopback_host(
+            self.host
+        ), f"[-] Listening at '{self.host}' requires SUSTAINER_FLEET_TOKEN"
+        self.token = token
+        self.nodes: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self.node_last_seen: Dict[str, float] = {}
+
+    def apply_push(
+        self,
+        node: str,
+        devices: Dict[str, Dict[str, Any]],
+        removed: List[str],
+        full: bool,
+    ):
+        if full or node not in self.nodes:
+            self.nodes[node] = {}
+        node_devices = self.nodes[node]
+        for device_name, device_delta in devices.items():
+            node_devices.setdefault(device_name, {}).update(device_delta)
+        for device_name in removed:
+            node_devices.pop(device_name, None)
+        self.node_last_seen[node] = time.time()
+
+    def get_top_devices(self, key: str = "temperature", count: int = 10):
+        candidates = []
+        for node, node_devices in self.nodes.items():
+            for device_name, device_state in node_devices.items():
+                value = device_state.get(key, None)
+                if isinstance(value, (int, float)):
+                    candidates.append((value, node, device_name))
+        candidates.sort(reverse=True)
+        ret = []
+        for _, node, device_name in candidates[:count]:
+            ret.append(
+                {
+                    "node": node,
+                    "device": device_name,
+                    "last_seen": self.node_last_seen[node],
+                    **self.nodes[node][device_name],
+                }
+            )
+        return ret
+
+    def handle_push(self, request: Dict[str, Any]):
+        self.apply_push(
+            str(request["node"]),
+            request.get("devices", {}),
+            request.get("removed", []),
+            bool(request.get("full", False)),
+        )
+        return {}
+
+    def handle_top(self, request: Dict[str, Any]):
+        ret = {
+            "devices": self.get_top_devices(
+                str(request.get("key", "temperature")), int(request.get("count", 10))
+            )
+        }
+        return ret
+
+    def handle_nodes(self, request: Dict[str, Any]):
+        ret = {
+            "nodes": {
+                node: {"last_seen": self.node_last_seen[node], "devices": devices}
+                for node, devices in self.nodes.items()
+            }
+        }
+        return ret
+
+    def is_authorized(self, request: Dict[str, Any]) -> bool:
+        if self.token is None:
+            return True
+        ret = hmac.compare_digest(str(request.get("token", "")), self.token)
+        return ret
+
+    async def dispatch(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        if not self.is_authorized(request):
+            return {"ok": False, "error": "Invalid token"}
+        command = request.get("command")
+        handlers = {
+            "push": self.handle_push,
+            "top": self.handle_top,
+            "nodes": self.handle_nodes,
+        }
+        handler = handlers.get(str(command))
+        if handler is None:
+            return {"ok": False, "error": f"Unknown command: {command}"}
+        try:
+            ret = handler(request)
+        except Exception as e:
+            traceback.print_exc()
+            return {"ok": False, "error": f"{type(e).__name__}: {e}"}
+        return {"ok": True, **ret}
+
+    async def handle_client(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ):
+        await serve_json_lines(reader, writer, self.dispatch)
+
+    async def serve_forever(self):
+        server = await asyncio.start_server(self.handle_client, self.host, self.port)
+        print(f"[+] Fleet aggregator listening at: {self.host}:{self.port}")
+        async with server:
+            await server.serve_forever()
+
+    def run(self):
+        try:
+            asyncio.run(self.serve_forever())
+        except KeyboardInterrupt:
+            print("[*] Exiting because of keyboard interruption")
+
+
+class FleetTelemetryClient:
+    def __init__(
+        self,
+        address: str,
+        node_name: Optional[str] = None,
+        timeout: float = REQUEST_TIMEOUT,
+        token: Optional[str] = None,
+    ):
+        self.address = parse_address(address)
+        self.node_name = node_name if node_name is not None else socket.gethostname()
+        self.timeout = timeout
+        if token is None:
+            token = get_fleet_token_config()
+        self.token = token
+        self.sock: Optional[socket.socket] = None
+        self.last_sent: Dict[str, Dict[str, Any]] = {}
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+        # the aggregator may have lost our state, so resend everything next time
+        self.last_sent = {}
+
+    def request(self, message: Dict[str, Any]) -> Dict[str, Any]:
+        if self.sock is None:
+            self.sock = socket.create_connection(self.address, timeout=self.timeout)
+        if self.token is not None:
+            message = {**message, "token": self.token}
+        try:
+            ret = exchange_message(self.sock, message)
+        except:
+            self.close()
+            raise
+        return ret
+
+    def push(self, snapshot: Dict[str, Dict[str, Any]]):
+        current = {k: filter_device_state(v) for k, v in snapshot.items()}
+        full = not self.last_sent
+        changed, removed = compute_state_delta(self.last_sent, current)
+        response = self.request(
+            {
+                "command": "push",
+                "node": self.node_name,
+                "full": full,
+                "devices": changed,
+                "removed": removed,
+            }
+        )
+        assert response["ok"], f"[-] Aggregator rejected push: {response}"
+        self.last_sent = copy.deepcopy(current)
+
+
+def send_fleet_request(
+    request: Dict[str, Any],
+    address: str,
+    timeout: float = REQUEST_TIMEOUT,
+    token: Optional[str] = None,
+):
+    if token is None:
+        token = get_fleet_token_config()
+    if token is not None:
+        request = {**request, "token": token}
+    with socket.create_connection(parse_address(address), timeout=timeout) as sock:
+        ret = exchange_message(sock, request)
+    return ret
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Collect sustainer telemetry from a fleet of nodes."
+    )
+    parser.add_argument(
+        "-l",
+        "--listen",
+        type=str,
+        default=DEFAULT_AGGREGATOR_ADDRESS,
+        help=f"Address to listen at, or to query with --top (default: {DEFAULT_AGGREGATOR_ADDRESS}). "
+        "Other than loopback addresses require a shared SUSTAINER_FLEET_TOKEN.",
+    )
+    parser.add_argument(
+        "--top",
+        type=int,
+        default=None,
+        help="Print the top N hottest devices from a running aggregator and exit.",
+    )
+    args = parser.parse_args()
+    if args.top is None:
+        FleetAggregator(args.listen).run()
+    else:
+        response = send_fleet_request(
+            {"command": "top", "count": args.top}, args.listen
+        )
+        print(json.dumps(response, indent=4))
+
+
+if __name__ == "__main__":
+    main()
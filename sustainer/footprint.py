@@ -0,0 +1,118 @@
+import os
+import resource
+import threading
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional
+
+from .base import get_value_from_environ_with_fallback
+
+TOP_ALLOCATIONS = 10
+# allocations of tracemalloc itself and of imports are not ours to fix
+IGNORED_ALLOCATIONS = [
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+]
+
+
+# tracing every allocation slows python down, so it is opt in
+def get_tracemalloc_config() -> bool:
+    ret = bool(get_value_from_environ_with_fallback("SUSTAINER_TRACEMALLOC", 0))
+    return ret
+
+
+def get_peak_rss_bytes() -> int:
+    # kilobytes on linux
+    ret = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    return ret
+
+
+# ru_maxrss only tells the peak, the current resident set is in /proc
+def get_rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm", "r") as f:
+            pages = int(f.read().split()[1])
+        ret = pages * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        ret = get_peak_rss_bytes()
+    return ret
+
+
+def get_cpu_seconds(who: int) -> float:
+    usage = resource.getrusage(who)
+    ret = usage.ru_utime + usage.ru_stime
+    return ret
+
+
+# what the daemon costs itself: memory, threads, and cpu time spent in python
+# and in the tools it runs. child processes only count once they were waited
+# for, which every tool call is, but worker processes are not until they exit.
+class FootprintMonitor:
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        self.clock = clock
+        self.start_time = clock()
+        self.start_python_cpu = get_cpu_seconds(resource.RUSAGE_SELF)
+        self.start_children_cpu = get_cpu_seconds(resource.RUSAGE_CHILDREN)
+        # allocations are compared to this snapshot, taken when tracing starts
+        self.baseline: Optional[tracemalloc.Snapshot] = None
+
+    def start_tracing(self, frames: int = 1):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+        self.baseline = self.take_snapshot()
+
+    def stop_tracing(self):
+        self.baseline = None
+        tracemalloc.stop()
+
+    @staticmethod
+    def take_snapshot() -> tracemalloc.Snapshot:
+        ret = tracemalloc.take_snapshot().filter_traces(IGNORED_ALLOCATIONS)
+        return ret
+
+    # the source lines grown the most since tracing started
+    def get_top_allocations(self, limit: int = TOP_ALLOCATIONS) -> List[Dict[str, Any]]:
+        if self.baseline is None or not tracemalloc.is_tracing():
+            return []
+        stats = self.take_snapshot().compare_to(self.baseline, "lineno")
+        ret = []
+        for it in stats[:limit]:
+            frame = it.traceback[0]
+            ret.append(
+                {
+                    "location": f"{frame.filename}:{frame.lineno}",
+                    "size_kb": round(it.size / 1024, 1),
+                    "size_diff_kb": round(it.size_diff / 1024, 1),
+                    "count": it.count,
+                    "count_diff": it.count_diff,
+                }
+            )
+        return ret
+
+    def sample(self, ticks: Optional[int] = None) -> Dict[str, Any]:
+        hours = max(self.clock() - self.start_time, 1e-6) / 3600
+        python_cpu = get_cpu_seconds(resource.RUSAGE_SELF) - self.start_python_cpu
+        children_cpu = (
+            get_cpu_seconds(resource.RUSAGE_CHILDREN) - self.start_children_cpu
+        )
+        ret: Dict[str, Any] = {
+            "uptime_hours": round(hours, 3),
+            "rss_mb": round(get_rss_bytes() / 2**20, 2),
+            "peak_rss_mb": round(get_peak_rss_bytes() / 2**20, 2),
+            "threads": threading.active_count(),
+            "python_cpu_seconds": round(python_cpu, 2),
+            "children_cpu_seconds": round(children_cpu, 2),
+            "python_cpu_seconds_hour": round(python_cpu / hours, 2),
+            "children_cpu_seconds_hour": round(children_cpu / hours, 2),
+        }
+        if ticks:
+            ret["ticks"] = ticks
+            ret["python_cpu_ms_tick"] = round(python_cpu * 1000 / ticks, 3)
+            ret["children_cpu_ms_tick"] = round(children_cpu * 1000 / ticks, 3)
+        if tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            ret["traced_mb"] = round(current / 2**20, 2)
+            ret["traced_peak_mb"] = round(peak / 2**20, 2)
+        return ret
@@ -0,0 +1,63 @@
+import json
+import os
+import threading
+from typing import Any, Dict, Optional
+
+from .base import get_value_from_environ_with_fallback
+
+DEFAULT_JOURNAL_PATH = "/var/lib/sustainer/journal.json"
+
+
+def get_journal_path_config() -> str:
+    ret = get_value_from_environ_with_fallback(
+        "SUSTAINER_JOURNAL", DEFAULT_JOURNAL_PATH
+    )
+    return ret
+
+
+# original device settings, written before the first change to each device.
+# an existing journal file at startup means the previous run did not restore them.
+class StateJournal:
+    def __init__(self, path: Optional[str] = None):
+        if path is None:
+            path = get_journal_path_config()
+        self.path = path
+        self.lock = threading.Lock()
+        self.entries: Dict[str, Dict[str, Any]] = self.load()
+
+    def load(self) -> Dict[str, Dict[str, Any]]:
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, "r") as f:
+                ret = json.load(f)
+        except ValueError:
+            print(f"[-] Ignoring corrupted state journal: {self.path}")
+            ret = {}
+        return ret
+
+    def save(self):
+        if not self.entries:
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.entries, f, indent=4)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    def record(self, device_name: str, backend: str, settings: Dict[str, Any]):
+        with self.lock:
+            # the first record wins, it holds the settings from before our writes
+            if device_name in self.entries:
+                return
+            self.entries[device_name] = {"backend": backend, "settings": settings}
+            self.save()
+
+    def discard(self, device_name: str):
+        with self.lock:
+            if self.entries.pop(device_name, None) is not None:
+                self.save()
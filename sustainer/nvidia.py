@@ -0,0 +1,23 @@
+from typing import Optional
+
+from .base import AbstractStatSustainer, get_max_power_limit_ratio_config
+
+
+class NVIDIABaseGPUStatSustainer(AbstractStatSustainer):
+    hardware_name = "NVIDIA GPU"
+    device_kind = "nvidia"
+
+
+class NVIDIAGPUStatSustainer(NVIDIABaseGPUStatSustainer):
+    run_forever = False
+
+    def __init__(
+        self,
+        target_temp: Optional[int] = None,
+        max_power_limit_ratio: Optional[float] = None,
+        skip_root_check: bool = False,
+    ):
+        super().__init__(target_temp=target_temp, skip_root_check=skip_root_check)
+        if max_power_limit_ratio is None:
+            max_power_limit_ratio = get_max_power_limit_ratio_config()
+        self.max_power_limit_ratio = max_power_limit_ratio
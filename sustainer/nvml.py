@@ -0,0 +1,170 @@
+import pynvml
+import contextlib
+from typing import Any, Dict
+
+from .nvidia import NVIDIAGPUStatSustainer
+from .throttle import get_nvml_throttle_reasons
+
+
+# manual fan control needs a driver from 520 on, with a matching pynvml
+def has_nvml_fan_control() -> bool:
+    ret = hasattr(pynvml, "nvmlDeviceSetFanSpeed_v2")
+    return ret
+
+
+def set_nvml_fan_percent(device_index: int, fan_percent: int):
+    with NVMLGPUStatSustainer.nvml_context():
+        handle = pynvml.nvmlDeviceGetHandleByIndex(device_index)
+        for fan in range(pynvml.nvmlDeviceGetNumFans(handle)):
+            pynvml.nvmlDeviceSetFanSpeed_v2(handle, fan, fan_percent)
+
+
+def reset_nvml_fans(device_index: int):
+    with NVMLGPUStatSustainer.nvml_context():
+        handle = pynvml.nvmlDeviceGetHandleByIndex(device_index)
+        for fan in range(pynvml.nvmlDeviceGetNumFans(handle)):
+            pynvml.nvmlDeviceSetDefaultFanSpeed_v2(handle, fan)
+
+
+# throttle reasons were renamed clock event reasons, older pynvml only has those
+def get_nvml_clock_event_mask(handle) -> int:
+    if hasattr(pynvml, "nvmlDeviceGetCurrentClocksEventReasons"):
+        return pynvml.nvmlDeviceGetCurrentClocksEventReasons(handle)
+    ret = pynvml.nvmlDeviceGetCurrentClocksThrottleReasons(handle)
+    return ret
+
+
+class NVMLGPUStatSustainer(NVIDIAGPUStatSustainer):
+    @staticmethod
+    @contextlib.contextmanager
+    def nvml_context():
+        pynvml.nvmlInit()
+        try:
+            yield
+        finally:
+            pynvml.nvmlShutdown()
+
+    def main(self):
+        with self.nvml_context():
+            super().main()
+
+    def test(self):
+        with self.nvml_context():
+            return super().test()
+
+    def get_device_indices(self):
+        num_gpus = pynvml.nvmlDeviceGetCount()
+        ret = self.scope.filter_gpus(range(num_gpus), self.get_device_uuid)
+        return ret
+
+    @staticmethod
+    def get_device_uuid(device_index: int):
+        handle = pynvml.nvmlDeviceGetHandleByIndex(device_index)
+        ret = pynvml.nvmlDeviceGetUUID(handle)
+        # older pynvml releases return bytes
+        if isinstance(ret, bytes):
+            ret = ret.decode()
+        return ret
+
+    @staticmethod
+    def get_current_stats(device_index: int):
+        handle = pynvml.nvmlDeviceGetHandleByIndex(device_index)
+
+        info = pynvml.nvmlDeviceGetUtilizationRates(handle)
+        power_info = pynvml.nvmlDeviceGetEnforcedPowerLimit(handle)
+        temp_info = pynvml.nvmlDeviceGetTemperatureThreshold(
+            handle, pynvml.NVML_TEMPERATURE_THRESHOLD_ACOUSTIC_CURR
+        )
+        return info, power_info, temp_info
+
+    def read_status(self) -> Dict[str, Dict[str, Any]]:
+        ret = {}
+        with self.nvml_context():
+            for index in self.get_device_indices():
+                _, power_info, temp_info = self.get_current_stats(index)
+                handle = pynvml.nvmlDeviceGetHandleByIndex(index)
+                ret[self.get_device_name(index)] = {
+                    "temperature": pynvml.nvmlDeviceGetTemperature(
+                        handle, pynvml.NVML_TEMPERATURE_GPU
+                    ),
+                    "power_limit": power_info / 1000,
+                    "gpu_target_temperature": temp_info,
+                    "throttle_reasons": sorted(
+                        get_nvml_throttle_reasons(get_nvml_clock_event_mask(handle))
+                    ),
+                }
+        return ret
+
+    def read_power_draw(self) -> Dict[int, float]:
+        ret = {}
+        with self.nvml_context():
+            for index in self.get_device_indices():
+                handle = pynvml.nvmlDeviceGetHandleByIndex(index)
+                ret[index] = pynvml.nvmlDeviceGetPowerUsage(handle) / 1000
+        return ret
+
+    def get_target_power_limit(self, device_index: int):
+        pynvml.nvmlInit()
+        handle = pynvml.nvmlDeviceGetHandleByIndex(device_index)
+        default_power_limit = pynvml.nvmlDeviceGetPowerManagementDefaultLimit(handle)
+        ret = int(default_power_limit * self.max_power_limit_ratio)
+        return ret
+
+    def set_stats(self, device_index: int):
+        self.capture_original_settings(device_index)
+        pynvml.nvmlInit()
+        handle = pynvml.nvmlDeviceGetHandleByIndex(device_index)
+
+        new_power_limit = self.get_target_power_limit(device_index)
+
+        pynvml.nvmlDeviceSetPowerManagementLimit(handle, new_power_limit)
+        pynvml.nvmlDeviceSetTemperatureThreshold(
+            handle,
+            pynvml.NVML_TEMPERATURE_THRESHOLD_ACOUSTIC_CURR,
+            self.get_target_temp(device_index),
+        )
+
+        pynvml.nvmlDeviceSetPersistenceMode(handle, 1)
+
+    def capture_device_settings(self, device_id: int) -> Dict[str, Any]:
+        with self.nvml_context():
+            handle = pynvml.nvmlDeviceGetHandleByIndex(device_id)
+            ret = {
+                "power_limit": pynvml.nvmlDeviceGetPowerManagementLimit(handle),
+                "gpu_target_temperature": pynvml.nvmlDeviceGetTemperatureThreshold(
+                    handle, pynvml.NVML_TEMPERATURE_THRESHOLD_ACOUSTIC_CURR
+                ),
+                "persistence_mode": pynvml.nvmlDeviceGetPersistenceMode(handle),
+            }
+        return ret
+
+    def apply_device_settings(self, device_id: int, settings: Dict[str, Any]):
+        with self.nvml_context():
+            handle = pynvml.nvmlDeviceGetHandleByIndex(device_id)
+            pynvml.nvmlDeviceSetPowerManagementLimit(handle, settings["power_limit"])
+            pynvml.nvmlDeviceSetTemperatureThreshold(
+                handle,
+                pynvml.NVML_TEMPERATURE_THRESHOLD_ACOUSTIC_CURR,
+                settings["gpu_target_temperature"],
+            )
+            pynvml.nvmlDeviceSetPersistenceMode(handle, settings["persistence_mode"])
+        # NVML works in milliwatts, device states are kept in watts like nvidia-smi
+        self.update_device_state(device_id, power_limit=settings["power_limit"] / 1000)
+
+    def verify_stats(self, device_index: int):
+        _, power_info, temp_info = self.get_current_stats(device_index)
+        power_limit_set = power_info == self.get_target_power_limit(device_index)
+        temp_limit_set = temp_info == self.get_target_temp(device_index)
+        self.update_device_state(
+            device_index,
+            power_limit=power_info / 1000,
+            gpu_target_temperature=temp_info,
+        )
+        handle = pynvml.nvmlDeviceGetHandleByIndex(device_index)
+        self.update_throttle_reasons(
+            device_index, get_nvml_throttle_reasons(get_nvml_clock_event_mask(handle))
+        )
+        persistent_mode = pynvml.nvmlDeviceGetPersistenceMode(handle)
+        persistent_mode_set = persistent_mode == 1
+
+        return power_limit_set and temp_limit_set and persistent_mode_set
@@ -0,0 +1,650 @@
+import functools
+import importlib.util
+import traceback
+from typing import Optional, List, Dict, Any, Sequence, Set, Tuple, Union
+import xmltodict
+
+from .base import NVIDIA_SMI, EXEC_TIMEOUT, get_min_clock_ratio_config
+from .nvidia import NVIDIAGPUStatSustainer
+from .policy import HOLD, LOWER, RAISE
+from .throttle import get_nvsmi_throttle_reasons
+
+
+# the nvidia-smi writes of one tick. each nvidia-smi process initializes the
+# driver again, which takes up to a second on hosts with many GPUs, so devices
+# written the same setting and value share a process through "-i 0,1,2", or no
+# "-i" at all when every GPU is written. nvidia-smi applies a single setting per
+# call, and settings are independent of each other, so only values are grouped.
+class NVSMIWritePlan:
+    def __init__(self, device_count: Optional[int] = None):
+        self.device_count = device_count
+        # setting and value -> devices, in the order they were first planned
+        self.writes: Dict[Tuple[str, ...], List[int]] = {}
+        self.checked: Set[Tuple[str, ...]] = set()
+        self.write_count = 0
+
+    def add(self, device_id: int, suffix: List[str], check: bool = False):
+        key = tuple(suffix)
+        device_ids = self.writes.setdefault(key, [])
+        if device_id in device_ids:
+            return
+        device_ids.append(device_id)
+        if check:
+            self.checked.add(key)
+        self.write_count += 1
+
+    def get_writes(self) -> List[Tuple[List[str], List[int], bool]]:
+        ret = [
+            (list(suffix), device_ids, suffix in self.checked)
+            for suffix, device_ids in self.writes.items()
+        ]
+        return ret
+
+    def get_device_ids(self) -> List[int]:
+        ret: List[int] = []
+        for device_ids in self.writes.values():
+            ret.extend(it for it in device_ids if it not in ret)
+        return ret
+
+    # None stands for every GPU, leaving out "-i"
+    def get_device_argument(self, device_ids: List[int]) -> Optional[str]:
+        if self.device_count is not None and sorted(device_ids) == list(
+            range(self.device_count)
+        ):
+            return None
+        ret = ",".join(str(it) for it in device_ids)
+        return ret
+
+    def get_saved_processes(self):
+        ret = self.write_count - len(self.writes)
+        return ret
+
+
+class NVSMIGPUStatSustainer(NVIDIAGPUStatSustainer):
+    required_binaries = [NVIDIA_SMI]
+    # nvidia-smi processes saved by batching writes since start
+    saved_processes = 0
+
+    def __init__(
+        self,
+        target_temp: Optional[int] = None,
+        max_power_limit_ratio: Optional[float] = None,
+        skip_root_check: bool = False,
+    ):
+        super().__init__(
+            target_temp=target_temp,
+            max_power_limit_ratio=max_power_limit_ratio,
+            skip_root_check=skip_root_check,
+        )
+        # GPUs reporting no power draw, each is reported once until it reads again
+        self.power_draw_missing: Set[int] = set()
+
+    def get_device_indices(self):
+        data = self.get_current_stats()
+        ret = self.get_scoped_indices(data["gpu"])
+        return ret
+
+    def get_scoped_indices(self, gpus: List[dict]):
+        ret = self.scope.filter_gpus(
+            range(len(gpus)), lambda it: gpus[it].get("uuid", None)
+        )
+        return ret
+
+    def get_current_stats(self):
+        cmdlist = self.prepare_nvidia_smi_command(["-x", "-q"])
+        output = self.executor.check_output(cmdlist)
+        data = xmltodict.parse(output)
+        data = data["nvidia_smi_log"]
+        if type(data["gpu"]) != list:
+            data["gpu"] = [data["gpu"]]
+
+        return data
+
+    @staticmethod
+    def prepare_nvidia_smi_command(
+        suffix: List[str], device_id: Optional[Union[int, str]] = None
+    ):
+        cmdlist = [NVIDIA_SMI]
+        if device_id is not None:
+            cmdlist.extend(["-i", str(device_id)])
+        cmdlist.extend(suffix)
+        return cmdlist
+
+    def execute_nvidia_smi_command(
+        self,
+        suffix: List[str],
+        device_id: Optional[Union[int, str]] = None,
+        timeout=EXEC_TIMEOUT,
+        check: bool = False,
+    ):
+        cmdlist = self.prepare_nvidia_smi_command(suffix, device_id)
+        self.executor.run(cmdlist, timeout=timeout, check=check)
+
+    # fields a GPU does not support read "N/A" on every query, they become nan
+    # and fail the device once converted, which is reported as a device error
+    @staticmethod
+    def parse_number(power_limit_string: str):
+        try:
+            ret = float(power_limit_string.split(" ")[0])
+            ret = int(ret)
+        except ValueError:
+            ret = float("nan")
+        return ret
+
+    # nan as well for sections and fields missing from the snapshot
+    @classmethod
+    def read_number(cls, gpu_info: dict, *keys: str):
+        value: Any = gpu_info
+        for it in keys:
+            if not isinstance(value, dict):
+                return float("nan")
+            value = value.get(it, None)
+        if not isinstance(value, str):
+            return float("nan")
+        ret = cls.parse_number(value)
+        return ret
+
+    def get_gpu_info_by_id(self, device_id: int) -> dict:
+        data = self.get_current_stats()
+        ret = data["gpu"][device_id]
+        return ret
+
+    @staticmethod
+    def get_power_readings(gpu_info: dict):
+        ret = gpu_info.get("power_readings", gpu_info.get("gpu_power_readings", None))
+        assert ret is not None, "[-] Failed to get GPU power readings"
+        return ret
+
+    def get_gpu_power_readings_by_id(self, device_id: int):
+        ret = self.get_power_readings(self.get_gpu_info_by_id(device_id))
+        return ret
+
+    def get_default_power_limit(self, device_id: int):
+        ret = self.parse_number(
+            self.get_gpu_power_readings_by_id(device_id)["default_power_limit"]
+        )
+        return ret
+
+    def get_target_power_limit(self, device_id: int):
+        default_power_limit = self.get_default_power_limit(device_id)
+        ret = int(self.max_power_limit_ratio * default_power_limit)
+        return ret
+
+    def set_persistent_mode(self, device_id: int, enabled: bool = True):
+        cmdline = ["-pm", "1" if enabled else "0"]
+        self.execute_nvidia_smi_command(cmdline, device_id=device_id)
+
+    def set_power_limit(self, device_id: int, power_limit: int):
+        cmdline = ["-pl", str(power_limit)]
+        self.execute_nvidia_smi_command(cmdline, device_id=device_id)
+
+    def set_target_temp(self, device_id: int, target_temp: int):
+        cmdline = ["-gtt", str(target_temp)]
+        self.execute_nvidia_smi_command(cmdline, device_id=device_id)
+
+    def set_stats(self, device_id: int):
+        plan = NVSMIWritePlan()
+        self.plan_stats(device_id, plan)
+        self.execute_write_plan(plan)
+
+    def plan_stats(self, device_id: int, plan: NVSMIWritePlan):
+        self.capture_original_settings(device_id)
+        plan.add(
+            device_id,
+            ["-pl", str(self.get_target_power_limit(device_id))],
+            check=True,
+        )
+        plan.add(device_id, ["-gtt", str(self.get_target_temp(device_id))])
+        plan.add(device_id, ["-pm", "1"])
+
+    # every device is checked first, then all of them are written together
+    def mainloop(self):
+        gpus = self.get_current_stats()["gpu"]
+        plan = NVSMIWritePlan(len(gpus))
+        for index in self.get_scoped_indices(gpus):
+            if self.is_device_paused(index):
+                continue
+            self.run_device_tick(
+                index, functools.partial(self.plan_unset_stats, plan=plan)
+            )
+        failed = self.execute_write_plan(plan)
+        for index in plan.get_device_ids():
+            if index not in failed:
+                self.run_device_tick(index, self.check_stats)
+
+    def plan_unset_stats(self, device_id: int, plan: NVSMIWritePlan):
+        if self.verify_stats(device_id):
+            self.update_device_state(device_id, limits_set=True)
+            return
+        self.plan_stats(device_id, plan)
+
+    def check_stats(self, device_id: int):
+        assert self.verify_stats(
+            device_id
+        ), f"[-] {self.hardware_name} stat limits verification failed"
+        self.update_device_state(device_id, limits_set=True)
+
+    # a failed shared write is retried per device, so only the devices it
+    # fails on back off. returns those devices.
+    def execute_write_plan(self, plan: NVSMIWritePlan) -> List[int]:
+        ret: List[int] = []
+        for suffix, device_ids, check in plan.get_writes():
+            try:
+                self.execute_nvidia_smi_command(
+                    suffix, plan.get_device_argument(device_ids), check=check
+                )
+                continue
+            except Exception as e:
+                if len(device_ids) == 1:
+                    delay = self.backoff.record_failure(device_ids[0])
+                    self.report_device_error(device_ids[0], e, delay)
+                    ret.append(device_ids[0])
+                    continue
+            write = functools.partial(
+                self.execute_nvidia_smi_command, suffix, check=check
+            )
+            ret.extend(it for it in device_ids if not self.run_device_tick(it, write))
+        saved = plan.get_saved_processes()
+        if saved:
+            self.saved_processes += saved
+            self.emit_event(
+                "writes_batched",
+                "DEBUG",
+                writes=plan.write_count,
+                processes=len(plan.writes),
+                saved=saved,
+            )
+        return ret
+
+    # counted for all GPUs of the sustainer, listed with each of them
+    def get_status_snapshot(self) -> Dict[str, Dict[str, Any]]:
+        ret = super().get_status_snapshot()
+        for it in ret.values():
+            it["saved_processes"] = self.saved_processes
+        return ret
+
+    def capture_device_settings(self, device_id: int) -> Dict[str, Any]:
+        ret = {
+            "power_limit": self.get_current_power_limit(device_id),
+            "gpu_target_temperature": self.get_current_target_temp(device_id),
+            "persistence_mode": self.get_current_persistent_mode(device_id),
+        }
+        return ret
+
+    def apply_device_settings(self, device_id: int, settings: Dict[str, Any]):
+        self.set_power_limit(device_id, settings["power_limit"])
+        self.set_target_temp(device_id, settings["gpu_target_temperature"])
+        self.set_persistent_mode(device_id, settings["persistence_mode"] == "Enabled")
+        self.update_device_state(device_id, power_limit=settings["power_limit"])
+
+    @classmethod
+    def parse_current_power_limit(cls, power_readings: dict):
+        power_limit = power_readings.get(
+            "current_power_limit", power_readings.get("power_limit", None)
+        )
+        assert power_limit is not None
+        ret = cls.parse_number(power_limit)
+        return ret
+
+    def get_current_power_limit(self, device_id: int):
+        ret = self.parse_current_power_limit(
+            self.get_gpu_power_readings_by_id(device_id)
+        )
+        return ret
+
+    def verify_power_limit(self, device_id: int, target_power_limit: int):
+        power_limit = self.get_current_power_limit(device_id)
+        ret = power_limit == target_power_limit
+        return ret
+
+    def get_gpu_temperature_info(self, device_id: int):
+        data = self.get_gpu_info_by_id(device_id)
+        ret = data["temperature"]
+        return ret
+
+    def get_gpu_temperature(self, device_id: int):
+        temp_info = self.get_gpu_temperature_info(device_id)
+        ret = self.parse_number(temp_info["gpu_temp"])
+        return ret
+
+    def get_current_target_temp(self, device_id: int):
+        temp_info = self.get_gpu_temperature_info(device_id)
+        ret = self.parse_number(temp_info["gpu_target_temperature"])
+        return ret
+
+    def verify_target_temp(self, device_id: int, target_temp: int):
+        current_target_temp = self.get_current_target_temp(device_id)
+        ret = current_target_temp == target_temp
+        return ret
+
+    def get_current_persistent_mode(self, device_id: int):
+        data = self.get_gpu_info_by_id(device_id)
+        persistent_mode = data["persistence_mode"]
+        return persistent_mode
+
+    def verify_persistent_mode(self, device_id: int):
+        persistent_mode = self.get_current_persistent_mode(device_id)
+        ret = persistent_mode == "Enabled"
+        return ret
+
+    # one query covers every GPU, fields a GPU does not report are nan
+    def read_status(self) -> Dict[str, Dict[str, Any]]:
+        ret = {}
+        gpus = self.get_current_stats()["gpu"]
+        for index in self.get_scoped_indices(gpus):
+            gpu = gpus[index]
+            power_readings = self.get_power_readings(gpu)
+            ret[self.get_device_name(index)] = {
+                "temperature": self.read_number(gpu, "temperature", "gpu_temp"),
+                "power_limit": self.parse_current_power_limit(power_readings),
+                "default_power_limit": self.read_number(
+                    power_readings, "default_power_limit"
+                ),
+                "gpu_target_temperature": self.read_number(
+                    gpu, "temperature", "gpu_target_temperature"
+                ),
+                "persistence_mode": gpu.get("persistence_mode", None),
+                "throttle_reasons": sorted(get_nvsmi_throttle_reasons(gpu)),
+            }
+        return ret
+
+    # one query covers every GPU
+    def read_power_draw(self) -> Dict[int, float]:
+        ret = {}
+        gpus = self.get_current_stats()["gpu"]
+        for index in self.get_scoped_indices(gpus):
+            power_readings = self.get_power_readings(gpus[index])
+            power_draw = power_readings.get(
+                "power_draw", power_readings.get("average_power_draw", "N/A")
+            )
+            try:
+                ret[index] = float(power_draw.split(" ")[0])
+                self.power_draw_missing.discard(index)
+            except ValueError:
+                if index not in self.power_draw_missing:
+                    self.power_draw_missing.add(index)
+                    print(f"[-] No power draw reading on GPU #{index}: '{power_draw}'")
+        return ret
+
+    def verify_stats(self, device_id: int):
+        power_limit_set = self.verify_power_limit(
+            device_id, self.get_target_power_limit(device_id)
+        )
+        temp_limit_set = self.verify_target_temp(
+            device_id, self.get_target_temp(device_id)
+        )
+        persistent_mode_set = self.verify_persistent_mode(device_id)
+
+        return power_limit_set and temp_limit_set and persistent_mode_set
+
+
+# steps every limit of one snapshot at once, as columns of the same devices.
+# both directions are computed, the controller picks one per device. unreadable
+# values are nan and only fail the device they belong to once converted.
+def get_stepped_limits(
+    current_limits: Sequence[float],
+    min_limits: Sequence[float],
+    max_limits: Sequence[float],
+    step_ratio: float,
+) -> Tuple[List[float], List[float]]:
+    steps = [it * step_ratio // 1 for it in max_limits]
+    raised = [
+        min(high, current + step)
+        for current, high, step in zip(current_limits, max_limits, steps)
+    ]
+    lowered = [
+        max(low, current - step)
+        for current, low, step in zip(current_limits, min_limits, steps)
+    ]
+    return raised, lowered
+
+
+# limit power consumption only
+class NVIDIALegacyGPUStatSustainer(NVSMIGPUStatSustainer):
+    run_forever = True
+    power_limit_step_ratio = 0.2
+    # device state key of the limit stepped by temperature
+    limit_name = "power_limit"
+
+    def mainloop(self):
+        # a single query per tick covers every GPU, instead of several per GPU
+        gpus = self.get_current_stats()["gpu"]
+        controls = self.get_limit_controls(gpus)
+        plan = NVSMIWritePlan(len(gpus))
+        for index in self.get_scoped_indices(gpus):
+            self.run_device_tick(
+                index,
+                functools.partial(self.sustain_device, controls=controls, plan=plan),
+            )
+        # written once every device is planned, so shared values share a process
+        for it in self.execute_write_plan(plan):
+            # unknown after a failed write, the next tick starts over from it
+            self.device_states.get(it, {}).pop(self.limit_name, None)
+
+    # columns by device, for the GPUs in scope only
+    def get_limit_controls(self, gpus: List[dict]) -> Dict[str, Dict[int, Any]]:
+        indices = self.get_scoped_indices(gpus)
+        temperatures, current_limits, min_limits, max_limits = [], [], [], []
+        for index in indices:
+            gpu = gpus[index]
+            power_readings = gpu.get("power_readings", gpu.get("gpu_power_readings"))
+            current_key = "current_power_limit"
+            if isinstance(power_readings, dict) and current_key not in power_readings:
+                current_key = "power_limit"
+            temperatures.append(self.read_number(gpu, "temperature", "gpu_temp"))
+            current_limits.append(self.read_number(power_readings, current_key))
+            min_limits.append(self.read_number(power_readings, "min_power_limit"))
+            max_limits.append(self.read_number(power_readings, "default_power_limit"))
+        raised, lowered = get_stepped_limits(
+            current_limits, min_limits, max_limits, self.power_limit_step_ratio
+        )
+        ret = self.get_controls_by_device(
+            gpus, indices, temperatures, current_limits, raised, lowered
+        )
+        return ret
+
+    @staticmethod
+    def get_controls_by_device(
+        gpus: List[dict],
+        indices: List[int],
+        temperatures: List[float],
+        current_limits: List[float],
+        raised: List[float],
+        lowered: List[float],
+    ) -> Dict[str, Dict[int, Any]]:
+        ret = {
+            "temperature": dict(zip(indices, temperatures)),
+            "throttle_reasons": {
+                it: get_nvsmi_throttle_reasons(gpus[it]) for it in indices
+            },
+            "current": dict(zip(indices, current_limits)),
+            "raised": dict(zip(indices, raised)),
+            "lowered": dict(zip(indices, lowered)),
+        }
+        return ret
+
+    # a rejected limit fails the device, instead of being taken as written
+    def plan_limit(self, device_id: int, limit: int, plan: NVSMIWritePlan):
+        plan.add(device_id, ["-pl", str(limit)], check=True)
+
+    def sustain_device(
+        self, device_id: int, controls: Dict[str, Dict[int, Any]], plan: NVSMIWritePlan
+    ):
+        gpu_temp = controls["temperature"][device_id]
+        self.update_device_state(device_id, temperature=gpu_temp)
+        self.update_throttle_reasons(device_id, controls["throttle_reasons"][device_id])
+        if self.is_device_paused(device_id):
+            return
+        fans_saturated = self.apply_fan_curve(device_id, gpu_temp)
+        initial_limit = self.pop_initial_limit(device_id)
+        if initial_limit is not None:
+            self.capture_original_settings(device_id)
+            self.plan_limit(device_id, int(initial_limit), plan)
+            self.update_device_state(device_id, **{self.limit_name: int(initial_limit)})
+            return
+        direction = self.limit_policy.get_direction(
+            device_id, gpu_temp, self.get_target_temp(device_id)
+        )
+        # fan first: power only comes down once the fans are saturated
+        if direction == LOWER and not fans_saturated:
+            direction = HOLD
+        # the driver is throttling already, cutting the limit as well would
+        # stack on top and leave it far too low once the card cools down
+        if direction == LOWER and self.is_driver_throttling(device_id):
+            direction = HOLD
+        limit = int(controls["current"][device_id])
+        if direction == RAISE:
+            new_limit = int(controls["raised"][device_id])
+        elif direction == LOWER:
+            new_limit = int(controls["lowered"][device_id])
+        else:
+            new_limit = limit
+        # nothing to write once a limit is settled at either end
+        if self.limit_policy.should_change(limit, new_limit):
+            self.capture_original_settings(device_id)
+            self.plan_limit(device_id, new_limit, plan)
+            self.limit_policy.record_change(device_id, direction)
+            limit = new_limit
+        self.update_device_state(device_id, **{self.limit_name: limit})
+
+    # nvidia-smi cannot set fan speeds, NVML can where the driver allows it
+    def supports_fan_control(self) -> bool:
+        if importlib.util.find_spec("pynvml") is None:
+            return False
+        from .nvml import has_nvml_fan_control
+
+        ret = has_nvml_fan_control()
+        return ret
+
+    def set_fan_percent(self, device_id: int, fan_percent: int):
+        from .nvml import set_nvml_fan_percent
+
+        set_nvml_fan_percent(device_id, fan_percent)
+
+    def reset_fans(self, device_id: int):
+        from .nvml import reset_nvml_fans
+
+        reset_nvml_fans(device_id)
+
+    def get_min_power_limit(self, device_id: int):
+        ret = self.parse_number(
+            self.get_gpu_power_readings_by_id(device_id)["min_power_limit"]
+        )
+        return ret
+
+    # only the power limit and fans are touched here, so only those are restored
+    def capture_device_settings(self, device_id: int) -> Dict[str, Any]:
+        ret: Dict[str, Any] = {"power_limit": self.get_current_power_limit(device_id)}
+        if self.fan_curve is not None:
+            ret["fan_mode"] = "auto"
+        return ret
+
+    def apply_device_settings(self, device_id: int, settings: Dict[str, Any]):
+        self.set_power_limit(device_id, settings["power_limit"])
+        if settings.get("fan_mode") == "auto":
+            self.reset_fans(device_id)
+            self.device_states.get(device_id, {}).pop("fan_percent", None)
+        self.update_device_state(device_id, power_limit=settings["power_limit"])
+
+
+# steps the locked graphics clock range instead of the power limit. under a
+# power cap clocks keep swinging with the load, below a locked maximum they
+# hold steady, and so does latency. locks cannot be read back from nvidia-smi,
+# so the locked clock is kept in the device state and reset on release.
+class NVIDIAClockLockGPUStatSustainer(NVIDIALegacyGPUStatSustainer):
+    clock_step_ratio = 0.05
+    limit_name = "locked_clock"
+
+    def __init__(
+        self,
+        target_temp: Optional[int] = None,
+        max_power_limit_ratio: Optional[float] = None,
+        skip_root_check: bool = False,
+        min_clock_ratio: Optional[float] = None,
+    ):
+        super().__init__(
+            target_temp=target_temp,
+            max_power_limit_ratio=max_power_limit_ratio,
+            skip_root_check=skip_root_check,
+        )
+        if min_clock_ratio is None:
+            min_clock_ratio = get_min_clock_ratio_config()
+        self.min_clock_ratio = min_clock_ratio
+        # lower end of each locked range, where the clock settles when idle
+        self.min_clocks: Dict[int, float] = {}
+
+    def get_limit_controls(self, gpus: List[dict]) -> Dict[str, Dict[int, Any]]:
+        indices = self.get_scoped_indices(gpus)
+        temperatures, current_clocks, min_clocks, max_clocks = [], [], [], []
+        for index in indices:
+            gpu = gpus[index]
+            max_clock = self.read_number(gpu, "max_clocks", "graphics_clock")
+            min_clock = max_clock * self.min_clock_ratio // 1
+            temperatures.append(self.read_number(gpu, "temperature", "gpu_temp"))
+            # unlocked devices run up to their maximum clock
+            locked_clock = self.device_states.get(index, {}).get("locked_clock")
+            current_clocks.append(locked_clock or max_clock)
+            min_clocks.append(min_clock)
+            max_clocks.append(max_clock)
+            self.min_clocks[index] = min_clock
+        raised, lowered = get_stepped_limits(
+            current_clocks, min_clocks, max_clocks, self.clock_step_ratio
+        )
+        ret = self.get_controls_by_device(
+            gpus, indices, temperatures, current_clocks, raised, lowered
+        )
+        return ret
+
+    # fails loudly, older GPUs and drivers do not support locking clocks
+    def plan_limit(self, device_id: int, limit: int, plan: NVSMIWritePlan):
+        cmdline = ["-lgc", f"{int(self.min_clocks[device_id])},{limit}"]
+        plan.add(device_id, cmdline, check=True)
+
+    def reset_locked_clocks(self, device_id: int):
+        self.execute_nvidia_smi_command(["-rgc"], device_id=device_id, check=True)
+
+    # a cool GPU is never locked by a tick, so locking is probed on the first GPU
+    # in scope before the backend is picked over the power limit ones
+    def probe_clock_lock(self) -> bool:
+        gpus = self.get_current_stats()["gpu"]
+        indices = self.get_scoped_indices(gpus)
+        if not indices:
+            return True
+        index = indices[0]
+        max_clock = self.read_number(gpus[index], "max_clocks", "graphics_clock")
+        min_clock = max_clock * self.min_clock_ratio // 1
+        try:
+            self.execute_nvidia_smi_command(
+                ["-lgc", f"{int(min_clock)},{int(max_clock)}"], index, check=True
+            )
+            self.reset_locked_clocks(index)
+            ret = True
+        except Exception as e:
+            print(f"[-] Failed to lock clocks on GPU #{index}: {e}")
+            ret = False
+        return ret
+
+    def test(self):
+        ret = False
+        try:
+            ret = self.probe_clock_lock()
+        except:
+            traceback.print_exc()
+        if not ret:
+            print(f"[-] Test failed for running '{self.__class__.__name__}'")
+            return ret
+        ret = super().test()
+        return ret
+
+    def capture_device_settings(self, device_id: int) -> Dict[str, Any]:
+        ret: Dict[str, Any] = {"locked_clock": None}
+        if self.fan_curve is not None:
+            ret["fan_mode"] = "auto"
+        return ret
+
+    def apply_device_settings(self, device_id: int, settings: Dict[str, Any]):
+        self.reset_locked_clocks(device_id)
+        if settings.get("fan_mode") == "auto":
+            self.reset_fans(device_id)
+            self.device_states.get(device_id, {}).pop("fan_percent", None)
+        self.update_device_state(device_id, locked_clock=None)
@@ -0,0 +1,82 @@
+import collections
+import threading
+import time
+from typing import Callable, Deque, Dict, Tuple
+
+RAISE = 1
+HOLD = 0
+LOWER = -1
+
+DEFAULT_RISE_THRESHOLD = 0.0
+DEFAULT_FALL_THRESHOLD = 2.0
+DEFAULT_LIMIT_DEADBAND = 0.02
+DEFAULT_MIN_DWELL_TIME = 10.0
+SECONDS_PER_HOUR = 3600
+
+
+# decides when limits move, shared by every sustainer so a device at steady
+# state holds its limit instead of flipping it up and down each tick.
+# limits come down once the temperature rises past target + rise threshold and
+# go up once it falls below target - fall threshold, holding in between. going
+# back up after coming down waits for the minimum dwell time, and changes
+# smaller than the deadband, relative to the limit, are not written.
+class LimitPolicy:
+    def __init__(
+        self,
+        rise_threshold: float = DEFAULT_RISE_THRESHOLD,
+        fall_threshold: float = DEFAULT_FALL_THRESHOLD,
+        deadband: float = DEFAULT_LIMIT_DEADBAND,
+        min_dwell_time: float = DEFAULT_MIN_DWELL_TIME,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.rise_threshold = rise_threshold
+        self.fall_threshold = fall_threshold
+        self.deadband = deadband
+        self.min_dwell_time = min_dwell_time
+        self.clock = clock
+        self.lock = threading.Lock()
+        # device id -> (time, direction) of the last change
+        self.last_changes: Dict[int, Tuple[float, int]] = {}
+        self.change_times: Dict[int, Deque[float]] = {}
+
+    def get_direction(self, device_id: int, temperature: float, target_temp: float):
+        if temperature > target_temp + self.rise_threshold:
+            ret = LOWER
+        elif temperature < target_temp - self.fall_threshold:
+            ret = RAISE
+        else:
+            return HOLD
+        # limits always come down when hot, only going back up has to wait
+        last_change = self.last_changes.get(device_id, None)
+        if ret == RAISE and last_change is not None:
+            last_time, last_direction = last_change
+            if (
+                last_direction == LOWER
+                and self.clock() - last_time < self.min_dwell_time
+            ):
+                return HOLD
+        return ret
+
+    def should_change(self, current_limit: float, new_limit: float):
+        if new_limit == current_limit:
+            return False
+        ret = abs(new_limit - current_limit) >= self.deadband * abs(current_limit)
+        return ret
+
+    def record_change(self, device_id: int, direction: int):
+        now = self.clock()
+        with self.lock:
+            self.last_changes[device_id] = (now, direction)
+            self.change_times.setdefault(device_id, collections.deque()).append(now)
+
+    # limit changes of the device within the last hour
+    def get_hourly_changes(self, device_id: int) -> int:
+        since = self.clock() - SECONDS_PER_HOUR
+        with self.lock:
+            change_times = self.change_times.get(device_id, None)
+            if change_times is None:
+                return 0
+            while change_times and change_times[0] <= since:
+                change_times.popleft()
+            ret = len(change_times)
+        return ret
@@ -0,0 +1,269 @@
+import json
+import os
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Set
+
+from .base import get_value_from_environ_with_fallback
+
+if TYPE_CHECKING:
+    from .events import EventLog
+
+DEFAULT_PROFILES_PATH = "/etc/sustainer/profiles.json"
+# holds the name of the profile to run, e.g. written by a Slurm prolog
+DEFAULT_PROFILE_FILE = "/run/sustainer/profile"
+DEFAULT_LEARNED_LIMITS_PATH = "/var/lib/sustainer/learned_limits.json"
+PROFILE_POLL_INTERVAL = 1.0
+DEFAULT_LEARNING_INTERVAL = 30.0
+# weight of each new sample in a learned limit, about 10 minutes of samples
+LEARNING_RATE = 0.05
+# limits only count as steady state while they hold a device near its target,
+# an idle device sits at its highest limit far below it
+LEARNING_TEMP_BAND = 3.0
+
+
+def get_profiles_path_config() -> str:
+    ret = get_value_from_environ_with_fallback(
+        "SUSTAINER_PROFILES", DEFAULT_PROFILES_PATH
+    )
+    return ret
+
+
+def get_profile_file_config() -> str:
+    ret = get_value_from_environ_with_fallback(
+        "SUSTAINER_PROFILE_FILE", DEFAULT_PROFILE_FILE
+    )
+    return ret
+
+
+def get_learned_limits_path_config() -> str:
+    ret = get_value_from_environ_with_fallback(
+        "SUSTAINER_LEARNED_LIMITS", DEFAULT_LEARNED_LIMITS_PATH
+    )
+    return ret
+
+
+def get_learning_interval_config() -> float:
+    ret = get_value_from_environ_with_fallback(
+        "PROFILE_LEARNING_INTERVAL", DEFAULT_LEARNING_INTERVAL
+    )
+    return ret
+
+
+# profiles by name, e.g.
+#   {"inference": {"target_temp": 60, "devices": {"nvidia": {"limit": 200},
+#                                                  "nvidia:1": {"target_temp": 55}}}}
+def load_profiles(path: str) -> Dict[str, Dict[str, Any]]:
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r") as f:
+        ret = json.load(f)
+    for name, profile in ret.items():
+        assert isinstance(profile, dict), f"Profile '{name}' is not an object"
+    return ret
+
+
+# "kind:index" entries override "kind" entries, which override the profile wide target
+def get_profile_device_settings(
+    profile: Dict[str, Any], device_name: str
+) -> Dict[str, Any]:
+    ret = {}
+    if "target_temp" in profile:
+        ret["target_temp"] = profile["target_temp"]
+    devices = profile.get("devices", {})
+    device_kind = device_name.partition(":")[0]
+    for it in (device_kind, device_name):
+        ret.update(devices.get(it, {}))
+    return ret
+
+
+# steady state limits by profile and device, moving averages kept between jobs
+class LearnedLimits:
+    def __init__(self, path: Optional[str] = None):
+        if path is None:
+            path = get_learned_limits_path_config()
+        self.path = path
+        self.lock = threading.Lock()
+        self.entries: Dict[str, Dict[str, Dict[str, float]]] = self.load()
+
+    def load(self) -> Dict[str, Dict[str, Dict[str, float]]]:
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, "r") as f:
+                ret = json.load(f)
+        except ValueError:
+            print(f"[-] Ignoring corrupted learned limits: {self.path}")
+            ret = {}
+        return ret
+
+    def save(self):
+        with self.lock:
+            if not self.entries:
+                return
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(self.entries, f, indent=4)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+
+    def get(self, profile: str, device_name: str) -> Optional[float]:
+        with self.lock:
+            entry = self.entries.get(profile, {}).get(device_name, None)
+        ret = None if entry is None else entry["limit"]
+        return ret
+
+    # the first samples are averaged evenly, later ones decay at the learning rate
+    def add_sample(self, profile: str, device_name: str, limit: float):
+        with self.lock:
+            entries = self.entries.setdefault(profile, {})
+            entry = entries.get(device_name, {"limit": limit, "samples": 0})
+            samples = entry["samples"] + 1
+            weight = max(1 / samples, LEARNING_RATE)
+            entries[device_name] = {
+                "limit": round(entry["limit"] + weight * (limit - entry["limit"]), 1),
+                "samples": samples,
+            }
+
+
+# switches the targets and limits of every device between named profiles, by
+# request or through the profile file. devices start at the limit learned for
+# the profile, or at the one it configures when nothing was learned yet.
+class ProfileManager:
+    def __init__(
+        self,
+        sustainers: List[Any],
+        event_log: Optional["EventLog"] = None,
+        profiles_path: Optional[str] = None,
+        profile_file: Optional[str] = None,
+        learned_limits: Optional[LearnedLimits] = None,
+        learning_interval: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        # shared with HardwareStatSustainer, so sustainers added later are seen
+        self.sustainers = sustainers
+        self.event_log = event_log
+        if profiles_path is None:
+            profiles_path = get_profiles_path_config()
+        self.profiles_path = profiles_path
+        if profile_file is None:
+            profile_file = get_profile_file_config()
+        self.profile_file = profile_file
+        if learned_limits is None:
+            learned_limits = LearnedLimits()
+        self.learned_limits = learned_limits
+        if learning_interval is None:
+            learning_interval = get_learning_interval_config()
+        self.learning_interval = learning_interval
+        self.clock = clock
+        self.lock = threading.RLock()
+        self.active: Optional[str] = None
+        self.profile: Dict[str, Any] = {}
+        # devices the active profile was applied to, others get it once they show up
+        self.applied: Dict[str, Any] = {}
+        self.file_profile: Optional[str] = None
+        self.last_learning_time = clock()
+
+    def get_profile_names(self) -> List[str]:
+        ret = sorted(load_profiles(self.profiles_path))
+        return ret
+
+    # definitions are read again on every switch, so edits apply to the next job.
+    # switching to the active profile changes nothing and is not reported.
+    def switch(self, name: Optional[str]) -> Dict[str, Dict[str, Any]]:
+        with self.lock:
+            if (name or None) == self.active:
+                return {}
+            profile: Dict[str, Any] = {}
+            if name:
+                profiles = load_profiles(self.profiles_path)
+                if name not in profiles:
+                    raise KeyError(f"Unknown profile: {name}")
+                profile = profiles[name]
+            previous = self.active
+            if previous is not None:
+                self.learn()
+            # back to the default targets, limits carry on from where they are
+            for device_name, sustainer in self.applied.items():
+                device_id = int(device_name.partition(":")[2])
+                sustainer.set_device_target_temp(device_id, None)
+            self.active = name or None
+            self.profile = profile
+            self.applied = {}
+            ret = self.apply_pending()
+        print(f"[*] Switched from profile {previous} to {self.active}")
+        if self.event_log is not None:
+            self.event_log.emit(
+                "profile_changed", "INFO", previous=previous, profile=self.active
+            )
+        return ret
+
+    def apply_pending(self) -> Dict[str, Dict[str, Any]]:
+        ret = {}
+        if self.active is None:
+            return ret
+        for sustainer in list(self.sustainers):
+            for device_name in sustainer.get_status_snapshot():
+                if device_name in self.applied:
+                    continue
+                ret[device_name] = self.apply_device(sustainer, device_name)
+                self.applied[device_name] = sustainer
+        return ret
+
+    def apply_device(self, sustainer: Any, device_name: str) -> Dict[str, Any]:
+        device_id = int(device_name.partition(":")[2])
+        settings = get_profile_device_settings(self.profile, device_name)
+        target_temp = settings.get("target_temp", None)
+        sustainer.set_device_target_temp(device_id, target_temp)
+        limit = self.learned_limits.get(self.active, device_name)
+        if limit is None:
+            limit = settings.get("limit", None)
+        if limit is not None:
+            try:
+                sustainer.set_initial_limit(device_id, limit)
+            except NotImplementedError:
+                limit = None
+        ret = {"target_temp": target_temp, "limit": limit}
+        return ret
+
+    def learn(self):
+        if self.active is None:
+            return
+        for sustainer in list(self.sustainers):
+            snapshot = sustainer.get_status_snapshot()
+            for device_id, limit in sustainer.get_current_limits().items():
+                device_name = sustainer.get_device_name(device_id)
+                device_state = snapshot.get(device_name, {})
+                temperature = device_state.get("temperature", None)
+                if device_name not in self.applied or temperature is None:
+                    continue
+                if abs(temperature - device_state["target_temp"]) > LEARNING_TEMP_BAND:
+                    continue
+                self.learned_limits.add_sample(self.active, device_name, limit)
+        self.learned_limits.save()
+
+    def read_profile_file(self) -> Optional[str]:
+        try:
+            with open(self.profile_file, "r") as f:
+                ret = f.read().strip()
+        except FileNotFoundError:
+            ret = ""
+        return ret or None
+
+    # an epilog removing the file, or emptying it, goes back to no profile
+    def poll_profile_file(self):
+        name = self.read_profile_file()
+        if name == self.file_profile:
+            return
+        self.file_profile = name
+        self.switch(name)
+
+    def tick(self):
+        self.poll_profile_file()
+        with self.lock:
+            self.apply_pending()
+            if self.clock() - self.last_learning_time >= self.learning_interval:
+                self.last_learning_time = self.clock()
+                self.learn()
@@ -0,0 +1,88 @@
+import json
+import socket
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Dict
+
+from .base import get_value_from_environ_with_fallback
+
+if TYPE_CHECKING:
+    import asyncio
+
+DEFAULT_SOCKET_PATH = "/run/sustainer.sock"
+MAX_MESSAGE_SIZE = 1024 * 1024
+REQUEST_TIMEOUT = 5
+
+
+def get_socket_path_config() -> str:
+    ret = get_value_from_environ_with_fallback("SUSTAINER_SOCKET", DEFAULT_SOCKET_PATH)
+    return ret
+
+
+def encode_message(message: Dict[str, Any]) -> bytes:
+    ret = json.dumps(message, separators=(",", ":")).encode("utf-8") + b"\n"
+    return ret
+
+
+def decode_message(line: bytes) -> Dict[str, Any]:
+    ret = json.loads(line.decode("utf-8"))
+    assert type(ret) is dict, "[-] Message must be a JSON object"
+    return ret
+
+
+def exchange_message(sock: socket.socket, message: Dict[str, Any]) -> Dict[str, Any]:
+    sock.sendall(encode_message(message))
+    line = b""
+    while not line.endswith(b"\n"):
+        chunk = sock.recv(65536)
+        assert chunk, "[-] Connection closed without a response"
+        line += chunk
+        assert len(line) <= MAX_MESSAGE_SIZE, "[-] Response too large"
+    ret = decode_message(line)
+    return ret
+
+
+def send_unix_request(
+    request: Dict[str, Any], socket_path: str, timeout: float = REQUEST_TIMEOUT
+) -> Dict[str, Any]:
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(socket_path)
+        ret = exchange_message(sock, request)
+    return ret
+
+
+# a socket file nothing answers at was left behind by a daemon which died
+def is_unix_socket_in_use(socket_path: str, timeout: float = REQUEST_TIMEOUT) -> bool:
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        try:
+            sock.connect(socket_path)
+        except (ConnectionRefusedError, FileNotFoundError):
+            return False
+    return True
+
+
+async def serve_json_lines(
+    reader: "asyncio.StreamReader",
+    writer: "asyncio.StreamWriter",
+    dispatch: Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]],
+):
+    # imported here, clients of this module should not pay for asyncio
+    import asyncio
+
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            try:
+                request = decode_message(line)
+            except (ValueError, AssertionError) as e:
+                response = {"ok": False, "error": f"Invalid request: {e}"}
+            else:
+                response = await dispatch(request)
+            writer.write(encode_message(response))
+            await writer.drain()
+    except (ConnectionError, asyncio.LimitOverrunError, ValueError):
+        print("[-] Client connection dropped")
+    finally:
+        writer.close()
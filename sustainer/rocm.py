@@ -0,0 +1,218 @@
+from typing import Optional, List, Dict, Any
+import json
+
+from .base import AbstractTestStatSustainer, ROCM_SMI, EXEC_TIMEOUT
+from .policy import HOLD, LOWER
+
+
+class ROCMSMIGPUStatSustainer(AbstractTestStatSustainer):
+    hardware_name = "AMD GPU"
+    device_kind = "amd"
+    run_forever = True
+    required_binaries = [ROCM_SMI]
+    tick_interval = 5.0
+    limit_name = "sclk_level"
+
+    @staticmethod
+    def generate_rocm_cmdline(
+        suffixs: List[str], device_id: Optional[int], export_json: bool
+    ):
+        cmdline = [ROCM_SMI]
+        if device_id is not None:
+            cmdline += ["-d", str(device_id)]
+        cmdline += suffixs
+        if export_json:
+            cmdline += ["--json"]
+        # print('[*] Generated cmdline:', cmdline)
+        return cmdline
+
+    def execute_rocm_cmdline(
+        self,
+        suffixs: List[str],
+        device_id: Optional[int] = None,
+        export_json=True,
+        timeout=EXEC_TIMEOUT,
+    ) -> Any:
+        cmdline = self.generate_rocm_cmdline(
+            suffixs, device_id=device_id, export_json=export_json
+        )
+        output = self.executor.check_output(cmdline, timeout=timeout)
+        if export_json:
+            output = json.loads(output)
+        # print('[*] Output:')
+        # print(output)
+        return output
+
+    def get_gpu_sclk_min_max_levels(self, device_id: int):
+        data: dict = self.execute_rocm_cmdline(["-s"], device_id)
+        level_data = self.get_first_value_from_dict(data)
+        levels = [int(it) for it in level_data.keys()]
+        min_level, max_level = min(levels), max(levels)
+        return min_level, max_level
+
+    def get_gpu_current_sclk_level(self, device_id: int):
+        data: dict = self.execute_rocm_cmdline(["-c"], device_id=device_id)
+        level_data = self.get_first_value_from_dict(data)
+        ret = int(level_data["sclk clock level:"])
+        return ret
+
+    def get_device_indices(self):
+        data: dict = self.execute_rocm_cmdline(["--showtopo"])
+        # count for keys
+        device_count = len(data.keys())
+        ret = self.scope.filter_gpus(range(device_count), self.get_gpu_uuid)
+        return ret
+
+    # in the "GPU-<unique id>" form ROCR_VISIBLE_DEVICES accepts
+    def get_gpu_uuid(self, device_id: int):
+        data: dict = self.execute_rocm_cmdline(["--showuniqueid"], device_id)
+        unique_id = str(self.get_first_value_from_dict(data)["Unique ID"]).lower()
+        if unique_id.startswith("0x"):
+            unique_id = unique_id[2:]
+        ret = f"GPU-{unique_id}"
+        return ret
+
+    @staticmethod
+    def get_first_value_from_dict(data: dict):
+        ret = list(data.values())[0]
+        return ret
+
+    def set_gpu_fan_percent(self, device_id: int, fan_percent: int):
+        self.execute_rocm_cmdline(
+            ["--setfan", f"{fan_percent}%"], device_id=device_id, export_json=False
+        )
+
+    def supports_fan_control(self) -> bool:
+        return True
+
+    def set_fan_percent(self, device_id: int, fan_percent: int):
+        self.set_gpu_fan_percent(device_id, fan_percent)
+
+    def reset_fans(self, device_id: int):
+        self.execute_rocm_cmdline(
+            ["--resetfans"], device_id=device_id, export_json=False
+        )
+
+    def set_gpu_sclk_level(self, device_id: int, sclk_level: int):
+        self.execute_rocm_cmdline(
+            ["--setsclk", str(sclk_level)], device_id=device_id, export_json=False
+        )
+
+    def set_gpu_as_manual_perf_level(self, device_id: int):
+        self.execute_rocm_cmdline(
+            ["--setperflevel", "manual"], device_id=device_id, export_json=False
+        )
+
+    def set_gpu_perf_level(self, device_id: int, perf_level: str):
+        self.execute_rocm_cmdline(
+            ["--setperflevel", perf_level], device_id=device_id, export_json=False
+        )
+
+    def get_gpu_perf_level(self, device_id: int):
+        data: dict = self.execute_rocm_cmdline(["--showperflevel"], device_id)
+        level_data = self.get_first_value_from_dict(data)
+        ret = str(self.get_first_value_from_dict(level_data)).lower()
+        return ret
+
+    def capture_device_settings(self, device_id: int) -> Dict[str, Any]:
+        ret = {
+            "perf_level": self.get_gpu_perf_level(device_id),
+            "sclk_level": self.get_gpu_current_sclk_level(device_id),
+        }
+        if self.fan_curve is not None:
+            ret["fan_mode"] = "auto"
+        return ret
+
+    def apply_device_settings(self, device_id: int, settings: Dict[str, Any]):
+        self.set_gpu_perf_level(device_id, settings["perf_level"])
+        if settings["perf_level"] == "manual":
+            self.set_gpu_sclk_level(device_id, settings["sclk_level"])
+        if settings.get("fan_mode") == "auto":
+            self.reset_fans(device_id)
+            self.device_states.get(device_id, {}).pop("fan_percent", None)
+        self.update_device_state(
+            device_id,
+            perf_level=settings["perf_level"],
+            sclk_level=settings["sclk_level"],
+        )
+
+    def get_gpu_temperature(self, device_id: int):
+        data: dict = self.execute_rocm_cmdline(["-t"], device_id=device_id)
+        temp_data = self.get_first_value_from_dict(data)
+        ret = 0
+        for name, value in temp_data.items():
+            try:
+                value = float(value)
+                ret = max(value, ret)
+            except ValueError:
+                print(f'[-] Failed to convert value "{value}" ({name}) to float')
+        return ret
+
+    def read_status(self) -> Dict[str, Dict[str, Any]]:
+        ret = {}
+        for it in self.get_device_indices():
+            min_sclk_level, max_sclk_level = self.get_gpu_sclk_min_max_levels(it)
+            ret[self.get_device_name(it)] = {
+                "temperature": self.get_gpu_temperature(it),
+                "sclk_level": self.get_gpu_current_sclk_level(it),
+                "min_sclk_level": min_sclk_level,
+                "max_sclk_level": max_sclk_level,
+            }
+        return ret
+
+    def read_power_draw(self) -> Dict[int, float]:
+        data: dict = self.execute_rocm_cmdline(["--showpower"])
+        device_ids = None
+        if self.scope.is_gpu_restricted():
+            device_ids = self.get_device_indices()
+        ret = {}
+        # cards are listed in device order, as card0, card1...
+        for index, power_data in enumerate(data.values()):
+            if device_ids is not None and index not in device_ids:
+                continue
+            for name, value in power_data.items():
+                if name.endswith("Power (W)"):
+                    ret[index] = float(value)
+                    break
+        return ret
+
+    def mainloop(self):
+        for it in self.get_device_indices():
+            if self.is_device_paused(it):
+                continue
+            self.run_device_tick(it, self.sustain_device)
+
+    # the perf level only goes manual on the first tick and after a restore,
+    # so a device held at steady state costs no rocm-smi writes
+    def sustain_device(self, device_id: int):
+        if self.device_states.get(device_id, {}).get("perf_level") != "manual":
+            self.capture_original_settings(device_id)
+            self.set_gpu_as_manual_perf_level(device_id)
+        gpu_temp = self.get_gpu_temperature(device_id)
+        current_sclk_level = self.get_gpu_current_sclk_level(device_id)
+        min_sclk_level, max_sclk_level = self.get_gpu_sclk_min_max_levels(device_id)
+        fans_saturated = self.apply_fan_curve(device_id, gpu_temp)
+        direction = self.limit_policy.get_direction(
+            device_id, gpu_temp, self.get_target_temp(device_id)
+        )
+        # fan first: clocks only come down once the fans are saturated
+        if direction == LOWER and not fans_saturated:
+            direction = HOLD
+        new_sclk_level = current_sclk_level + direction
+        initial_limit = self.pop_initial_limit(device_id)
+        if initial_limit is not None:
+            new_sclk_level = int(initial_limit)
+        new_sclk_level = max(min_sclk_level, min(max_sclk_level, new_sclk_level))
+        if initial_limit is not None and new_sclk_level != current_sclk_level:
+            self.set_gpu_sclk_level(device_id, new_sclk_level)
+        elif self.limit_policy.should_change(current_sclk_level, new_sclk_level):
+            self.set_gpu_sclk_level(device_id, new_sclk_level)
+            self.limit_policy.record_change(device_id, direction)
+        else:
+            new_sclk_level = current_sclk_level
+        self.update_device_state(
+            device_id,
+            temperature=gpu_temp,
+            sclk_level=new_sclk_level,
+            perf_level="manual",
+        )
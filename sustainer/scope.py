@@ -0,0 +1,141 @@
+import os
+import re
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+DEFAULT_CPU_SYSFS_ROOT = "/sys/devices/system/cpu"
+# the variables a container runtime or scheduler sets per vendor
+VISIBLE_DEVICES_ENVIRON = {
+    "nvidia": "CUDA_VISIBLE_DEVICES",
+    "amd": "ROCR_VISIBLE_DEVICES",
+}
+PACKAGE_NAME_PATTERN = re.compile(r"^package-(\d+)")
+
+
+# visible device lists hold indices or uuids, like "0,2" or "GPU-8932f937,1".
+# as with CUDA, the list ends at the first invalid entry, and an empty list
+# hides every device. unset means no restriction.
+def parse_visible_devices(value: Optional[str]) -> Optional[List[str]]:
+    if value is None:
+        return None
+    ret = []
+    for it in value.split(","):
+        it = it.strip()
+        if not it or it.startswith("-"):
+            break
+        ret.append(it)
+    return ret
+
+
+# CUDA numbers devices fastest first unless CUDA_DEVICE_ORDER=PCI_BUS_ID, while
+# nvidia-smi and NVML number them in PCI bus order. without it, indices may name
+# another device than the one the job runs on, so only uuids are kept.
+def drop_unordered_indices(
+    visible_devices: Optional[List[str]], device_order: Optional[str]
+) -> Optional[List[str]]:
+    if visible_devices is None or device_order == "PCI_BUS_ID":
+        return visible_devices
+    ret = [it for it in visible_devices if not it.isdigit()]
+    if len(ret) < len(visible_devices):
+        print(
+            "[-] Ignoring indices in CUDA_VISIBLE_DEVICES, set "
+            "CUDA_DEVICE_ORDER=PCI_BUS_ID or use GPU UUIDs"
+        )
+    return ret
+
+
+def parse_uuid_allowlist(value: Optional[str]) -> Optional[List[str]]:
+    if not value:
+        return None
+    ret = [it.strip() for it in value.split(",") if it.strip()]
+    return ret
+
+
+# cpus the process may run on, which follows the cpuset of its cgroup.
+# None when every cpu is allowed, so unrestricted hosts skip all filtering.
+def get_allowed_cpus() -> Optional[Set[int]]:
+    try:
+        ret = os.sched_getaffinity(0)
+    except AttributeError:
+        return None
+    if len(ret) >= (os.cpu_count() or 0):
+        return None
+    return ret
+
+
+def read_cpu_package(cpu: int, cpu_sysfs_root: str = DEFAULT_CPU_SYSFS_ROOT):
+    path = os.path.join(cpu_sysfs_root, f"cpu{cpu}", "topology", "physical_package_id")
+    with open(path, "r") as f:
+        ret = int(f.read().strip())
+    return ret
+
+
+# uuids match by prefix, the way CUDA accepts "GPU-8932f937" for a full uuid
+def match_uuid(uuid: Optional[str], tokens: Iterable[str]):
+    if uuid is None:
+        return False
+    uuid = uuid.lower()
+    ret = any(uuid.startswith(it.lower()) for it in tokens)
+    return ret
+
+
+# the devices one sustainer may touch. GPUs are narrowed by the vendor's
+# visible devices variable and an uuid allowlist, CPUs by the process affinity.
+# device ids stay the physical indices used by nvidia-smi, NVML and rocm-smi.
+class DeviceScope:
+    def __init__(
+        self,
+        visible_devices: Optional[List[str]] = None,
+        uuid_allowlist: Optional[List[str]] = None,
+        cpus: Optional[Set[int]] = None,
+    ):
+        self.visible_devices = visible_devices
+        self.uuid_allowlist = uuid_allowlist
+        self.cpus = cpus
+
+    def is_gpu_restricted(self):
+        ret = self.visible_devices is not None or self.uuid_allowlist is not None
+        return ret
+
+    # uuids are only looked up when an entry needs one
+    def filter_gpus(
+        self, indices: Iterable[int], get_uuid: Callable[[int], Optional[str]]
+    ) -> List[int]:
+        indices = list(indices)
+        if not self.is_gpu_restricted():
+            return indices
+        uuids: Dict[int, Optional[str]] = {}
+
+        def lookup_uuid(index: int):
+            if index not in uuids:
+                uuids[index] = get_uuid(index)
+            return uuids[index]
+
+        ret = []
+        for index in indices:
+            if self.visible_devices is not None:
+                visible = any(
+                    int(it) == index
+                    if it.isdigit()
+                    else match_uuid(lookup_uuid(index), [it])
+                    for it in self.visible_devices
+                )
+                if not visible:
+                    continue
+            if self.uuid_allowlist is not None:
+                if not match_uuid(lookup_uuid(index), self.uuid_allowlist):
+                    continue
+            ret.append(index)
+        return ret
+
+    def filter_cpus(self, cpus: Iterable[int]) -> List[int]:
+        ret = [it for it in cpus if self.cpus is None or it in self.cpus]
+        return ret
+
+    # packages with at least one allowed cpu, None when all are allowed
+    def get_cpu_packages(
+        self, cpu_sysfs_root: str = DEFAULT_CPU_SYSFS_ROOT
+    ) -> Optional[Set[int]]:
+        if self.cpus is None:
+            return None
+        ret = {read_cpu_package(it, cpu_sysfs_root) for it in self.cpus}
+        return ret
@@ -0,0 +1,106 @@
+import contextlib
+import shutil
+import sys
+import threading
+import time
+import traceback
+from typing import Any, Dict, List, Optional, Tuple
+
+from .backends import (
+    AMD_BACKENDS,
+    BackendSpec,
+    get_cpu_backend_list,
+    get_missing_requirements,
+    get_nvidia_backend_list,
+    load_backend,
+)
+from .base import NVIDIA_SMI, ROCM_SMI
+
+STATUS_TIMEOUT = 5
+
+
+# like HardwareStatSustainer, GPU backends are only considered when the vendor
+# tool exists, and the control modes pick the same backends
+def get_status_backend_groups() -> List[Tuple[Optional[str], List[BackendSpec]]]:
+    ret = [
+        (None, get_cpu_backend_list()),
+        (NVIDIA_SMI, get_nvidia_backend_list()),
+        (ROCM_SMI, AMD_BACKENDS),
+    ]
+    return ret
+
+
+def detect_status_backends(
+    backend_groups: Optional[List[Tuple[Optional[str], List[BackendSpec]]]] = None,
+):
+    if backend_groups is None:
+        backend_groups = get_status_backend_groups()
+    ret: List[BackendSpec] = []
+    for detect_binary, backend_list in backend_groups:
+        if detect_binary is not None and shutil.which(detect_binary) is None:
+            continue
+        for spec in backend_list:
+            if not get_missing_requirements(spec):
+                ret.append(spec)
+                break
+    return ret
+
+
+# only reads, so status queries work without root
+def read_backend_status(spec: BackendSpec):
+    sustainer = load_backend(spec)(skip_root_check=True)
+    status = sustainer.read_status()
+    ret = [
+        {"device": device_name, "backend": spec.class_name, **device_status}
+        for device_name, device_status in status.items()
+    ]
+    return ret
+
+
+def collect_status(
+    timeout: float = STATUS_TIMEOUT, backend_list: Optional[List[BackendSpec]] = None
+) -> List[Dict[str, Any]]:
+    if backend_list is None:
+        backend_list = detect_status_backends()
+    results: Dict[str, List[Dict[str, Any]]] = {}
+
+    def read_into_results(spec: BackendSpec):
+        try:
+            results[spec.class_name] = read_backend_status(spec)
+        except Exception as e:
+            traceback.print_exc()
+            results[spec.class_name] = [
+                {
+                    "device": spec.device_kind,
+                    "backend": spec.class_name,
+                    "error": f"{type(e).__name__}: {e}",
+                }
+            ]
+
+    # daemon threads, so a wedged backend cannot hold the process past the deadline
+    threads = [
+        threading.Thread(target=read_into_results, args=(it,), daemon=True)
+        for it in backend_list
+    ]
+    deadline = time.monotonic() + timeout
+    # backend chatter goes to stderr, keeping stdout clean for the report
+    with contextlib.redirect_stdout(sys.stderr):
+        for it in threads:
+            it.start()
+        for it in threads:
+            it.join(max(0, deadline - time.monotonic()))
+    ret = []
+    for spec in backend_list:
+        ret.extend(
+            results.get(
+                spec.class_name,
+                [
+                    {
+                        "device": spec.device_kind,
+                        "backend": spec.class_name,
+                        "error": f"Timed out after {timeout} seconds",
+                    }
+                ],
+            )
+        )
+    return ret
@@ -0,0 +1,83 @@
+import threading
+import time
+from typing import Callable, Dict, FrozenSet, Iterable, Set, Tuple
+
+# NVML clock throttle reason bits, named like the nvidia-smi XML fields
+NVML_THROTTLE_REASONS = {
+    0x1: "gpu_idle",
+    0x2: "applications_clocks_setting",
+    0x4: "sw_power_cap",
+    0x8: "hw_slowdown",
+    0x10: "sync_boost",
+    0x20: "sw_thermal_slowdown",
+    0x40: "hw_thermal_slowdown",
+    0x80: "hw_power_brake_slowdown",
+    0x100: "display_clock_setting",
+}
+# older drivers report clocks_throttle_reasons, newer ones clocks_event_reasons
+NVSMI_THROTTLE_SECTIONS = ["clocks_throttle_reasons", "clocks_event_reasons"]
+NVSMI_THROTTLE_PREFIXES = ["clocks_throttle_reason_", "clocks_event_reason_"]
+# the driver already slows the clocks down for heat or power delivery,
+# lowering limits on top of that stacks up and makes recovery slow
+DRIVER_THROTTLE_REASONS = {
+    "hw_slowdown",
+    "sw_thermal_slowdown",
+    "hw_thermal_slowdown",
+    "hw_power_brake_slowdown",
+}
+# a longer gap between samples (e.g. a paused device) is not counted
+MAX_SAMPLE_GAP = 60.0
+
+
+def get_nvml_throttle_reasons(mask: int) -> Set[str]:
+    ret = {name for bit, name in NVML_THROTTLE_REASONS.items() if mask & bit}
+    return ret
+
+
+def get_nvsmi_throttle_reasons(gpu_info: dict) -> Set[str]:
+    ret: Set[str] = set()
+    for section in NVSMI_THROTTLE_SECTIONS:
+        reasons = gpu_info.get(section, None)
+        if not reasons:
+            continue
+        for key, value in reasons.items():
+            if value != "Active":
+                continue
+            for prefix in NVSMI_THROTTLE_PREFIXES:
+                if key.startswith(prefix):
+                    key = key[len(prefix) :]
+            ret.add(key)
+    return ret
+
+
+def is_driver_throttling(reasons: Iterable[str]):
+    ret = any(it in DRIVER_THROTTLE_REASONS for it in reasons)
+    return ret
+
+
+# seconds spent in each throttle reason per device, credited to the reasons
+# seen at the start of each interval between samples
+class ThrottleTimer:
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.last_samples: Dict[int, Tuple[float, FrozenSet[str]]] = {}
+        self.seconds: Dict[int, Dict[str, float]] = {}
+
+    def add_sample(self, device_id: int, reasons: Iterable[str]):
+        now = self.clock()
+        with self.lock:
+            last_sample = self.last_samples.get(device_id, None)
+            if last_sample is not None:
+                last_time, last_reasons = last_sample
+                duration = now - last_time
+                if 0 < duration <= MAX_SAMPLE_GAP:
+                    seconds = self.seconds.setdefault(device_id, {})
+                    for it in last_reasons:
+                        seconds[it] = seconds.get(it, 0.0) + duration
+            self.last_samples[device_id] = (now, frozenset(reasons))
+
+    def get_seconds(self, device_id: int) -> Dict[str, float]:
+        with self.lock:
+            ret = {k: round(v, 1) for k, v in self.seconds.get(device_id, {}).items()}
+        return ret
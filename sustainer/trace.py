@@ -0,0 +1,202 @@
+import collections
+import gzip
+import json
+import os
+import socket
+import subprocess
+import threading
+import time
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from .executor import DEFAULT_TOOL_CONCURRENCY, ToolExecutor
+
+TRACE_VERSION = 1
+# outputs remembered for reuse while recording, older ones are written again
+TRACE_BLOB_CACHE_SIZE = 256
+
+
+# a trace is gzipped JSON lines: a header, then calls in the order they
+# finished. outputs are stored once as blobs and referenced by id, since the
+# same nvidia-smi or rocm-smi output tends to repeat for hours.
+#   {"trace": 1, "host": "node1", "started": 1700000000.0}
+#   {"b": 0, "s": "<nvidia_smi_log>..."}
+#   {"t": 0.52, "d": 0.08, "c": ["nvidia-smi", "-x", "-q"], "r": 0, "o": 0, "e": 1}
+#   {"t": 1.61, "d": 5.0, "c": ["nvidia-smi", "-pl", "200"], "x": "timeout"}
+class TraceWriter:
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+        self.blob_ids: "collections.OrderedDict[str, int]" = collections.OrderedDict()
+        self.blob_count = 0
+        self.started = time.monotonic()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.file = gzip.open(path, "wt", encoding="utf-8")
+        self.write_record(
+            {
+                "trace": TRACE_VERSION,
+                "host": socket.gethostname(),
+                "started": time.time(),
+            }
+        )
+
+    def write_record(self, record: Dict[str, Any]):
+        self.file.write(json.dumps(record, separators=(",", ":")) + "\n")
+
+    def get_blob_id(self, text: str):
+        ret = self.blob_ids.get(text, None)
+        if ret is not None:
+            self.blob_ids.move_to_end(text)
+            return ret
+        ret = self.blob_ids[text] = self.blob_count
+        self.blob_count += 1
+        self.write_record({"b": ret, "s": text})
+        if len(self.blob_ids) > TRACE_BLOB_CACHE_SIZE:
+            self.blob_ids.popitem(last=False)
+        return ret
+
+    def record_call(
+        self,
+        cmdlist: List[str],
+        started: float,
+        duration: float,
+        result: Optional[subprocess.CompletedProcess],
+    ):
+        with self.lock:
+            record: Dict[str, Any] = {
+                "t": round(started - self.started, 4),
+                "d": round(duration, 4),
+                "c": cmdlist,
+            }
+            if result is None:
+                record["x"] = "timeout"
+            else:
+                record["r"] = result.returncode
+                record["o"] = self.get_blob_id(result.stdout or "")
+                record["e"] = self.get_blob_id(result.stderr or "")
+            self.write_record(record)
+            # synced per call, so a killed recording is still readable
+            self.file.flush()
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+
+# runs tools like ToolExecutor, keeping every call and its output in a trace
+class RecordingExecutor(ToolExecutor):
+    def __init__(
+        self,
+        path: str,
+        timeout: float,
+        concurrency: int = DEFAULT_TOOL_CONCURRENCY,
+        encoding: str = "utf-8",
+    ):
+        super().__init__(timeout, concurrency=concurrency, encoding=encoding)
+        self.writer = TraceWriter(path)
+
+    def run(
+        self, cmdlist: List[str], timeout: Optional[float] = None, check: bool = True
+    ) -> subprocess.CompletedProcess:
+        started = time.monotonic()
+        try:
+            ret = super().run(cmdlist, timeout=timeout, check=False)
+        except subprocess.TimeoutExpired:
+            self.writer.record_call(cmdlist, started, time.monotonic() - started, None)
+            raise
+        self.writer.record_call(cmdlist, started, time.monotonic() - started, ret)
+        if check and ret.returncode != 0:
+            raise subprocess.CalledProcessError(
+                ret.returncode, cmdlist, ret.stdout, ret.stderr
+            )
+        return ret
+
+    def close(self):
+        self.writer.close()
+
+
+def read_trace(path: str) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+    header: Dict[str, Any] = {}
+    blobs: Dict[int, str] = {}
+    calls = []
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        try:
+            for line in f:
+                record = json.loads(line)
+                if "trace" in record:
+                    header = record
+                elif "b" in record:
+                    blobs[record["b"]] = record["s"]
+                else:
+                    if "o" in record:
+                        record["o"] = blobs[record["o"]]
+                        record["e"] = blobs[record["e"]]
+                    calls.append(record)
+        except EOFError:
+            # the recording was killed, every call synced before that is kept
+            pass
+    assert header.get("trace") == TRACE_VERSION, f"[-] Not a trace file: '{path}'"
+    return header, calls
+
+
+# answers tool calls from a trace at full speed, without running anything.
+# each command line gets its recorded results back in order, starting over
+# when they run out. commands never recorded, like a write with a value the
+# recording did not use, succeed with no output unless strict.
+class ReplayExecutor(ToolExecutor):
+    def __init__(
+        self,
+        calls: List[Dict[str, Any]],
+        strict: bool = False,
+        encoding: str = "utf-8",
+    ):
+        super().__init__(0, encoding=encoding)
+        self.strict = strict
+        self.recorded: Dict[Tuple[str, ...], List[Dict[str, Any]]] = {}
+        for it in calls:
+            self.recorded.setdefault(tuple(it["c"]), []).append(it)
+        self.pending: Dict[Tuple[str, ...], Deque[Dict[str, Any]]] = {}
+        self.tools = {os.path.basename(it[0]) for it in self.recorded.keys()}
+        self.replayed = 0
+        # command line -> times it was asked for without a recording
+        self.unmatched: Dict[Tuple[str, ...], int] = collections.Counter()
+
+    @classmethod
+    def load(cls, path: str, strict: bool = False):
+        _, calls = read_trace(path)
+        ret = cls(calls, strict=strict)
+        return ret
+
+    def has_binary(self, binary_name: str):
+        ret = os.path.basename(binary_name) in self.tools
+        return ret
+
+    def get_next_call(self, cmdlist: List[str]) -> Optional[Dict[str, Any]]:
+        key = tuple(cmdlist)
+        with self.lock:
+            recorded = self.recorded.get(key, None)
+            if recorded is None:
+                self.unmatched[key] += 1
+                return None
+            pending = self.pending.get(key, None)
+            if not pending:
+                pending = self.pending[key] = collections.deque(recorded)
+            self.replayed += 1
+            ret = pending.popleft()
+        return ret
+
+    def run(
+        self, cmdlist: List[str], timeout: Optional[float] = None, check: bool = True
+    ) -> subprocess.CompletedProcess:
+        call = self.get_next_call(cmdlist)
+        if call is None:
+            if self.strict:
+                raise LookupError(f"No recorded call of {cmdlist}")
+            return subprocess.CompletedProcess(cmdlist, 0, "", "")
+        if "x" in call:
+            raise subprocess.TimeoutExpired(cmdlist, call["d"])
+        if check and call["r"] != 0:
+            raise subprocess.CalledProcessError(
+                call["r"], cmdlist, call["o"], call["e"]
+            )
+        ret = subprocess.CompletedProcess(cmdlist, call["r"], call["o"], call["e"])
+        return ret
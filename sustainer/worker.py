@@ -0,0 +1,413 @@
+import itertools
+import multiprocessing
+import signal
+import threading
+import time
+import traceback
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from .base import get_value_from_environ_with_fallback
+from .executor import FailureBackoff
+
+DEFAULT_WORKER_STALL_TIMEOUT = 120.0
+# seconds between health checks, which also save the controller state
+WORKER_HEALTH_INTERVAL = 5.0
+WORKER_START_TIMEOUT = 60.0
+WORKER_CALL_TIMEOUT = 10.0
+WORKER_STOP_TIMEOUT = 15.0
+# sustainer methods the supervisor may call on a worker
+WORKER_METHODS = [
+    "get_status_snapshot",
+    "get_controller_state",
+    "get_target_temp",
+    "set_device_target_temp",
+    "set_initial_limit",
+    "get_current_limits",
+    "pause_device",
+    "resume_device",
+    "release_device",
+    "read_power_draw",
+    "update_device_state",
+]
+
+
+def get_worker_mode_config() -> bool:
+    ret = bool(get_value_from_environ_with_fallback("SUSTAINER_WORKERS", 0))
+    return ret
+
+
+def get_worker_stall_timeout_config() -> float:
+    ret = get_value_from_environ_with_fallback(
+        "WORKER_STALL_TIMEOUT", DEFAULT_WORKER_STALL_TIMEOUT
+    )
+    return ret
+
+
+class WorkerError(RuntimeError):
+    pass
+
+
+# request/reply calls and one way notifications over a multiprocessing pipe,
+# in both directions. messages are tuples:
+#   ("request", id, method, args, kwargs)
+#   ("reply", id, error, value)
+#   ("notify", method, args, kwargs)
+# requests are handled on threads of their own, so a handler may call back
+# into the other side while it runs.
+class PipeChannel:
+    def __init__(self, conn, handler: Callable[..., Any]):
+        self.conn = conn
+        self.handler = handler
+        self.send_lock = threading.Lock()
+        self.pending_lock = threading.Lock()
+        # request id -> [done event, error, value]
+        self.pending: Dict[int, list] = {}
+        self.request_ids = itertools.count()
+        self.closed = threading.Event()
+
+    def start(self):
+        thread = threading.Thread(target=self.read_loop, daemon=True)
+        thread.start()
+        return thread
+
+    def send(self, message: Tuple):
+        with self.send_lock:
+            self.conn.send(message)
+
+    def call(self, method: str, *args, timeout: float = WORKER_CALL_TIMEOUT, **kwargs):
+        if self.closed.is_set():
+            raise WorkerError("Channel is closed")
+        request_id = next(self.request_ids)
+        pending = [threading.Event(), None, None]
+        with self.pending_lock:
+            self.pending[request_id] = pending
+        try:
+            self.send(("request", request_id, method, args, kwargs))
+            if not pending[0].wait(timeout):
+                raise WorkerError(f"No reply to '{method}' within {timeout}s")
+        finally:
+            with self.pending_lock:
+                self.pending.pop(request_id, None)
+        if pending[1] is not None:
+            raise pending[1]
+        return pending[2]
+
+    def notify(self, method: str, *args, **kwargs):
+        try:
+            self.send(("notify", method, args, kwargs))
+        except (OSError, ValueError):
+            pass
+
+    def read_loop(self):
+        while True:
+            try:
+                message = self.conn.recv()
+            except (EOFError, OSError):
+                break
+            kind = message[0]
+            if kind == "reply":
+                with self.pending_lock:
+                    pending = self.pending.get(message[1], None)
+                if pending is not None:
+                    pending[1], pending[2] = message[2], message[3]
+                    pending[0].set()
+            elif kind == "request":
+                threading.Thread(
+                    target=self.handle_request, args=message[1:], daemon=True
+                ).start()
+            elif kind == "notify":
+                self.handle_notify(*message[1:])
+        self.closed.set()
+        with self.pending_lock:
+            for pending in self.pending.values():
+                pending[1] = WorkerError("Channel closed while waiting for a reply")
+                pending[0].set()
+
+    def handle_request(self, request_id: int, method: str, args, kwargs):
+        error: Optional[BaseException] = None
+        value = None
+        try:
+            value = self.handler(method, *args, **kwargs)
+        except Exception as e:
+            error = e
+        try:
+            self.send(("reply", request_id, error, value))
+        except (OSError, ValueError):
+            pass
+        except Exception:
+            # replies which cannot be pickled are sent as text
+            self.send(("reply", request_id, WorkerError(repr(error or value)), None))
+
+    def handle_notify(self, method: str, args, kwargs):
+        try:
+            self.handler(method, *args, **kwargs)
+        except:
+            traceback.print_exc()
+
+    def close(self):
+        self.conn.close()
+
+
+# stand ins for the journal and the event log of the supervisor, so a single
+# process owns the journal file and the log
+class JournalProxy:
+    def __init__(self, channel: PipeChannel):
+        self.channel = channel
+
+    # waits for the supervisor, the journal must be written before the device
+    def record(self, device_name: str, backend: str, settings: Dict[str, Any]):
+        self.channel.call("journal_record", device_name, backend, settings)
+
+    def discard(self, device_name: str):
+        self.channel.call("journal_discard", device_name)
+
+
+class EventLogProxy:
+    def __init__(self, channel: PipeChannel):
+        self.channel = channel
+
+    def emit(self, event: str, level: str = "INFO", **fields):
+        self.channel.notify("event", event, level, **fields)
+
+
+# entry point of a worker process. the backend is selected here unless given,
+# so a restarted worker skips the test and picks up the saved controller state.
+def run_worker(
+    conn,
+    device_kind: str,
+    backend: Optional[str] = None,
+    state: Optional[Dict[str, Any]] = None,
+):
+    from .backends import get_backend_spec, load_backend
+    from .lib import USABLE_SUSTAINER_GETTERS, get_control_loop
+
+    # interrupts go to the supervisor, which stops workers in order
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    stopped = threading.Event()
+    sustainer = None
+
+    def handle(method: str, *args, **kwargs):
+        if method == "get_health":
+            ret = {
+                "backend": sustainer.__class__.__name__,
+                "last_tick_age": time.monotonic() - sustainer.last_tick_time,
+            }
+            return ret
+        if method == "stop":
+            stopped.set()
+            return None
+        if method not in WORKER_METHODS:
+            raise WorkerError(f"Unknown worker method: {method}")
+        ret = getattr(sustainer, method)(*args, **kwargs)
+        return ret
+
+    channel = PipeChannel(conn, handle)
+    channel.start()
+    journal = JournalProxy(channel)
+    try:
+        if backend is None:
+            sustainer = USABLE_SUSTAINER_GETTERS[device_kind](journal)
+        else:
+            spec = get_backend_spec(backend)
+            sustainer = load_backend(spec)()
+            sustainer.journal = journal
+        if state is not None:
+            sustainer.set_controller_state(state)
+    except:
+        traceback.print_exc()
+        channel.notify("failed", traceback.format_exc())
+        return
+    sustainer.event_log = EventLogProxy(channel)
+    sustainer.last_tick_time = time.monotonic()
+    control_thread = threading.Thread(target=get_control_loop(sustainer), daemon=True)
+    control_thread.start()
+    channel.notify("ready", sustainer.__class__.__name__)
+    # a supervisor gone without a word ends the worker as well
+    while not stopped.is_set() and not channel.closed.is_set():
+        stopped.wait(1.0)
+    sustainer.stop()
+    control_thread.join(WORKER_STOP_TIMEOUT)
+
+
+# runs one backend in a worker process and stands in for its sustainer, so
+# HardwareStatSustainer and the control socket use it like any other. a worker
+# that died or whose control loop stopped ticking is restarted with the state
+# saved at the last health check.
+class SupervisedSustainer:
+    run_forever = True
+
+    def __init__(
+        self,
+        device_kind: str,
+        journal=None,
+        stall_timeout: Optional[float] = None,
+    ):
+        self.device_kind = device_kind
+        self.journal = journal
+        self.event_log = None
+        if stall_timeout is None:
+            stall_timeout = get_worker_stall_timeout_config()
+        self.stall_timeout = stall_timeout
+        self.backend: Optional[str] = None
+        self.state: Optional[Dict[str, Any]] = None
+        self.last_snapshot: Dict[str, Dict[str, Any]] = {}
+        self.restarts = 0
+        self.backoff = FailureBackoff()
+        self.stop_event = threading.Event()
+        self.context = multiprocessing.get_context("spawn")
+        self.process = None
+        self.channel: Optional[PipeChannel] = None
+        self.ready = threading.Event()
+        self.failure: Optional[str] = None
+
+    def handle(self, method: str, *args, **kwargs):
+        if method == "journal_record":
+            if self.journal is not None:
+                self.journal.record(*args)
+        elif method == "journal_discard":
+            if self.journal is not None:
+                self.journal.discard(*args)
+        elif method == "event":
+            if self.event_log is not None:
+                event, level = args
+                self.event_log.emit(event, level, **kwargs)
+        elif method == "ready":
+            self.backend = args[0]
+            self.ready.set()
+        elif method == "failed":
+            self.failure = args[0]
+            self.ready.set()
+        else:
+            raise WorkerError(f"Unknown supervisor method: {method}")
+
+    def start_worker(self, timeout: float = WORKER_START_TIMEOUT):
+        self.ready.clear()
+        self.failure = None
+        conn, worker_conn = self.context.Pipe()
+        self.process = self.context.Process(
+            target=run_worker,
+            args=(worker_conn, self.device_kind, self.backend, self.state),
+            name=f"sustainer-{self.device_kind}",
+            daemon=True,
+        )
+        self.process.start()
+        worker_conn.close()
+        self.channel = PipeChannel(conn, self.handle)
+        self.channel.start()
+        if not self.ready.wait(timeout):
+            self.kill_worker()
+            raise WorkerError(f"Worker for '{self.device_kind}' did not start in time")
+        if self.failure is not None:
+            self.process.join(WORKER_STOP_TIMEOUT)
+            raise WorkerError(
+                f"Worker for '{self.device_kind}' failed:\n{self.failure}"
+            )
+        print(f"[+] Using sustainer: {self.backend} in worker {self.process.pid}")
+
+    def kill_worker(self):
+        if self.process is None:
+            return
+        self.process.terminate()
+        self.process.join(WORKER_STOP_TIMEOUT)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        if self.channel is not None:
+            self.channel.close()
+
+    # None while healthy, otherwise why the worker needs a restart
+    def check_health(self) -> Optional[str]:
+        if not self.process.is_alive():
+            return f"exited with code {self.process.exitcode}"
+        try:
+            health = self.channel.call("get_health")
+            self.state = self.channel.call("get_controller_state")
+        except WorkerError:
+            return "not responding"
+        if health["last_tick_age"] > self.stall_timeout:
+            return f"no tick for {health['last_tick_age']:.0f}s"
+        return None
+
+    def restart_worker(self, reason: str):
+        self.restarts += 1
+        print(f"[-] Restarting {self.backend} worker, {reason}")
+        self.emit_event("worker_restarted", "WARNING", reason=reason)
+        self.kill_worker()
+        while not self.stop_event.is_set():
+            try:
+                self.start_worker()
+                self.backoff.record_success(None)
+                return
+            except WorkerError as e:
+                print(f"[-] {e}")
+                self.stop_event.wait(self.backoff.record_failure(None))
+
+    def emit_event(self, event: str, level: str = "INFO", **fields):
+        if self.event_log is None:
+            return
+        self.event_log.emit(event, level, backend=self.backend, **fields)
+
+    def main(self):
+        if self.process is None:
+            self.start_worker()
+        while not self.stop_event.wait(WORKER_HEALTH_INTERVAL):
+            reason = self.check_health()
+            if reason is not None and not self.stop_event.is_set():
+                self.restart_worker(reason)
+        try:
+            self.channel.call("stop")
+        except WorkerError:
+            pass
+        self.process.join(WORKER_STOP_TIMEOUT)
+        self.kill_worker()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def call(self, method: str, *args, **kwargs):
+        if self.channel is None:
+            raise WorkerError(f"Worker for '{self.device_kind}' is not running")
+        ret = self.channel.call(method, *args, **kwargs)
+        return ret
+
+    def get_device_name(self, device_id: int):
+        ret = f"{self.device_kind}:{device_id}"
+        return ret
+
+    # answered from the last snapshot while the worker is restarting
+    def get_status_snapshot(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            self.last_snapshot = self.call("get_status_snapshot")
+        except WorkerError:
+            pass
+        return self.last_snapshot
+
+    def get_target_temp(self, device_id: int = 0):
+        ret = self.call("get_target_temp", device_id)
+        return ret
+
+    def set_device_target_temp(self, device_id: int, target_temp: Optional[int]):
+        self.call("set_device_target_temp", device_id, target_temp)
+
+    def set_initial_limit(self, device_id: int, limit: float):
+        self.call("set_initial_limit", device_id, limit)
+
+    def get_current_limits(self) -> Dict[int, float]:
+        ret = self.call("get_current_limits")
+        return ret
+
+    def pause_device(self, device_id: int):
+        self.call("pause_device", device_id)
+
+    def resume_device(self, device_id: int):
+        self.call("resume_device", device_id)
+
+    def release_device(self, device_id: int):
+        self.call("release_device", device_id, timeout=WORKER_START_TIMEOUT)
+
+    def read_power_draw(self) -> Dict[int, float]:
+        ret = self.call("read_power_draw")
+        return ret
+
+    def update_device_state(self, device_id: int, **state):
+        self.call("update_device_state", device_id, **state)
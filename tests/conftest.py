@@ -0,0 +1,34 @@
+import os
+import tempfile
+
+import pytest
+
+from sustainer.lib import HardwareStatSustainer
+
+
+# profiles, learned limits and events stay out of the host paths
+@pytest.fixture
+def sustainer_directory(monkeypatch):
+    ret = tempfile.mkdtemp()
+    for name, file_name in [
+        ("SUSTAINER_PROFILES", "profiles.json"),
+        ("SUSTAINER_PROFILE_FILE", "profile"),
+        ("SUSTAINER_LEARNED_LIMITS", "learned_limits.json"),
+    ]:
+        monkeypatch.setenv(name, os.path.join(ret, file_name))
+    return ret
+
+
+# without backends of its own, tests add their fake sustainers to it
+@pytest.fixture
+def create_hardware_sustainer(sustainer_directory):
+    def create():
+        ret = HardwareStatSustainer(
+            cpu=False,
+            gpu=False,
+            journal_path=os.path.join(sustainer_directory, "journal.json"),
+            event_log_path=os.path.join(sustainer_directory, "events.jsonl"),
+        )
+        return ret
+
+    return create
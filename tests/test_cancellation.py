@@ -0,0 +1,89 @@
+import time
+
+from sustainer.base import AbstractStatSustainer
+from sustainer.cpu import CPUBaseStatSustainer
+
+TICK_TIME = 0.2
+
+
+class FakeCPUStatSustainer(CPUBaseStatSustainer):
+    def __init__(self, fail: bool = False):
+        super().__init__(target_temp=65, skip_root_check=True)
+        self.fail = fail
+        self.max_freq = 3000000
+        self.restored = False
+
+    def main(self):
+        try:
+            while not self.is_stopped():
+                if self.fail:
+                    raise FileNotFoundError("cpufreq-set")
+                self.max_freq -= 100000
+                self.mark_tick()
+                self.sleep(60)
+        finally:
+            self.max_freq = 3000000
+            self.restored = True
+
+
+# device 0 takes its limit, device 1 refuses it
+class FakeGPUStatSustainer(AbstractStatSustainer):
+    device_kind = "nvidia"
+    run_forever = True
+
+    def __init__(self):
+        super().__init__(target_temp=65, skip_root_check=True)
+        self.limits = {0: 300, 1: 300}
+
+    def get_device_indices(self):
+        return [0, 1]
+
+    def verify_stats(self, device_id: int) -> bool:
+        return self.limits[device_id] == 200
+
+    def set_stats(self, device_id: int):
+        self.capture_original_settings(device_id)
+        if device_id == 0:
+            self.limits[device_id] = 200
+
+    def capture_device_settings(self, device_id: int):
+        return {"limit": self.limits[device_id]}
+
+    def apply_device_settings(self, device_id: int, settings):
+        self.limits[device_id] = settings["limit"]
+
+
+def test(create_hardware_sustainer):
+    sustainer = FakeCPUStatSustainer()
+    started = time.monotonic()
+    assert sustainer.test()
+    # stopped in the middle of a long sleep, with the cleanup already done
+    assert time.monotonic() - started < TICK_TIME
+    assert sustainer.restored and sustainer.max_freq == 3000000
+    # the instance can run again after its test
+    assert not sustainer.is_stopped()
+
+    failing_sustainer = FakeCPUStatSustainer(fail=True)
+    started = time.monotonic()
+    assert not failing_sustainer.test()
+    assert time.monotonic() - started < TICK_TIME
+    assert failing_sustainer.restored
+
+    # shutdown stops every loop, waiting for their cleanup
+    hardware_sustainer = create_hardware_sustainer()
+    hardware_sustainer.sustainers.append(sustainer)
+    sustainer.restored = False
+    hardware_sustainer.start_sustainer_threads()
+    assert sustainer.tick_event.wait(TICK_TIME)
+    started = time.monotonic()
+    assert hardware_sustainer.stop_sustainer_threads() == []
+    assert time.monotonic() - started < TICK_TIME
+    assert sustainer.restored and sustainer.max_freq == 3000000
+
+
+# a failed test leaves no limits behind, the backend is not used afterwards
+def test_failed_probe():
+    sustainer = FakeGPUStatSustainer()
+    assert not sustainer.test()
+    assert sustainer.limits == {0: 300, 1: 300}
+    assert sustainer.original_settings == {}
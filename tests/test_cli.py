@@ -0,0 +1,40 @@
+import subprocess
+import sys
+
+from sustainer.backends import ALL_BACKENDS, load_backend
+from sustainer.cli import parse_args
+
+HEAVY_MODULES = ["pynvml", "xmltodict", "func_timeout", "asyncio"]
+
+
+def check_lazy_imports():
+    code = "import sys, sustainer.cli; print(' '.join(sorted(sys.modules)))"
+    output = subprocess.check_output([sys.executable, "-c", code], encoding="utf-8")
+    loaded = output.split()
+    for it in HEAVY_MODULES:
+        assert it not in loaded, f"'{it}' imported by sustainer.cli"
+
+
+def check_backend_registry():
+    for spec in ALL_BACKENDS:
+        sustainer_class = load_backend(spec)
+        assert sustainer_class.device_kind == spec.device_kind
+        assert list(sustainer_class.required_binaries) == list(spec.required_binaries)
+
+
+# given before or after the command name, the socket path is kept
+def check_socket_argument():
+    assert parse_args(["-s", "/tmp/a.sock", "status"]).socket == "/tmp/a.sock"
+    assert parse_args(["status", "-s", "/tmp/a.sock"]).socket == "/tmp/a.sock"
+    assert parse_args(["energy"]).socket is None
+    assert parse_args(["-d", "-s", "/tmp/a.sock"]).socket == "/tmp/a.sock"
+
+
+def test():
+    check_lazy_imports()
+    check_backend_registry()
+    check_socket_argument()
+
+
+if __name__ == "__main__":
+    test()
@@ -0,0 +1,119 @@
+import os
+import tempfile
+
+from sustainer.backends import CPU_BACKENDS
+from sustainer.base import get_cpu_control_mode_config
+from sustainer.cpu import CPURAPLStatSustainer
+from sustainer.scope import DeviceScope
+
+FAKE_ZONES = {
+    "intel-rapl:0": {"name": "package-0", "energy_uj": "262143000000"},
+    "intel-rapl:0:0": {"name": "core", "energy_uj": "1000000"},
+    "intel-rapl:1": {"name": "package-1", "energy_uj": "1000000"},
+}
+
+
+def create_fake_powercap_tree():
+    powercap_root = tempfile.mkdtemp()
+    os.makedirs(os.path.join(powercap_root, "intel-rapl"))
+    for zone, attributes in FAKE_ZONES.items():
+        os.makedirs(os.path.join(powercap_root, zone))
+        attributes = {
+            "enabled": "0",
+            "max_energy_range_uj": "262143328850",
+            "constraint_0_power_limit_uw": "100000000",
+            "constraint_0_max_power_uw": "150000000",
+            **attributes,
+        }
+        for name, value in attributes.items():
+            with open(os.path.join(powercap_root, zone, name), "w") as f:
+                f.write(value + "\n")
+    return powercap_root
+
+
+# cpu0 and cpu1 on package 0, cpu2 and cpu3 on package 1
+def create_fake_cpu_topology():
+    cpu_sysfs_root = tempfile.mkdtemp()
+    for cpu in range(4):
+        topology_path = os.path.join(cpu_sysfs_root, f"cpu{cpu}", "topology")
+        os.makedirs(topology_path)
+        with open(os.path.join(topology_path, "physical_package_id"), "w") as f:
+            f.write(f"{cpu // 2}\n")
+    return cpu_sysfs_root
+
+
+class FakeTemperatureRAPLStatSustainer(CPURAPLStatSustainer):
+    temperature = 90
+
+    def get_cpu_temperature(self):
+        return self.temperature * 1000
+
+
+def test():
+    sustainer = FakeTemperatureRAPLStatSustainer(
+        skip_root_check=True, powercap_root=create_fake_powercap_tree()
+    )
+    sustainer.target_temp = 65
+    assert sustainer.get_device_indices() == [0, 1]
+    status = sustainer.read_status()
+    assert status["cpu:1"]["zone"] == "package-1"
+    assert status["cpu:1"]["power_limit"] == 100
+
+    # too hot, the limit goes down by the gain for each degree above the target
+    sustainer.mainloop()
+    assert sustainer.get_power_limit(0) == 50000000
+    assert sustainer.read_zone_attribute(0, "enabled") == "1"
+    assert sustainer.device_states[0]["power_limit"] == 50
+    for _ in range(10):
+        sustainer.mainloop()
+    assert sustainer.get_power_limit(1) == 25000000
+
+    # cooled down, the limit holds for the minimum dwell time after coming down
+    sustainer.temperature = 40
+    sustainer.mainloop()
+    assert sustainer.get_power_limit(0) == 25000000
+
+    # then recovers, but never above the original one
+    sustainer.limit_policy.min_dwell_time = 0
+    for _ in range(3):
+        sustainer.mainloop()
+    assert sustainer.get_power_limit(0) == 100000000
+
+    # joules per tick, across a wraparound of the counter on zone 0
+    sustainer.write_zone_attribute(0, "energy_uj", 30000000)
+    sustainer.write_zone_attribute(1, "energy_uj", 31000000)
+    sustainer.mainloop()
+    assert round(sustainer.device_states[0]["tick_energy"], 3) == 30.329
+    assert sustainer.device_states[1]["tick_energy"] == 30
+    assert sustainer.device_states[1]["power_draw"] > 0
+
+    sustainer.set_to_normal()
+    assert sustainer.read_zone_attribute(0, "enabled") == "0"
+    assert sustainer.original_settings == {}
+
+
+def test_scope():
+    sustainer = FakeTemperatureRAPLStatSustainer(
+        skip_root_check=True, powercap_root=create_fake_powercap_tree()
+    )
+    sustainer.cpu_sysfs_root = create_fake_cpu_topology()
+    # pinned to cpu3, only the zone of package 1 is capped
+    sustainer.scope = DeviceScope(cpus={3})
+    assert sustainer.get_device_indices() == [1]
+    sustainer.target_temp = 65
+    sustainer.mainloop()
+    assert sustainer.get_power_limit(0) == 100000000
+    assert sustainer.get_power_limit(1) == 50000000
+
+
+def test_config(monkeypatch):
+    # powercap zones alone do not switch the cpu over to package power caps
+    monkeypatch.delenv("CPU_CONTROL_MODE", raising=False)
+    assert get_cpu_control_mode_config() == "freq"
+    assert "CPURAPLStatSustainer" not in [it.class_name for it in CPU_BACKENDS]
+    monkeypatch.setenv("CPU_CONTROL_MODE", "RAPL")
+    assert get_cpu_control_mode_config() == "rapl"
+
+
+if __name__ == "__main__":
+    test()
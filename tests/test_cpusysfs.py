@@ -0,0 +1,76 @@
+import os
+import tempfile
+
+from sustainer.backends import get_backend_spec, get_missing_requirements
+from sustainer.cpu import CPUSysfsStatSustainer
+from sustainer.scope import DeviceScope
+
+FAKE_POLICIES = {
+    "policy0": {"affected_cpus": "0 1 2 3", "cpuinfo_max_freq": "3000000"},
+    "policy4": {"affected_cpus": "4 5 6 7", "cpuinfo_max_freq": "2000000"},
+}
+
+
+def create_fake_cpufreq_tree():
+    sysfs_root = tempfile.mkdtemp()
+    for policy, attributes in FAKE_POLICIES.items():
+        os.makedirs(os.path.join(sysfs_root, policy))
+        attributes = {
+            "cpuinfo_min_freq": "800000",
+            "scaling_max_freq": attributes["cpuinfo_max_freq"],
+            "scaling_governor": "schedutil",
+            "scaling_available_governors": "performance powersave schedutil",
+            **attributes,
+        }
+        for name, value in attributes.items():
+            with open(os.path.join(sysfs_root, policy, name), "w") as f:
+                f.write(value + "\n")
+    return sysfs_root
+
+
+def test():
+    sustainer = CPUSysfsStatSustainer(
+        skip_root_check=True, sysfs_root=create_fake_cpufreq_tree()
+    )
+    assert sustainer.get_policies() == ["policy0", "policy4"]
+    assert sustainer.getMinMaxFrequencies(0) == (800000, 3000000, "schedutil")
+    assert "powersave" in sustainer.getCovernors(0)
+
+    original_settings = sustainer.capture_device_settings(0)
+    sustainer.setGovernor(0, "powersave")
+    sustainer.setMaxFreq(2500000, 0, list(range(8)))
+    assert sustainer.read_policy_attribute("policy0", "scaling_max_freq") == "2500000"
+    # clamped to the hardware limit of the policy
+    assert sustainer.read_policy_attribute("policy4", "scaling_max_freq") == "2000000"
+    assert sustainer.read_policy_attribute("policy4", "scaling_governor") == "powersave"
+    assert sustainer.get_policy_max_freq() == 2500000
+
+    sustainer.apply_device_settings(0, original_settings)
+    assert sustainer.read_policy_attribute("policy0", "scaling_max_freq") == "3000000"
+    assert sustainer.read_policy_attribute("policy0", "scaling_governor") == "schedutil"
+
+
+def test_scope():
+    sustainer = CPUSysfsStatSustainer(
+        skip_root_check=True, sysfs_root=create_fake_cpufreq_tree()
+    )
+    # a container pinned to cores 5 and 6 only touches the policy covering them
+    sustainer.scope = DeviceScope(cpus={5, 6})
+    assert sustainer.get_policies() == ["policy4"]
+    sustainer.setMaxFreq(1500000, 0, [5, 6])
+    assert sustainer.read_policy_attribute("policy4", "scaling_max_freq") == "1500000"
+    assert sustainer.read_policy_attribute("policy0", "scaling_max_freq") == "3000000"
+
+
+def test_probe(monkeypatch):
+    spec = get_backend_spec("CPUSysfsStatSustainer")
+    # probed below the configured root, not the default one
+    monkeypatch.setenv("CPUFREQ_SYSFS_ROOT", create_fake_cpufreq_tree())
+    assert get_missing_requirements(spec) == []
+    empty_root = tempfile.mkdtemp()
+    monkeypatch.setenv("CPUFREQ_SYSFS_ROOT", empty_root)
+    assert get_missing_requirements(spec) == [os.path.join(empty_root, "policy0")]
+
+
+if __name__ == "__main__":
+    test()
@@ -0,0 +1,90 @@
+import os
+import socket
+import tempfile
+import threading
+import time
+
+from sustainer.daemon import SustainerControlServer, send_control_request
+from sustainer.lib import CPUBaseStatSustainer
+
+
+class FakeCPUStatSustainer(CPUBaseStatSustainer):
+    def __init__(self):
+        super().__init__(target_temp=65, skip_root_check=True)
+        self.released = []
+
+    def main(self):
+        ...
+
+    def release_device(self, device_id: int):
+        self.released.append(device_id)
+        self.update_device_state(device_id, max_freq=3000000)
+
+
+def test(sustainer_directory, create_hardware_sustainer):
+    sustainer = FakeCPUStatSustainer()
+    sustainer.update_device_state(0, temperature=70.0, max_freq=2000000)
+    socket_path = os.path.join(sustainer_directory, "sustainer.sock")
+    hardware_sustainer = create_hardware_sustainer()
+    hardware_sustainer.sustainers.append(sustainer)
+    server = SustainerControlServer(hardware_sustainer, socket_path)
+    threading.Thread(target=server.run, daemon=True).start()
+    for _ in range(100):
+        if os.path.exists(socket_path):
+            break
+        time.sleep(0.05)
+
+    def request(**kwargs):
+        return send_control_request(kwargs, socket_path=socket_path)
+
+    status = request(command="status")
+    assert status["ok"]
+    assert status["devices"]["cpu:0"]["temperature"] == 70.0
+    assert status["devices"]["cpu:0"]["target_temp"] == 65
+
+    assert request(command="set_target", device="cpu:0", target_temp=60)["ok"]
+    assert sustainer.get_target_temp(0) == 60
+
+    assert request(command="pause", device="cpu:0")["ok"]
+    assert request(command="status")["devices"]["cpu:0"]["paused"]
+    assert request(command="resume", device="cpu:0")["ok"]
+    assert not sustainer.is_device_paused(0)
+
+    assert request(command="release", device="cpu:0")["ok"]
+    assert sustainer.released == [0]
+    assert sustainer.is_device_paused(0)
+    assert request(command="status")["devices"]["cpu:0"]["max_freq"] == 3000000
+
+    hardware_sustainer.energy_accounting.add_power_sample("cpu:0", 40, 0)
+    hardware_sustainer.energy_accounting.add_power_sample("cpu:0", 40, 60)
+    energy = request(command="energy")
+    assert energy["ok"]
+    assert energy["devices"]["cpu:0"]["average_power"] == 40
+
+    footprint = request(command="footprint")["footprint"]
+    assert footprint["threads"] > 1 and footprint["rss_mb"] > 0
+
+    assert request(command="status")["profile"] is None
+    assert not request(command="set_profile", profile="missing")["ok"]
+    assert request(command="set_profile", profile=None)["ok"]
+
+    assert not request(command="pause", device="nvidia:0")["ok"]
+    assert not request(command="unknown")["ok"]
+
+
+def test_stale_socket():
+    socket_path = os.path.join(tempfile.mkdtemp(), "sustainer.sock")
+    server = SustainerControlServer(None, socket_path)
+    # a daemon still answering keeps its socket
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as listener:
+        listener.bind(socket_path)
+        listener.listen()
+        try:
+            server.remove_stale_socket()
+            raise Exception("[-] Took over the socket of a running daemon")
+        except RuntimeError:
+            pass
+    # left behind once nothing listens
+    assert os.path.exists(socket_path)
+    server.remove_stale_socket()
+    assert not os.path.exists(socket_path)
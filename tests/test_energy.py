@@ -0,0 +1,56 @@
+from sustainer.energy import EnergyAccounting
+from sustainer.lib import CPUBaseStatSustainer
+
+
+class FakePowerStatSustainer(CPUBaseStatSustainer):
+    def __init__(self):
+        super().__init__(skip_root_check=True)
+        self.power_draw = {0: 50.0, 1: 150.0}
+
+    def main(self):
+        ...
+
+    def read_power_draw(self):
+        return self.power_draw
+
+
+class FakeUnmeteredStatSustainer(FakePowerStatSustainer):
+    device_kind = "amd"
+
+    def read_power_draw(self):
+        return super(FakePowerStatSustainer, self).read_power_draw()
+
+
+def test(create_hardware_sustainer):
+    accounting = EnergyAccounting()
+    start = 7200 * 1000
+    # 100 W for two hours, sampled every 10 seconds
+    for second in range(0, 7201, 10):
+        accounting.add_power_sample("nvidia:0", 100, start + second)
+    report = accounting.get_report()["nvidia:0"]
+    assert round(report["energy_kwh"], 6) == 0.2
+    assert round(report["average_power"], 6) == 100
+    assert [round(it["energy_kwh"], 6) for it in report["hours"]] == [0.1, 0.1]
+
+    # ramps are integrated between samples, gaps from stalled backends are not
+    accounting.add_power_sample("nvidia:1", 0, start)
+    accounting.add_power_sample("nvidia:1", 200, start + 10)
+    accounting.add_power_sample("nvidia:1", 200, start + 100)
+    metrics = accounting.get_device_metrics("nvidia:1")
+    assert metrics["energy_kwh"] == 1000 / 3.6e6
+    assert metrics["hour_average_power"] == 100
+
+    hardware_sustainer = create_hardware_sustainer()
+    sustainer = FakePowerStatSustainer()
+    unmetered_sustainer = FakeUnmeteredStatSustainer()
+    hardware_sustainer.sustainers.extend([sustainer, unmetered_sustainer])
+    for _ in range(3):
+        hardware_sustainer.sample_power_draw()
+    assert hardware_sustainer.power_draw_unsupported == [unmetered_sustainer]
+    snapshot = hardware_sustainer.get_status_snapshot()
+    assert snapshot["cpu:1"]["power_draw"] == 150
+    assert snapshot["cpu:1"]["energy_kwh"] > 0
+    assert set(hardware_sustainer.energy_accounting.get_report()) == {
+        "cpu:0",
+        "cpu:1",
+    }
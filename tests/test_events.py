@@ -0,0 +1,69 @@
+import json
+import os
+import tempfile
+
+from sustainer.cpu import CPUBaseStatSustainer
+from sustainer.events import EventLog
+
+
+class FakeCPUStatSustainer(CPUBaseStatSustainer):
+    def __init__(self):
+        super().__init__(target_temp=65, skip_root_check=True)
+
+    def main(self):
+        ...
+
+
+def read_events(path: str):
+    with open(path, "r") as f:
+        ret = [json.loads(it) for it in f]
+    return ret
+
+
+def test():
+    event_log_path = os.path.join(tempfile.mkdtemp(), "events.jsonl")
+    event_log = EventLog(event_log_path, max_bytes=2000, backup_count=2)
+    sustainer = FakeCPUStatSustainer()
+    sustainer.event_log = event_log
+
+    # steady ticks log nothing, only the changes do
+    for temperature in [60, 61, 70, 71, 70, 60]:
+        sustainer.update_device_state(0, temperature=temperature, max_freq=2000000)
+    sustainer.update_device_state(0, temperature=60, max_freq=1700000)
+    for _ in range(3):
+        sustainer.report_backend_error(FileNotFoundError("cpufreq-set"))
+    sustainer.report_backend_recovered()
+    event_log.flush()
+    events = read_events(event_log_path)
+    assert [it["event"] for it in events] == [
+        "limit_changed",
+        "threshold_crossed",
+        "threshold_crossed",
+        "limit_changed",
+        "backend_error",
+        "backend_recovered",
+    ]
+    assert events[1]["level"] == "WARNING" and events[1]["temperature"] == 70
+    assert events[3]["device"] == "cpu:0"
+    assert events[3]["previous"] == {"max_freq": 2000000}
+    assert events[4]["error"] == "FileNotFoundError: cpufreq-set"
+
+    # levels are set per sustainer
+    sustainer.event_level = "WARNING"
+    sustainer.update_device_state(0, max_freq=1400000)
+    sustainer.update_device_state(0, temperature=80)
+    event_log.flush()
+    events = read_events(event_log_path)
+    assert events[-1]["event"] == "threshold_crossed"
+    assert not any(it.get("max_freq") == 1400000 for it in events)
+
+    for index in range(50):
+        sustainer.emit_event("backend_error", "ERROR", error=str(index))
+    event_log.flush()
+    assert os.path.exists(event_log_path + ".2")
+    assert not os.path.exists(event_log_path + ".3")
+    assert os.path.getsize(event_log_path) <= 2000
+
+
+if __name__ == "__main__":
+    test()
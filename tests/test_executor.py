@@ -0,0 +1,134 @@
+import os
+import subprocess
+import tempfile
+import threading
+import time
+
+from sustainer.base import AbstractStatSustainer
+from sustainer.executor import FailureBackoff, ToolExecutor
+
+FAKE_BINARIES = {
+    # a wrapper script whose child would keep the pipes open after a plain kill
+    "slow-tool": "#!/bin/sh\nsleep 30\necho done\n",
+    "busy-tool": "#!/bin/sh\nsleep 0.3\necho busy\n",
+    "failing-tool": "#!/bin/sh\necho broken >&2\nexit 3\n",
+}
+
+
+def create_fake_binaries():
+    bin_dir = tempfile.mkdtemp()
+    for name, script in FAKE_BINARIES.items():
+        path = os.path.join(bin_dir, name)
+        with open(path, "w") as f:
+            f.write(script)
+        os.chmod(path, 0o755)
+    return bin_dir
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeGPUStatSustainer(AbstractStatSustainer):
+    device_kind = "nvidia"
+    run_forever = True
+
+    def __init__(self, bin_dir: str):
+        super().__init__(target_temp=65, skip_root_check=True)
+        self.bin_dir = bin_dir
+        self.executor = ToolExecutor(timeout=0.5)
+        self.sustained = []
+
+    def get_device_indices(self):
+        return [0, 1]
+
+    def verify_stats(self, device_id: int):
+        tool = "failing-tool" if device_id == 1 else "busy-tool"
+        self.executor.check_output([os.path.join(self.bin_dir, tool)])
+        self.sustained.append(device_id)
+        return True
+
+    def set_stats(self, device_id: int):
+        ...
+
+
+def check_executor(bin_dir: str):
+    executor = ToolExecutor(timeout=0.5, concurrency=2)
+    started = time.monotonic()
+    try:
+        executor.run([os.path.join(bin_dir, "slow-tool")])
+        assert False, "slow-tool should time out"
+    except subprocess.TimeoutExpired:
+        pass
+    assert time.monotonic() - started < 2
+
+    try:
+        executor.check_output([os.path.join(bin_dir, "failing-tool")])
+        assert False, "failing-tool should fail"
+    except subprocess.CalledProcessError as e:
+        assert e.returncode == 3 and e.stderr == "broken\n"
+
+    # four calls of 0.3 seconds, two at a time
+    threads = [
+        threading.Thread(
+            target=executor.check_output, args=([os.path.join(bin_dir, "busy-tool")],)
+        )
+        for _ in range(4)
+    ]
+    started = time.monotonic()
+    for it in threads:
+        it.start()
+    for it in threads:
+        it.join()
+    assert 0.6 <= time.monotonic() - started < 1.2
+
+
+def check_backoff():
+    clock = FakeClock()
+    backoff = FailureBackoff(
+        base_delay=1,
+        max_delay=8,
+        circuit_threshold=6,
+        circuit_reset_time=300,
+        clock=clock,
+    )
+    delays = [backoff.record_failure("nvidia:0") for _ in range(5)]
+    for failures, delay in enumerate(delays):
+        # jittered within the upper half of the exponential delay
+        assert min(8, 2**failures) / 2 <= delay <= min(8, 2**failures)
+    assert not backoff.is_allowed("nvidia:0")
+    assert backoff.is_allowed("nvidia:1")
+    assert backoff.record_failure("nvidia:0") == 300
+    assert backoff.is_circuit_open("nvidia:0")
+    clock.now = 299
+    assert not backoff.is_allowed("nvidia:0")
+    clock.now = 300
+    assert backoff.is_allowed("nvidia:0")
+    assert backoff.record_success("nvidia:0") == 6
+    assert not backoff.is_circuit_open("nvidia:0")
+
+
+def check_device_backoff(bin_dir: str):
+    sustainer = FakeGPUStatSustainer(bin_dir)
+    # the failing device does not keep the other one from being sustained
+    assert not sustainer.test()
+    sustainer.mainloop()
+    sustainer.mainloop()
+    assert sustainer.sustained == [0, 0, 0]
+    assert sustainer.backoff.get_failures(1) == 1
+    assert not sustainer.backoff.is_allowed(1)
+
+
+def test():
+    bin_dir = create_fake_binaries()
+    check_executor(bin_dir)
+    check_backoff()
+    check_device_backoff(bin_dir)
+
+
+if __name__ == "__main__":
+    test()
@@ -0,0 +1,113 @@
+from sustainer.base import get_fan_curve_config
+from sustainer.fan import DEFAULT_FAN_CURVE, FanCurve
+from sustainer.rocm import ROCMSMIGPUStatSustainer
+
+
+class FakeROCMSMIGPUStatSustainer(ROCMSMIGPUStatSustainer):
+    required_binaries = []
+
+    def __init__(self):
+        super().__init__(skip_root_check=True)
+        self.temperature = 70.0
+        self.sclk_level = 7
+        self.perf_level = "auto"
+        self.perf_level_writes = 0
+        self.fan_percent = None
+
+    def get_device_indices(self):
+        return [0]
+
+    def get_gpu_temperature(self, device_id: int):
+        return self.temperature
+
+    def get_gpu_current_sclk_level(self, device_id: int):
+        return self.sclk_level
+
+    def get_gpu_sclk_min_max_levels(self, device_id: int):
+        return 0, 7
+
+    def get_gpu_perf_level(self, device_id: int):
+        return self.perf_level
+
+    def set_gpu_perf_level(self, device_id: int, perf_level: str):
+        self.perf_level = perf_level
+
+    def set_gpu_as_manual_perf_level(self, device_id: int):
+        self.perf_level = "manual"
+        self.perf_level_writes += 1
+
+    def set_gpu_sclk_level(self, device_id: int, sclk_level: int):
+        self.sclk_level = sclk_level
+
+    def set_gpu_fan_percent(self, device_id: int, fan_percent: int):
+        self.fan_percent = fan_percent
+
+    def reset_fans(self, device_id: int):
+        self.fan_percent = None
+
+
+def test_curve():
+    curve = FanCurve.parse(DEFAULT_FAN_CURVE)
+    assert curve.get_fan_percent(40, 65) == 30
+    assert curve.get_fan_percent(57, 65) == 60
+    assert curve.get_fan_percent(60, 65) == 75
+    assert curve.get_fan_percent(65, 65) == 100
+    assert curve.get_fan_percent(90, 65) == 100
+    assert not curve.is_saturated(85)
+    assert curve.is_saturated(100)
+
+
+def test_config(monkeypatch):
+    monkeypatch.delenv("FAN_CONTROL", raising=False)
+    assert get_fan_curve_config() is None
+    monkeypatch.setenv("FAN_CONTROL", "1")
+    monkeypatch.setenv("FAN_CURVE", "-10:40,0:80")
+    curve = get_fan_curve_config()
+    assert curve.points == [(-10.0, 40), (0.0, 80)]
+    assert curve.max_percent == 80
+
+
+def test_fan_first():
+    sustainer = FakeROCMSMIGPUStatSustainer()
+    sustainer.target_temp = 75
+    sustainer.fan_curve = FanCurve.parse("-10:40,5:100")
+
+    # above target but the fans have headroom, clocks are left alone
+    sustainer.temperature = 77.0
+    sustainer.mainloop()
+    assert sustainer.fan_percent == 88
+    assert sustainer.sclk_level == 7
+    assert sustainer.device_states[0]["fan_percent"] == 88
+
+    # fans saturated, only now the clock comes down
+    sustainer.temperature = 81.0
+    sustainer.mainloop()
+    assert sustainer.fan_percent == 100
+    assert sustainer.sclk_level == 6
+
+    # released, fans are back in automatic mode
+    sustainer.release_device(0)
+    assert sustainer.fan_percent is None
+    assert sustainer.perf_level == "auto"
+    assert "fan_percent" not in sustainer.device_states[0]
+
+
+def test_without_fan_control():
+    sustainer = FakeROCMSMIGPUStatSustainer()
+    sustainer.target_temp = 75
+    sustainer.fan_curve = None
+    sustainer.temperature = 76.0
+    sustainer.mainloop()
+    assert sustainer.fan_percent is None
+    assert sustainer.sclk_level == 6
+
+    # at steady state the perf level is not written again
+    sustainer.temperature = 74.0
+    for _ in range(3):
+        sustainer.mainloop()
+    assert sustainer.perf_level_writes == 1
+    # until a restore put it back
+    sustainer.release_device(0)
+    sustainer.resume_device(0)
+    sustainer.mainloop()
+    assert sustainer.perf_level_writes == 2
@@ -0,0 +1,87 @@
+import asyncio
+import socket
+import subprocess
+import sys
+import time
+
+from sustainer.fleet import FleetAggregator, send_fleet_request
+
+NODE_SCRIPT = """
+import sys
+from sustainer.fleet import FleetTelemetryClient
+
+address, node_name, base_temp = sys.argv[1], sys.argv[2], float(sys.argv[3])
+client = FleetTelemetryClient(address, node_name=node_name)
+for tick in range(3):
+    client.push(
+        {
+            "cpu:0": {"temperature": base_temp - 10, "max_freq": 2000000},
+            "nvidia:0": {"temperature": base_temp + tick, "power_limit": 100},
+            "nvidia:1": {"temperature": base_temp - 5, "power_limit": 100},
+        }
+    )
+"""
+
+
+def get_free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_aggregator(address: str):
+    for _ in range(100):
+        try:
+            return send_fleet_request({"command": "nodes"}, address)
+        except OSError:
+            time.sleep(0.05)
+    raise Exception("[-] Aggregator did not start")
+
+
+def test():
+    address = f"127.0.0.1:{get_free_port()}"
+    aggregator = subprocess.Popen(
+        [sys.executable, "-m", "sustainer.fleet", "--listen", address]
+    )
+    try:
+        wait_for_aggregator(address)
+        nodes = [
+            subprocess.Popen(
+                [sys.executable, "-c", NODE_SCRIPT, address, f"node{i}", str(60 + i)]
+            )
+            for i in range(4)
+        ]
+        for it in nodes:
+            assert it.wait(timeout=30) == 0
+        response = send_fleet_request({"command": "nodes"}, address)
+        assert sorted(response["nodes"]) == ["node0", "node1", "node2", "node3"]
+        top = send_fleet_request({"command": "top", "count": 2}, address)["devices"]
+        assert [(it["node"], it["device"]) for it in top] == [
+            ("node3", "nvidia:0"),
+            ("node2", "nvidia:0"),
+        ]
+        assert top[0]["temperature"] == 65
+        assert top[0]["power_limit"] == 100
+    finally:
+        aggregator.terminate()
+        aggregator.wait(timeout=10)
+
+
+def test_token(monkeypatch):
+    # every interface, only with a shared token
+    monkeypatch.delenv("SUSTAINER_FLEET_TOKEN", raising=False)
+    try:
+        FleetAggregator("0.0.0.0:9400", token=None)
+        raise Exception("[-] Listening on every interface without a token")
+    except AssertionError:
+        pass
+    aggregator = FleetAggregator("0.0.0.0:9400", token="secret")
+    push = {"command": "push", "node": "node0", "devices": {"cpu:0": {}}}
+    assert not asyncio.run(aggregator.dispatch(push))["ok"]
+    assert not asyncio.run(aggregator.dispatch({**push, "token": "guess"}))["ok"]
+    assert asyncio.run(aggregator.dispatch({**push, "token": "secret"}))["ok"]
+    assert list(aggregator.nodes) == ["node0"]
+
+
+if __name__ == "__main__":
+    test()
@@ -0,0 +1,28 @@
+from sustainer.footprint import FootprintMonitor
+
+
+def test():
+    now = [0.0]
+    monitor = FootprintMonitor(clock=lambda: now[0])
+    assert monitor.get_top_allocations() == []
+    monitor.start_tracing()
+    try:
+        leak = [str(it) * 10 for it in range(10000)]
+        now[0] = 1800.0
+        footprint = monitor.sample(ticks=100)
+        top_allocations = monitor.get_top_allocations(3)
+    finally:
+        monitor.stop_tracing()
+    assert footprint["uptime_hours"] == 0.5
+    assert footprint["rss_mb"] > 0
+    assert footprint["threads"] >= 1
+    assert footprint["traced_mb"] > 0.5
+    assert "python_cpu_ms_tick" in footprint
+    # the list above is the largest growth since tracing started
+    assert top_allocations[0]["location"].startswith(__file__)
+    assert top_allocations[0]["size_diff_kb"] > 500
+    assert len(leak) == 10000
+
+
+if __name__ == "__main__":
+    test()
@@ -0,0 +1,82 @@
+import os
+import tempfile
+import time
+
+from sustainer.cpu import CPUBaseStatSustainer, CPUSysfsStatSustainer
+from sustainer.journal import StateJournal
+
+RESTORE_DELAY = 0.5
+
+
+def create_fake_cpufreq_tree():
+    sysfs_root = tempfile.mkdtemp()
+    os.makedirs(os.path.join(sysfs_root, "policy0"))
+    attributes = {
+        "affected_cpus": "0 1",
+        "cpuinfo_min_freq": "800000",
+        "cpuinfo_max_freq": "3000000",
+        "scaling_max_freq": "3000000",
+        "scaling_governor": "schedutil",
+    }
+    for name, value in attributes.items():
+        with open(os.path.join(sysfs_root, "policy0", name), "w") as f:
+            f.write(value + "\n")
+    return sysfs_root
+
+
+class FakeCPUStatSustainer(CPUBaseStatSustainer):
+    def __init__(self):
+        super().__init__(target_temp=65, skip_root_check=True)
+        self.max_freqs = {0: 3000000, 1: 3000000}
+
+    def main(self):
+        ...
+
+    def set_max_freq(self, device_id: int, max_freq: int):
+        self.capture_original_settings(device_id)
+        self.max_freqs[device_id] = max_freq
+
+    def capture_device_settings(self, device_id: int):
+        return {"max_freq": self.max_freqs[device_id]}
+
+    def apply_device_settings(self, device_id: int, settings):
+        time.sleep(RESTORE_DELAY)
+        self.max_freqs[device_id] = settings["max_freq"]
+
+
+def test(monkeypatch, sustainer_directory, create_hardware_sustainer):
+    sysfs_root = create_fake_cpufreq_tree()
+    monkeypatch.setenv("CPUFREQ_SYSFS_ROOT", sysfs_root)
+    journal_path = os.path.join(sustainer_directory, "journal.json")
+    sustainer = CPUSysfsStatSustainer(skip_root_check=True)
+    sustainer.journal = StateJournal(journal_path)
+    sustainer.capture_original_settings(0)
+    sustainer.setMaxFreq(2000000, 0, [0, 1])
+    assert os.path.exists(journal_path)
+
+    # the process dies here, the next run finds the journal and restores it
+    create_hardware_sustainer()
+    assert sustainer.get_policy_max_freq() == 3000000
+    assert not os.path.exists(journal_path)
+
+
+def test_parallel_restore(sustainer_directory, create_hardware_sustainer):
+    journal_path = os.path.join(sustainer_directory, "journal.json")
+    hardware_sustainer = create_hardware_sustainer()
+    sustainer = FakeCPUStatSustainer()
+    sustainer.journal = hardware_sustainer.journal
+    hardware_sustainer.sustainers.append(sustainer)
+    sustainer.set_max_freq(0, 2000000)
+    sustainer.set_max_freq(0, 1000000)
+    sustainer.set_max_freq(1, 1500000)
+    assert hardware_sustainer.journal.entries["cpu:0"]["settings"] == {
+        "max_freq": 3000000
+    }
+
+    # devices are restored side by side on shutdown
+    started = time.monotonic()
+    assert hardware_sustainer.restore_journaled_settings() == []
+    assert time.monotonic() - started < RESTORE_DELAY * 1.8
+    assert sustainer.max_freqs == {0: 3000000, 1: 3000000}
+    assert sustainer.is_device_paused(0) and sustainer.is_device_paused(1)
+    assert not os.path.exists(journal_path)
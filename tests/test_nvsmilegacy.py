@@ -0,0 +1,339 @@
+import math
+import re
+import subprocess
+
+from sustainer.nvsmi import (
+    NVIDIAClockLockGPUStatSustainer,
+    NVIDIALegacyGPUStatSustainer,
+    get_stepped_limits,
+)
+from sustainer.scope import DeviceScope
+
+GPU_XML = """<gpu id="{index}">
+<uuid>GPU-{index}a5e0c1d-0000-0000-0000-00000000000{index}</uuid>
+<persistence_mode>Enabled</persistence_mode>
+<temperature><gpu_temp>{temperature} C</gpu_temp></temperature>
+<max_clocks><graphics_clock>2000 MHz</graphics_clock></max_clocks>
+<clocks_throttle_reasons>
+<clocks_throttle_reason_hw_slowdown>{hw_slowdown}</clocks_throttle_reason_hw_slowdown>
+</clocks_throttle_reasons>
+<gpu_power_readings>
+<current_power_limit>{power_limit:.2f} W</current_power_limit>
+<default_power_limit>250.00 W</default_power_limit>
+<min_power_limit>100.00 W</min_power_limit>
+</gpu_power_readings>
+</gpu>"""
+
+
+# answers nvidia-smi queries from fake device state and records every call
+class FakeNVIDIASMIExecutor:
+    def __init__(self, temperatures):
+        self.temperatures = temperatures
+        self.power_limits = [250] * len(temperatures)
+        self.locked_clocks = [None] * len(temperatures)
+        self.hw_slowdown = [False] * len(temperatures)
+        self.calls = []
+
+    def check_output(self, cmdlist, timeout=None):
+        self.calls.append(cmdlist)
+        gpus = "".join(
+            GPU_XML.format(
+                index=index,
+                temperature=temperature,
+                power_limit=limit,
+                hw_slowdown="Active" if hw_slowdown else "Not Active",
+            )
+            for index, (temperature, limit, hw_slowdown) in enumerate(
+                zip(self.temperatures, self.power_limits, self.hw_slowdown)
+            )
+        )
+        ret = (
+            f"<nvidia_smi_log><attached_gpus>{len(self.temperatures)}</attached_gpus>"
+            f"{gpus}</nvidia_smi_log>"
+        )
+        return ret
+
+    def get_device_ids(self, cmdlist):
+        if "-i" not in cmdlist:
+            return list(range(len(self.temperatures)))
+        ret = [int(it) for it in cmdlist[cmdlist.index("-i") + 1].split(",")]
+        return ret
+
+    def run(self, cmdlist, timeout=None, check=True):
+        self.calls.append(cmdlist)
+        for device_id in self.get_device_ids(cmdlist):
+            if "-pl" in cmdlist:
+                self.power_limits[device_id] = int(cmdlist[cmdlist.index("-pl") + 1])
+            if "-lgc" in cmdlist:
+                self.locked_clocks[device_id] = cmdlist[cmdlist.index("-lgc") + 1]
+            if "-rgc" in cmdlist:
+                self.locked_clocks[device_id] = None
+        ret = subprocess.CompletedProcess(cmdlist, 0, "", "")
+        return ret
+
+
+class FakeNVIDIALegacyGPUStatSustainer(NVIDIALegacyGPUStatSustainer):
+    required_binaries = []
+
+
+class FakeNVIDIAClockLockGPUStatSustainer(NVIDIAClockLockGPUStatSustainer):
+    required_binaries = []
+
+
+# fans are left alone, so ticks only touch power limits or clocks
+def create_sustainer(executor, sustainer_class=FakeNVIDIALegacyGPUStatSustainer):
+    ret = sustainer_class(skip_root_check=True)
+    ret.executor = executor
+    ret.target_temp = 70
+    ret.fan_curve = None
+    return ret
+
+
+def test_stepped_limits():
+    raised, lowered = get_stepped_limits(
+        [240, 120, float("nan")], [100, 100, 100], [250, 250, 250], 0.2
+    )
+    assert raised[:2] == [250, 170]
+    assert lowered[:2] == [190, 100]
+
+
+def test():
+    executor = FakeNVIDIASMIExecutor([80, 60, 80, 60])
+    sustainer = create_sustainer(executor)
+
+    # one query for all GPUs, writes only where the limit moves, in one process
+    # for the GPUs sharing a value
+    sustainer.mainloop()
+    assert executor.calls[0] == ["nvidia-smi", "-x", "-q"]
+    writes = [it for it in executor.calls if "-pl" in it]
+    assert writes == [["nvidia-smi", "-i", "0,2", "-pl", "200"]]
+    assert sustainer.saved_processes == 1
+    assert sustainer.get_status_snapshot()["nvidia:1"]["saved_processes"] == 1
+    assert executor.power_limits == [200, 250, 200, 250]
+    assert sustainer.device_states[1]["power_limit"] == 250
+    # the original limits were captured right before the first writes
+    assert sustainer.original_settings[0] == {"power_limit": 250}
+    assert 1 not in sustainer.original_settings
+
+    for _ in range(5):
+        sustainer.mainloop()
+    assert executor.power_limits == [100, 250, 100, 250]
+    status = sustainer.get_status_snapshot()
+    assert status["nvidia:0"]["limit_changes_hour"] == 3
+    assert status["nvidia:1"]["limit_changes_hour"] == 0
+
+    executor.calls.clear()
+    sustainer.mainloop()
+    assert executor.calls == [["nvidia-smi", "-x", "-q"]]
+
+    # paused devices are still read but left alone
+    sustainer.pause_device(0)
+    executor.temperatures[0] = 40
+    executor.temperatures[2] = 40
+    sustainer.mainloop()
+    # the cooled down GPU waits for the minimum dwell time before going back up
+    assert executor.power_limits == [100, 250, 100, 250]
+    sustainer.limit_policy.min_dwell_time = 0
+    sustainer.mainloop()
+    assert executor.power_limits == [100, 250, 150, 250]
+    assert sustainer.device_states[0]["temperature"] == 40
+
+
+def test_scope():
+    executor = FakeNVIDIASMIExecutor([80, 80, 80, 80])
+    sustainer = create_sustainer(executor)
+    # visible by index and by uuid prefix, as CUDA_VISIBLE_DEVICES=0,GPU-3a5e
+    sustainer.scope = DeviceScope(visible_devices=["0", "GPU-3a5e"])
+    assert sustainer.get_device_indices() == [0, 3]
+    sustainer.mainloop()
+    assert executor.power_limits == [200, 250, 250, 200]
+    assert sorted(sustainer.device_states.keys()) == [0, 3]
+
+
+# GPU 1 reports no temperature and no power readings at all
+class MissingReadingsNVIDIASMIExecutor(FakeNVIDIASMIExecutor):
+    def check_output(self, cmdlist, timeout=None):
+        ret = super().check_output(cmdlist, timeout=timeout)
+        gpu = ret.index('<gpu id="1">')
+        end = ret.index("</gpu>", gpu)
+        ret = (
+            ret[:gpu]
+            + re.sub(
+                r"<temperature>.*?</temperature>|<gpu_power_readings>.*?</gpu_power_readings>",
+                "",
+                ret[gpu:end],
+                flags=re.DOTALL,
+            )
+            + ret[end:]
+        )
+        return ret
+
+
+def test_missing_readings():
+    executor = MissingReadingsNVIDIASMIExecutor([80, 80, 80])
+    sustainer = create_sustainer(executor)
+    # out of scope, GPU 1 is not read at all
+    sustainer.scope = DeviceScope(visible_devices=["0", "2"])
+    sustainer.mainloop()
+    assert executor.power_limits == [200, 250, 200]
+    assert not sustainer.backoff.failures
+
+    # in scope, only GPU 1 fails
+    sustainer.scope = DeviceScope()
+    sustainer.mainloop()
+    assert executor.power_limits == [150, 250, 150]
+    assert list(sustainer.backoff.failures.keys()) == [1]
+    assert math.isnan(sustainer.device_states[1]["temperature"])
+
+
+def test_clock_lock():
+    executor = FakeNVIDIASMIExecutor([80, 60])
+    sustainer = create_sustainer(executor, FakeNVIDIAClockLockGPUStatSustainer)
+    sustainer.limit_policy.min_dwell_time = 0
+
+    # the hot GPU gets its clock range locked a step below the maximum
+    sustainer.mainloop()
+    assert executor.locked_clocks == ["1000,1900", None]
+    assert executor.power_limits == [250, 250]
+    assert sustainer.device_states[0]["locked_clock"] == 1900
+    # unlocked GPUs may run up to their maximum clock
+    assert sustainer.device_states[1]["locked_clock"] == 2000
+    assert sustainer.original_settings[0] == {"locked_clock": None}
+
+    for _ in range(30):
+        sustainer.mainloop()
+    assert executor.locked_clocks[0] == "1000,1000"
+
+    executor.temperatures[0] = 60
+    sustainer.mainloop()
+    assert executor.locked_clocks[0] == "1000,1100"
+
+    # a profile starts GPU 1 at its learned clock right away
+    sustainer.set_initial_limit(1, 1500.0)
+    sustainer.mainloop()
+    assert executor.locked_clocks[1] == "1000,1500"
+    assert sustainer.get_current_limits()[1] == 1500
+    sustainer.release_device(1)
+
+    # released with the clocks unlocked
+    sustainer.release_device(0)
+    assert executor.locked_clocks == [None, None]
+    assert executor.calls[-1] == ["nvidia-smi", "-i", "0", "-rgc"]
+    assert sustainer.device_states[0]["locked_clock"] is None
+
+
+def test_throttle_reasons():
+    executor = FakeNVIDIASMIExecutor([80, 80])
+    executor.hw_slowdown[1] = True
+    sustainer = create_sustainer(executor)
+    now = [0.0]
+    sustainer.throttle_timer.clock = lambda: now[0]
+    # the driver slows GPU 1 down already, its limit is left alone
+    sustainer.mainloop()
+    assert executor.power_limits == [200, 250]
+    assert sustainer.device_states[1]["throttle_reasons"] == ["hw_slowdown"]
+    assert sustainer.device_states[0]["throttle_reasons"] == []
+    now[0] = 3.0
+    sustainer.mainloop()
+    status = sustainer.get_status_snapshot()
+    assert status["nvidia:1"]["throttle_seconds"] == {"hw_slowdown": 3.0}
+    assert "throttle_seconds" not in status["nvidia:0"]
+    executor.hw_slowdown[1] = False
+    sustainer.mainloop()
+    assert executor.power_limits[1] == 200
+
+
+# GPU 1 rejects the setting, which only fails calls checking the exit status
+class FailingNVIDIASMIExecutor(FakeNVIDIASMIExecutor):
+    setting = "-lgc"
+
+    def run(self, cmdlist, timeout=None, check=True):
+        if check and self.setting in cmdlist and 1 in self.get_device_ids(cmdlist):
+            self.calls.append(cmdlist)
+            raise subprocess.CalledProcessError(1, cmdlist)
+        ret = super().run(cmdlist, timeout=timeout, check=check)
+        return ret
+
+
+def test_batched_writes():
+    executor = FailingNVIDIASMIExecutor([80, 80, 80, 60])
+    sustainer = create_sustainer(executor, FakeNVIDIAClockLockGPUStatSustainer)
+    # the shared write fails on GPU 1, it is retried per device
+    sustainer.mainloop()
+    writes = [it for it in executor.calls if "-lgc" in it]
+    assert writes == [
+        ["nvidia-smi", "-i", "0,1,2", "-lgc", "1000,1900"],
+        ["nvidia-smi", "-i", "0", "-lgc", "1000,1900"],
+        ["nvidia-smi", "-i", "1", "-lgc", "1000,1900"],
+        ["nvidia-smi", "-i", "2", "-lgc", "1000,1900"],
+    ]
+    assert executor.locked_clocks == ["1000,1900", None, "1000,1900", None]
+    assert list(sustainer.backoff.failures.keys()) == [1]
+    assert "locked_clock" not in sustainer.device_states[1]
+    assert sustainer.device_states[0]["locked_clock"] == 1900
+
+    # a rejected power limit fails the device as well
+    executor = FailingNVIDIASMIExecutor([80, 80, 80])
+    executor.setting = "-pl"
+    sustainer = create_sustainer(executor)
+    sustainer.mainloop()
+    assert executor.power_limits == [200, 250, 200]
+    assert list(sustainer.backoff.failures.keys()) == [1]
+    assert "power_limit" not in sustainer.device_states[1]
+
+    # every GPU sharing a value leaves out -i
+    executor = FakeNVIDIASMIExecutor([80, 80])
+    sustainer = create_sustainer(executor)
+    sustainer.mainloop()
+    assert executor.calls[-1] == ["nvidia-smi", "-pl", "200"]
+
+
+# older GPUs and drivers reject locking clocks altogether
+class RejectingNVIDIASMIExecutor(FakeNVIDIASMIExecutor):
+    def run(self, cmdlist, timeout=None, check=True):
+        if "-lgc" in cmdlist:
+            self.calls.append(cmdlist)
+            raise subprocess.CalledProcessError(3, cmdlist)
+        ret = super().run(cmdlist, timeout=timeout, check=check)
+        return ret
+
+
+def test_clock_lock_probe():
+    # a cool GPU is never locked by a tick, the probe locks and unlocks it
+    executor = FakeNVIDIASMIExecutor([40, 40])
+    sustainer = create_sustainer(executor, FakeNVIDIAClockLockGPUStatSustainer)
+    assert sustainer.test()
+    assert ["nvidia-smi", "-i", "0", "-lgc", "1000,2000"] in executor.calls
+    assert executor.locked_clocks == [None, None]
+
+    executor = RejectingNVIDIASMIExecutor([40, 40])
+    sustainer = create_sustainer(executor, FakeNVIDIAClockLockGPUStatSustainer)
+    assert not sustainer.test()
+    # the power limit backends are tried instead
+    sustainer = create_sustainer(executor)
+    assert sustainer.test()
+
+
+def test_missing_power_draw(capsys):
+    # the fake GPUs report no power draw at all
+    sustainer = create_sustainer(FakeNVIDIASMIExecutor([60, 60]))
+    for _ in range(3):
+        assert sustainer.read_power_draw() == {}
+    output = capsys.readouterr().out
+    assert output.count("No power draw reading on GPU #0") == 1
+    assert output.count("No power draw reading on GPU #1") == 1
+
+
+def test_read_status():
+    executor = FakeNVIDIASMIExecutor([80, 60])
+    executor.hw_slowdown[1] = True
+    sustainer = create_sustainer(executor)
+    status = sustainer.read_status()
+    # a single query for every field of every GPU
+    assert executor.calls == [["nvidia-smi", "-x", "-q"]]
+    assert status["nvidia:0"]["temperature"] == 80
+    assert status["nvidia:0"]["default_power_limit"] == 250
+    assert status["nvidia:0"]["persistence_mode"] == "Enabled"
+    assert status["nvidia:1"]["throttle_reasons"] == ["hw_slowdown"]
+    # not reported by the fake GPUs
+    assert math.isnan(status["nvidia:1"]["gpu_target_temperature"])
@@ -0,0 +1,49 @@
+from sustainer.policy import HOLD, LOWER, RAISE, LimitPolicy
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test():
+    clock = FakeClock()
+    policy = LimitPolicy(
+        rise_threshold=1,
+        fall_threshold=3,
+        deadband=0.05,
+        min_dwell_time=30,
+        clock=clock,
+    )
+
+    # holds between target - fall threshold and target + rise threshold
+    assert policy.get_direction(0, 71, 70) == HOLD
+    assert policy.get_direction(0, 67, 70) == HOLD
+    assert policy.get_direction(0, 72, 70) == LOWER
+    assert policy.get_direction(0, 66, 70) == RAISE
+
+    # small changes are not worth a write
+    assert not policy.should_change(200, 200)
+    assert not policy.should_change(200, 195)
+    assert policy.should_change(200, 190)
+
+    # reversing a change waits for the dwell time, continuing it does not
+    policy.record_change(0, LOWER)
+    clock.now = 10
+    assert policy.get_direction(0, 66, 70) == HOLD
+    assert policy.get_direction(0, 72, 70) == LOWER
+    assert policy.get_direction(1, 66, 70) == RAISE
+    clock.now = 30
+    assert policy.get_direction(0, 66, 70) == RAISE
+
+    # changes are counted over the last hour
+    policy.record_change(0, RAISE)
+    assert policy.get_hourly_changes(0) == 2
+    assert policy.get_hourly_changes(1) == 0
+    clock.now = 3605
+    assert policy.get_hourly_changes(0) == 1
+    clock.now = 3630
+    assert policy.get_hourly_changes(0) == 0
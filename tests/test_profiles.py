@@ -0,0 +1,117 @@
+import json
+import os
+import tempfile
+
+from sustainer.cpu import CPURAPLStatSustainer
+from sustainer.profiles import LearnedLimits, ProfileManager
+
+PROFILES = {
+    "training": {
+        "target_temp": 70,
+        "devices": {"cpu": {"limit": 60}, "cpu:1": {"target_temp": 80}},
+    },
+    "inference": {"target_temp": 60},
+}
+
+
+def create_fake_powercap_tree():
+    powercap_root = tempfile.mkdtemp()
+    for zone in range(2):
+        zone_path = os.path.join(powercap_root, f"intel-rapl:{zone}")
+        os.makedirs(zone_path)
+        attributes = {
+            "name": f"package-{zone}",
+            "enabled": "1",
+            "energy_uj": "1000000",
+            "max_energy_range_uj": "262143328850",
+            "constraint_0_power_limit_uw": "100000000",
+        }
+        for name, value in attributes.items():
+            with open(os.path.join(zone_path, name), "w") as f:
+                f.write(value + "\n")
+    return powercap_root
+
+
+class FakeTemperatureRAPLStatSustainer(CPURAPLStatSustainer):
+    temperature = 72
+
+    def get_cpu_temperature(self):
+        return self.temperature * 1000
+
+
+class RecordingEventLog:
+    def __init__(self):
+        self.events = []
+
+    def emit(self, event: str, level: str = "INFO", **fields):
+        self.events.append(event)
+
+
+def create_profile_manager(sustainer, directory: str):
+    profiles_path = os.path.join(directory, "profiles.json")
+    with open(profiles_path, "w") as f:
+        json.dump(PROFILES, f)
+    ret = ProfileManager(
+        [sustainer],
+        profiles_path=profiles_path,
+        profile_file=os.path.join(directory, "profile"),
+        learned_limits=LearnedLimits(os.path.join(directory, "learned.json")),
+        learning_interval=0,
+    )
+    return ret
+
+
+def test():
+    directory = tempfile.mkdtemp()
+    sustainer = FakeTemperatureRAPLStatSustainer(
+        skip_root_check=True, powercap_root=create_fake_powercap_tree()
+    )
+    sustainer.mainloop()
+    manager = create_profile_manager(sustainer, directory)
+    manager.event_log = RecordingEventLog()
+    # no profile yet, nothing changes
+    assert manager.switch(None) == {}
+    assert manager.event_log.events == []
+
+    # nothing learned yet, devices start at the configured limit
+    devices = manager.switch("training")
+    assert devices["cpu:0"] == {"target_temp": 70, "limit": 60}
+    assert devices["cpu:1"] == {"target_temp": 80, "limit": 60}
+    assert manager.switch("training") == {}
+    assert manager.event_log.events == ["profile_changed"]
+    sustainer.mainloop()
+    assert sustainer.get_power_limit(0) == 60000000
+    assert sustainer.device_states[1]["power_limit"] == 60
+
+    # cpu:0 is held at its target, cpu:1 is far below it and not learned
+    sustainer.temperature = 70
+    sustainer.write_zone_attribute(0, "constraint_0_power_limit_uw", 56000000)
+    sustainer.mainloop()
+    manager.tick()
+    assert manager.learned_limits.get("training", "cpu:0") == 56
+    assert manager.learned_limits.get("training", "cpu:1") is None
+
+    # the prolog of the next job writes the profile file
+    with open(manager.profile_file, "w") as f:
+        f.write("inference\n")
+    manager.tick()
+    assert manager.active == "inference"
+    assert sustainer.get_target_temp(1) == 60
+    assert sustainer.initial_limits == {}
+    # its epilog removes it, back to the default target
+    os.remove(manager.profile_file)
+    manager.tick()
+    assert manager.active is None
+    assert sustainer.get_target_temp(0) == 65
+
+    # the next job starts at the learned limit, also after a restart
+    with open(manager.profile_file, "w") as f:
+        f.write("training")
+    manager = create_profile_manager(sustainer, directory)
+    manager.tick()
+    assert sustainer.initial_limits[0] == 56
+    assert sustainer.initial_limits[1] == 60
+
+
+if __name__ == "__main__":
+    test()
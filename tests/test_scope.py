@@ -0,0 +1,66 @@
+from sustainer.base import get_device_scope_config
+from sustainer.scope import DeviceScope, parse_uuid_allowlist, parse_visible_devices
+
+FAKE_UUIDS = {
+    0: "GPU-8932f937-d72c-4106-c12f-20bd9faed9f6",
+    1: "GPU-1b2c3d4e-0000-4106-c12f-20bd9faed9f6",
+    2: "GPU-5e6f7a8b-0000-4106-c12f-20bd9faed9f6",
+    3: None,
+}
+
+
+def test_parse():
+    assert parse_visible_devices(None) is None
+    assert parse_visible_devices("") == []
+    assert parse_visible_devices("0, 2") == ["0", "2"]
+    # like CUDA, entries after an invalid one are ignored
+    assert parse_visible_devices("1,-1,2") == ["1"]
+    assert parse_uuid_allowlist("") is None
+    assert parse_uuid_allowlist("GPU-8932f937,GPU-1b2c") == ["GPU-8932f937", "GPU-1b2c"]
+
+
+def test_filter_gpus():
+    looked_up = []
+
+    def get_uuid(index):
+        looked_up.append(index)
+        return FAKE_UUIDS[index]
+
+    assert DeviceScope().filter_gpus(FAKE_UUIDS.keys(), get_uuid) == [0, 1, 2, 3]
+    assert DeviceScope(visible_devices=[]).filter_gpus(FAKE_UUIDS, get_uuid) == []
+    # plain indices need no uuid lookups
+    assert DeviceScope(visible_devices=["2", "0"]).filter_gpus(
+        FAKE_UUIDS, get_uuid
+    ) == [0, 2]
+    assert not looked_up
+
+    scope = DeviceScope(visible_devices=["1", "GPU-5E6F"])
+    assert scope.filter_gpus(FAKE_UUIDS, get_uuid) == [1, 2]
+    # both apply together
+    scope = DeviceScope(visible_devices=["0", "1"], uuid_allowlist=["GPU-1b2c3d4e"])
+    assert scope.filter_gpus(FAKE_UUIDS, get_uuid) == [1]
+
+
+def test_filter_cpus():
+    assert DeviceScope().filter_cpus(range(4)) == [0, 1, 2, 3]
+    assert DeviceScope(cpus={1, 3, 9}).filter_cpus(range(4)) == [1, 3]
+
+
+def test_config(monkeypatch):
+    monkeypatch.setenv("CUDA_DEVICE_ORDER", "PCI_BUS_ID")
+    monkeypatch.setenv("CUDA_VISIBLE_DEVICES", "1,GPU-5e6f")
+    monkeypatch.setenv("ROCR_VISIBLE_DEVICES", "0")
+    monkeypatch.setenv("GPU_UUID_ALLOWLIST", "GPU-1b2c")
+    nvidia_scope = get_device_scope_config("nvidia")
+    assert nvidia_scope.visible_devices == ["1", "GPU-5e6f"]
+    assert nvidia_scope.uuid_allowlist == ["GPU-1b2c"]
+    assert get_device_scope_config("amd").visible_devices == ["0"]
+    # cuda indices follow the nvidia-smi ones only in pci bus order
+    monkeypatch.setenv("CUDA_DEVICE_ORDER", "FASTEST_FIRST")
+    assert get_device_scope_config("nvidia").visible_devices == ["GPU-5e6f"]
+    monkeypatch.delenv("CUDA_DEVICE_ORDER")
+    monkeypatch.setenv("CUDA_VISIBLE_DEVICES", "1")
+    assert get_device_scope_config("nvidia").visible_devices == []
+    monkeypatch.delenv("CUDA_VISIBLE_DEVICES")
+    monkeypatch.delenv("GPU_UUID_ALLOWLIST")
+    assert not get_device_scope_config("nvidia").is_gpu_restricted()
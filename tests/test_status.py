@@ -0,0 +1,55 @@
+import time
+
+from sustainer.backends import BackendSpec
+from sustainer.cpu import CPUBaseStatSustainer
+from sustainer.status import collect_status, get_status_backend_groups
+
+
+class FakeCPUStatSustainer(CPUBaseStatSustainer):
+    def main(self):
+        ...
+
+    def read_status(self):
+        return {self.get_device_name(0): {"temperature": 50.0, "max_freq": 2000000}}
+
+
+class HungCPUStatSustainer(FakeCPUStatSustainer):
+    device_kind = "hung"
+
+    def read_status(self):
+        time.sleep(30)
+        return {}
+
+
+def test():
+    backend_list = [
+        BackendSpec("FakeCPUStatSustainer", __name__, "cpu"),
+        BackendSpec("HungCPUStatSustainer", __name__, "hung"),
+    ]
+    started = time.monotonic()
+    rows = collect_status(timeout=1, backend_list=backend_list)
+    assert time.monotonic() - started < 2
+    assert rows[0] == {
+        "device": "cpu:0",
+        "backend": "FakeCPUStatSustainer",
+        "temperature": 50.0,
+        "max_freq": 2000000,
+    }
+    assert rows[1]["backend"] == "HungCPUStatSustainer"
+    assert "Timed out" in rows[1]["error"]
+
+
+# the control modes pick the same backends as the daemon would
+def test_backend_groups(monkeypatch):
+    monkeypatch.setenv("CPU_CONTROL_MODE", "rapl")
+    monkeypatch.setenv("NVIDIA_CONTROL_MODE", "clocks")
+    cpu_group, nvidia_group, _ = get_status_backend_groups()
+    assert cpu_group[1][0].class_name == "CPURAPLStatSustainer"
+    assert nvidia_group[1][0].class_name == "NVIDIAClockLockGPUStatSustainer"
+    monkeypatch.delenv("CPU_CONTROL_MODE")
+    cpu_group = get_status_backend_groups()[0]
+    assert "CPURAPLStatSustainer" not in [it.class_name for it in cpu_group[1]]
+
+
+if __name__ == "__main__":
+    test()
@@ -0,0 +1,56 @@
+from sustainer.throttle import (
+    ThrottleTimer,
+    get_nvml_throttle_reasons,
+    get_nvsmi_throttle_reasons,
+    is_driver_throttling,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test():
+    assert get_nvml_throttle_reasons(0x4 | 0x40) == {
+        "sw_power_cap",
+        "hw_thermal_slowdown",
+    }
+    gpu_info = {
+        "clocks_event_reasons": {
+            "clocks_event_reason_gpu_idle": "Not Active",
+            "clocks_event_reason_sw_power_cap": "Active",
+            "clocks_event_reason_sw_thermal_slowdown": "Active",
+        }
+    }
+    assert get_nvsmi_throttle_reasons(gpu_info) == {
+        "sw_power_cap",
+        "sw_thermal_slowdown",
+    }
+    assert get_nvsmi_throttle_reasons({}) == set()
+    # our own power cap is not the driver throttling by itself
+    assert not is_driver_throttling({"sw_power_cap"})
+    assert is_driver_throttling({"sw_power_cap", "hw_slowdown"})
+
+    clock = FakeClock()
+    timer = ThrottleTimer(clock=clock)
+    timer.add_sample(0, {"sw_power_cap"})
+    clock.now = 2.0
+    timer.add_sample(0, {"sw_power_cap", "hw_slowdown"})
+    clock.now = 5.0
+    timer.add_sample(0, set())
+    assert timer.get_seconds(0) == {"sw_power_cap": 5.0, "hw_slowdown": 3.0}
+    # gaps without samples are not counted
+    clock.now = 500.0
+    timer.add_sample(0, {"hw_slowdown"})
+    clock.now = 501.0
+    timer.add_sample(0, set())
+    assert timer.get_seconds(0) == {"sw_power_cap": 5.0, "hw_slowdown": 4.0}
+    assert timer.get_seconds(1) == {}
+
+
+if __name__ == "__main__":
+    test()
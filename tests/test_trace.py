@@ -0,0 +1,108 @@
+import gzip
+import os
+import subprocess
+import tempfile
+
+import pytest
+
+from sustainer import base
+from sustainer.nvsmi import NVIDIALegacyGPUStatSustainer
+from sustainer.trace import (
+    RecordingExecutor,
+    ReplayExecutor,
+    TraceWriter,
+    read_trace,
+)
+
+FAKE_BINARIES = {
+    "fake-sensors": '#!/bin/sh\necho \'{"coretemp-isa-0000": {"temp1_input": 51.0}}\'\n',
+    "failing-tool": "#!/bin/sh\necho broken >&2\nexit 3\n",
+}
+
+NVIDIA_SMI_XML = """<nvidia_smi_log><attached_gpus>1</attached_gpus><gpu id="0">
+<uuid>GPU-8932f937-d72c-4106-c12f-20bd9faed9f6</uuid>
+<temperature><gpu_temp>{temperature} C</gpu_temp></temperature>
+<gpu_power_readings>
+<current_power_limit>250.00 W</current_power_limit>
+<default_power_limit>250.00 W</default_power_limit>
+<min_power_limit>100.00 W</min_power_limit>
+</gpu_power_readings>
+</gpu></nvidia_smi_log>"""
+
+
+def create_fake_binaries():
+    bin_dir = tempfile.mkdtemp()
+    for name, script in FAKE_BINARIES.items():
+        path = os.path.join(bin_dir, name)
+        with open(path, "w") as f:
+            f.write(script)
+        os.chmod(path, 0o755)
+    return bin_dir
+
+
+def test_record():
+    bin_dir = create_fake_binaries()
+    trace_path = os.path.join(tempfile.mkdtemp(), "node.trace.gz")
+    executor = RecordingExecutor(trace_path, timeout=5)
+    sensors = os.path.join(bin_dir, "fake-sensors")
+    for _ in range(3):
+        assert "temp1_input" in executor.check_output([sensors, "-j"])
+    with pytest.raises(subprocess.CalledProcessError):
+        executor.check_output([os.path.join(bin_dir, "failing-tool")])
+    executor.close()
+
+    header, calls = read_trace(trace_path)
+    assert header["trace"] == 1
+    assert [it["c"][1:] for it in calls] == [["-j"]] * 3 + [[]]
+    assert calls[0]["o"] == calls[2]["o"]
+    assert calls[3]["r"] == 3 and calls[3]["e"] == "broken\n"
+    # the repeated output is stored once
+    with gzip.open(trace_path, "rt") as f:
+        assert f.read().count("temp1_input") == 1
+
+    # failures come back as they happened
+    replay = ReplayExecutor(calls)
+    assert replay.has_binary("fake-sensors")
+    assert replay.check_output([sensors, "-j"]) == calls[0]["o"]
+    with pytest.raises(subprocess.CalledProcessError):
+        replay.check_output([os.path.join(bin_dir, "failing-tool")])
+
+
+def test_replay(monkeypatch):
+    trace_path = os.path.join(tempfile.mkdtemp(), "node.trace.gz")
+    writer = TraceWriter(trace_path)
+    for temperature in [70, 60, 80]:
+        output = NVIDIA_SMI_XML.format(temperature=temperature)
+        writer.record_call(
+            ["nvidia-smi", "-x", "-q"],
+            0,
+            0.1,
+            subprocess.CompletedProcess([], 0, output, ""),
+        )
+    writer.record_call(["nvidia-smi", "-i", "0", "-pl", "120"], 0, 5, None)
+    # not closed, like a recording that got killed
+
+    # nvidia-smi is not installed here, the trace stands in for it
+    replay = ReplayExecutor.load(trace_path)
+    monkeypatch.setattr(base, "_default_executor", replay)
+    sustainer = NVIDIALegacyGPUStatSustainer(skip_root_check=True)
+    sustainer.target_temp = 70
+    sustainer.fan_curve = None
+    # recorded calls are answered in order
+    sustainer.mainloop()
+    assert sustainer.device_states[0]["temperature"] == 70
+    sustainer.mainloop()
+    assert sustainer.device_states[0]["temperature"] == 60
+    sustainer.mainloop()
+    assert sustainer.device_states[0]["temperature"] == 80
+    assert sustainer.device_states[0]["power_limit"] == 200
+    # the write was never recorded, it succeeds without output
+    assert replay.unmatched == {("nvidia-smi", "-pl", "200"): 1}
+    # capturing the original limit started the recorded queries over
+    assert replay.replayed == 4
+
+    with pytest.raises(subprocess.TimeoutExpired):
+        replay.run(["nvidia-smi", "-i", "0", "-pl", "120"])
+    replay.strict = True
+    with pytest.raises(LookupError):
+        replay.run(["nvidia-smi", "-i", "0", "-pl", "110"])
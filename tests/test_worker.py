@@ -0,0 +1,98 @@
+import multiprocessing
+import os
+import tempfile
+
+import pytest
+
+from sustainer.journal import StateJournal
+from sustainer.worker import PipeChannel, SupervisedSustainer, WorkerError
+
+
+def create_fake_cpufreq_tree():
+    sysfs_root = tempfile.mkdtemp()
+    os.makedirs(os.path.join(sysfs_root, "policy0"))
+    attributes = {
+        "affected_cpus": "0 1",
+        "cpuinfo_min_freq": "800000",
+        "cpuinfo_max_freq": "3000000",
+        "scaling_max_freq": "3000000",
+        "scaling_governor": "schedutil",
+        "scaling_available_governors": "performance powersave schedutil",
+    }
+    for name, value in attributes.items():
+        with open(os.path.join(sysfs_root, "policy0", name), "w") as f:
+            f.write(value + "\n")
+    return sysfs_root
+
+
+def test_channel():
+    left_conn, right_conn = multiprocessing.Pipe()
+
+    def handle_left(method, *args, **kwargs):
+        if method == "double":
+            return args[0] * 2
+        raise NotImplementedError(method)
+
+    def handle_right(method, *args, **kwargs):
+        # calls back into the other side while handling a request
+        ret = right.call("double", kwargs["value"]) + 1
+        return ret
+
+    left = PipeChannel(left_conn, handle_left)
+    right = PipeChannel(right_conn, handle_right)
+    left.start()
+    right.start()
+    assert right.call("double", 4) == 8
+    assert left.call("nested", value=5) == 11
+    # errors are raised on the calling side as they were
+    with pytest.raises(NotImplementedError):
+        right.call("missing")
+    with pytest.raises(KeyError):
+        left.call("nested")
+
+    # the other side went away
+    conn, peer_conn = multiprocessing.Pipe()
+    channel = PipeChannel(conn, handle_left)
+    channel.start()
+    peer_conn.close()
+    assert channel.closed.wait(5)
+    with pytest.raises(WorkerError):
+        channel.call("double", 1)
+
+
+def test(monkeypatch):
+    monkeypatch.setenv("CPUFREQ_SYSFS_ROOT", create_fake_cpufreq_tree())
+    journal = StateJournal(os.path.join(tempfile.mkdtemp(), "journal.json"))
+    supervisor = SupervisedSustainer("cpu", journal, stall_timeout=60)
+    supervisor.backend = "CPUSysfsStatSustainer"
+    supervisor.start_worker()
+    try:
+        assert supervisor.process.pid != os.getpid()
+        supervisor.set_device_target_temp(0, 55)
+        supervisor.pause_device(0)
+        assert supervisor.get_target_temp(0) == 55
+        assert supervisor.get_status_snapshot()["cpu:0"]["paused"]
+        assert supervisor.check_health() is None
+
+        # a dead worker is started again with the state saved before
+        pid = supervisor.process.pid
+        supervisor.process.kill()
+        supervisor.process.join()
+        reason = supervisor.check_health()
+        assert reason.startswith("exited")
+        supervisor.restart_worker(reason)
+        assert supervisor.process.pid != pid
+        assert supervisor.get_target_temp(0) == 55
+        assert supervisor.get_status_snapshot()["cpu:0"]["paused"]
+
+        # without sensors the control loop never completes a tick
+        supervisor.stall_timeout = 0
+        assert supervisor.check_health().startswith("no tick")
+    finally:
+        supervisor.stop()
+        supervisor.main()
+    assert not supervisor.process.is_alive()
+
+
+if __name__ == "__main__":
+    test_channel()